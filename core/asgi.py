@@ -3,6 +3,12 @@ ASGI config for core project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+HTTP so'rovlar Django'ga, /ws/face-scan/ WebSocket ulanishlari esa
+yuz skanerlash sessiyasiga yo'naltiriladi. WebSocket ulanishi accept
+qilinishidan oldin Origin va skanerlash ticket'i tekshiriladi. Ishga tushirish:
+
+    gunicorn -c gunicorn_config.py -k uvicorn.workers.UvicornWorker core.asgi:application
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 """
@@ -13,4 +19,41 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Django sozlangandan keyin import qilinadi
+from emotion_app.scan_socket import CLOSE_FORBIDDEN, face_scan_session, origin_allowed, reject, ticket_valid  # noqa: E402
+
+WEBSOCKET_ROUTES = {
+    '/ws/face-scan/': face_scan_session,
+}
+
+
+async def lifespan(scope, receive, send):
+    """ASGI lifespan - maxsus ishlov kerak emas"""
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        handler = WEBSOCKET_ROUTES.get(scope['path'])
+        if handler is None:
+            # Noma'lum yo'l - ulanishni rad etish
+            await receive()
+            await send({'type': 'websocket.close', 'code': 4404})
+            return
+        if not origin_allowed(scope) or not ticket_valid(scope):
+            # Begona sahifa yoki ticket'siz / eskirgan ticket - accept qilinmaydi
+            return await reject(receive, send, CLOSE_FORBIDDEN)
+        return await handler(scope, receive, send)
+
+    if scope['type'] == 'lifespan':
+        return await lifespan(scope, receive, send)
+
+    return await django_application(scope, receive, send)
@@ -163,3 +163,76 @@ CORS_ALLOW_ALL_ORIGINS = True
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Ko'p kadrli (batch) yuz tanish so'rovlari uchun (3-5 ta JPEG kadr base64 ichida)
+DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10 MB
+
+# Lokal yuz tanish daemon'i (python manage.py run_face_inference_server).
+# Bo'sh bo'lsa har bir worker yuzlarni o'zi tanadi.
+FACE_INFERENCE_SOCKET = os.environ.get('FACE_INFERENCE_SOCKET', '')
+FACE_INFERENCE_TIMEOUT = int(os.environ.get('FACE_INFERENCE_TIMEOUT', 10))
+
+# Admission control - yuz endpoint'lari uchun host bo'yicha chegaralar
+FACE_MAX_IN_FLIGHT = int(os.environ.get('FACE_MAX_IN_FLIGHT', 4))
+FACE_MAX_QUEUE = int(os.environ.get('FACE_MAX_QUEUE', 8))
+FACE_QUEUE_WAIT = float(os.environ.get('FACE_QUEUE_WAIT', 1.5))
+FACE_RETRY_AFTER = int(os.environ.get('FACE_RETRY_AFTER', 2))
+FACE_ADMISSION_DIR = os.environ.get('FACE_ADMISSION_DIR', '')
+
+# Kadr dedupe - bir xil kiosk'dan deyarli bir xil kadr kelsa oldingi natija
+FACE_DEDUPE_TTL = 6  # sekund
+FACE_DEDUPE_MAX_DISTANCE = 6  # dHash Hamming masofasi (64 bitdan)
+FACE_DEDUPE_MAX_CLIENTS = 512
+
+# Sifat filtri - qorong'i, o'ta yorug' va xira kadrlar HOG'gacha rad etiladi.
+# Chegaralarni almashtirish: FACE_QUALITY_THRESHOLDS = {'min_brightness': 30, ...}
+# (kalitlar: emotion_app/face_pipeline.py QUALITY_THRESHOLDS)
+FACE_QUALITY_GATE = True
+FACE_QUALITY_THRESHOLDS = {}
+
+# Adaptiv detection zinapoyasi: (kadrning maksimal tomoni, upsample) - arzonidan boshlab,
+# yuz topilmasagina keyingi pog'ona. None - face_pipeline.DETECTION_LADDER
+FACE_DETECTION_LADDER = None
+
+# Yuz detektori backend'i: 'hog' (dlib), 'haar' (OpenCV), 'mtcnn'.
+# Solishtirish: python manage.py benchmark_face_detectors --images <papka>
+FACE_DETECTOR = os.environ.get('FACE_DETECTOR', 'hog')
+FACE_HAAR_CASCADE = os.environ.get('FACE_HAAR_CASCADE', '')
+
+# Pipeline profillarini almashtirish (kalitlar: landmark_model, num_jitters, max_side), masalan
+# (fast-login / accurate-enroll landmark_model'i galereya bilan bir xil qoladi):
+# FACE_PIPELINE_PROFILES = {'fast-login': {'num_jitters': 2}}
+# Solishtirish: python manage.py benchmark_face_profiles --images <papka>/<label>/*.jpg
+FACE_PIPELINE_PROFILES = {}
+
+# face_login_auth login profili cache'i (passport → Person, shablon, rasm vaqti, User)
+FACE_LOGIN_PROFILE_TTL = 120  # sekund
+FACE_LOGIN_PROFILE_MAX = 1024
+
+# Person → Django User sinxronizatsiyasi fon thread'ida (False - darhol, shu thread'da)
+FACE_USER_SYNC_ASYNC = os.environ.get('FACE_USER_SYNC_ASYNC', 'true').lower() != 'false'
+
+# LoginLog yozuvlari fon thread'ida bulk_create bilan yoziladi (False - darhol)
+FACE_LOGIN_LOG_ASYNC = os.environ.get('FACE_LOGIN_LOG_ASYNC', 'true').lower() != 'false'
+FACE_LOGIN_LOG_BATCH = 50  # shuncha qator yig'ilganda yoziladi
+FACE_LOGIN_LOG_FLUSH_SECONDS = 2.0  # yoki shuncha vaqt o'tganda
+FACE_LOGIN_LOG_SPOOL_DIR = os.environ.get('FACE_LOGIN_LOG_SPOOL_DIR', str(BASE_DIR / 'var' / 'login_log_spool'))
+FACE_LOGIN_LOG_MAX_BUFFER = 5000  # xotiradagi bufer chegarasi (oshgani spool'da kutadi)
+FACE_LOGIN_LOG_MAX_BACKOFF = 60.0  # DB ishlamasa qayta urinishlar orasidagi eng uzoq pauza (sekund)
+FACE_LOGIN_LOG_ORPHAN_SCAN = 60.0  # o'lgan worker'lar spool fayllari shu oraliqda qidiriladi (sekund)
+
+# Enrollment rasmi shu o'lchamgacha (eng uzun tomon, px) kichraytirilib saqlanadi va encoding qilinadi
+FACE_ENROLL_PHOTO_MAX_SIDE = 1280
+
+# Testlarda V1 jadvallari (managed = False) ham test bazasida yaratiladi
+TEST_RUNNER = 'emotion_app.test_runner.UnmanagedTablesTestRunner'
+
+# Klip/burst yuz tanish (/api/face-detect-clip/): so'rov hajmi (bayt) va "images" soni chegarasi
+FACE_CLIP_MAX_BYTES = 20 * 1024 * 1024  # 20 MB - oshsa 413
+FACE_CLIP_MAX_IMAGES = 30  # oshsa 400
+
+# WebSocket skanerlash (/ws/face-scan/): host va client (IP + User-Agent) bo'yicha bir vaqtdagi sessiyalar,
+# capture profili beradigan ticket'ning amal qilish muddati (sekund)
+FACE_SCAN_MAX_SESSIONS = 16
+FACE_SCAN_MAX_SESSIONS_PER_CLIENT = 2
+FACE_SCAN_TICKET_TTL = 600
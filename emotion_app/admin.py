@@ -136,10 +136,13 @@ class PersonResource(resources.ModelResource):
                 try:
                     from PIL import Image
                     import io
+                    from .face_pipeline import image_size_allowed
 
-                    # Rasm formatini aniqlash
+                    # Rasm formatini aniqlash (faqat header o'qiladi)
                     img_bytes = row['_photo_data']
                     img = Image.open(io.BytesIO(img_bytes))
+                    if not image_size_allowed(img.size):
+                        raise ValueError(f"Rasm o'lchami juda katta: {img.size[0]}x{img.size[1]}")
                     original_format = img.format if img.format else 'JPEG'
 
                     # Ruxsat etilgan formatlar
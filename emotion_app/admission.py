@@ -0,0 +1,367 @@
+"""
+emotion_app/admission.py
+Yuz endpoint'lari uchun admission control - host bo'yicha parallel so'rovlar chegarasi
+
+Slot'lar lock papkasidagi fayllar bo'lib, har biri fcntl.flock bilan band
+qilinadi. Shuning uchun chegara barcha gunicorn worker'lari uchun umumiy.
+Worker o'lsa OS lock'ni o'zi bo'shatadi.
+
+Sozlamalar (settings.py):
+- FACE_MAX_IN_FLIGHT: host bo'yicha bir vaqtda ishlanayotgan so'rovlar
+- FACE_MAX_QUEUE: slot kutayotgan so'rovlar soni
+- FACE_QUEUE_WAIT: navbatda kutish chegarasi (sekund)
+- FACE_RETRY_AFTER: 503 javobidagi Retry-After (sekund)
+
+Navbat ham to'lsa yoki kutish vaqti tugasa so'rov darhol 503 bilan qaytadi.
+WebSocket skanerlash kadrlari ham shu slot'lar bilan ishlanadi (admitted()).
+
+Yuklamani o'lchash (host_usage) slot lock'lariga tegmaydi: har bir worker
+o'zining in-flight / navbat sonini umumiy mmap jadvalidagi o'z qatoriga
+yozadi, o'quvchi esa tirik jarayonlar qatorlarini qo'shadi.
+"""
+import asyncio
+import contextlib
+import functools
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.http import JsonResponse
+
+from . import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows - admission control o'chiq
+    fcntl = None
+
+
+# Navbatdagi so'rov slot'ni qanchalik tez-tez tekshiradi (sekund)
+POLL_INTERVAL = 0.05
+
+# Yuklama jadvali: har bir worker uchun (pid, in_flight, queued) qatori
+USAGE_RECORD = struct.Struct('iii')
+USAGE_RECORDS = 256
+USAGE_FILE = 'usage.mmap'
+
+
+def _limits():
+    return (
+        getattr(settings, 'FACE_MAX_IN_FLIGHT', 4),
+        getattr(settings, 'FACE_MAX_QUEUE', 8),
+        getattr(settings, 'FACE_QUEUE_WAIT', 1.5),
+    )
+
+
+def _lock_dir():
+    path = getattr(settings, 'FACE_ADMISSION_DIR', '') or os.path.join(tempfile.gettempdir(), 'face_admission')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _try_slot(prefix, count):
+    """Bo'sh slot'ni band qilish - fd yoki None"""
+    directory = _lock_dir()
+    for index in range(count):
+        fd = os.open(os.path.join(directory, f'{prefix}_{index}.lock'), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            continue
+        return fd
+    return None
+
+
+def _release(fd):
+    if fd is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+
+# =====================================================
+# Yuklama jadvali (lock'siz o'qiladi)
+# =====================================================
+
+_usage_lock = threading.Lock()
+_usage_map = None
+_usage_pid = None       # jadval qaysi jarayon uchun ochilgan (fork'dan keyin qayta)
+_usage_offset = None    # shu jarayon qatorining joyi
+_usage_counts = {'in_flight': 0, 'queued': 0}
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+def _open_usage():
+    """Jadval faylini mmap qilish - fcntl yo'q yoki xatolik bo'lsa None"""
+    if fcntl is None:
+        return None
+    path = os.path.join(_lock_dir(), USAGE_FILE)
+    size = USAGE_RECORD.size * USAGE_RECORDS
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        if os.fstat(fd).st_size < size:
+            os.ftruncate(fd, size)
+        return mmap.mmap(fd, size)
+    finally:
+        os.close(fd)
+
+
+def _claim_usage_record():
+    """
+    _usage_lock ostida: shu jarayon uchun jadval qatorini olish (bo'sh yoki
+    o'lgan jarayonniki). Qator olish faqat jarayon boshida - qisqa bloklovchi
+    flock bilan, slot lock'lariga ta'sir qilmaydi.
+    """
+    global _usage_map, _usage_pid, _usage_offset
+    pid = os.getpid()
+    if _usage_pid == pid:
+        return _usage_offset is not None
+
+    _usage_pid, _usage_offset = pid, None
+    _usage_counts.update(in_flight=0, queued=0)
+    try:
+        if _usage_map is not None:
+            _usage_map.close()
+        _usage_map = _open_usage()
+        if _usage_map is None:
+            return False
+        fd = os.open(os.path.join(_lock_dir(), USAGE_FILE), os.O_RDWR)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            for index in range(USAGE_RECORDS):
+                offset = index * USAGE_RECORD.size
+                owner, _, _ = USAGE_RECORD.unpack_from(_usage_map, offset)
+                if owner == 0 or owner == pid or not _process_alive(owner):
+                    USAGE_RECORD.pack_into(_usage_map, offset, pid, 0, 0)
+                    _usage_offset = offset
+                    break
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+    except OSError as e:
+        print(f"⚠️  Admission yuklama jadvali ochilmadi: {e}")
+    return _usage_offset is not None
+
+
+def _track(key, delta):
+    """Shu jarayonning in-flight / navbat sonini o'zgartirish (metrics + umumiy jadval)"""
+    metrics.gauge_add('admission.in_flight' if key == 'in_flight' else 'admission.queue_depth', delta)
+    with _usage_lock:
+        if not _claim_usage_record():
+            return
+        _usage_counts[key] += delta
+        USAGE_RECORD.pack_into(
+            _usage_map, _usage_offset, _usage_pid, _usage_counts['in_flight'], _usage_counts['queued']
+        )
+
+
+def host_usage():
+    """
+    Host bo'yicha ishlanayotgan va navbatdagi so'rovlar: {'in_flight': n, 'queued': m}.
+    Jadval lock'siz o'qiladi - slot olayotgan so'rovlarga xalaqit bermaydi.
+    """
+    if fcntl is None:
+        return {}
+
+    try:
+        with _usage_lock:
+            if _usage_pid != os.getpid():
+                _claim_usage_record()
+            usage_map = _usage_map
+        if usage_map is None:
+            return {}
+        records = list(USAGE_RECORD.iter_unpack(usage_map[:USAGE_RECORD.size * USAGE_RECORDS]))
+    except (OSError, ValueError):
+        return {}
+
+    usage = {'in_flight': 0, 'queued': 0}
+    for pid, in_flight, queued in records:
+        if pid and (pid == os.getpid() or _process_alive(pid)):
+            usage['in_flight'] += max(in_flight, 0)
+            usage['queued'] += max(queued, 0)
+    return usage
+
+
+def host_load():
+    """Host yuklamasi: (ishlanayotgan + navbatdagi so'rovlar) / in-flight chegarasi. 0 - bo'sh, 1+ - to'la"""
+    usage = host_usage()
+    if not usage:
+        return 0.0
+    max_in_flight, _, _ = _limits()
+    return (usage['in_flight'] + usage['queued']) / float(max_in_flight)
+
+
+def overloaded_response(message='Server band. Birozdan keyin qayta urinib ko\'ring.', extra=None):
+    """503 + Retry-After"""
+    retry_after = getattr(settings, 'FACE_RETRY_AFTER', 2)
+    payload = {'success': False, 'error': message, 'retry_after': retry_after}
+    if extra:
+        payload.update(extra)
+    response = JsonResponse(payload, status=503)
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+# =====================================================
+# Slot olish (sync / async)
+# =====================================================
+
+def _admit_sync():
+    max_in_flight, max_queue, queue_wait = _limits()
+
+    slot = _try_slot('slot', max_in_flight)
+    if slot is not None:
+        return slot
+
+    queue_fd = _try_slot('queue', max_queue)
+    if queue_fd is None:
+        metrics.incr('admission.rejected')
+        return None
+
+    metrics.incr('admission.queued')
+    _track('queued', 1)
+    try:
+        deadline = time.monotonic() + queue_wait
+        while time.monotonic() < deadline:
+            time.sleep(POLL_INTERVAL)
+            slot = _try_slot('slot', max_in_flight)
+            if slot is not None:
+                return slot
+    finally:
+        _track('queued', -1)
+        _release(queue_fd)
+
+    metrics.incr('admission.timeout')
+    return None
+
+
+async def _admit_async():
+    max_in_flight, max_queue, queue_wait = _limits()
+
+    slot = _try_slot('slot', max_in_flight)
+    if slot is not None:
+        return slot
+
+    queue_fd = _try_slot('queue', max_queue)
+    if queue_fd is None:
+        metrics.incr('admission.rejected')
+        return None
+
+    metrics.incr('admission.queued')
+    _track('queued', 1)
+    try:
+        deadline = time.monotonic() + queue_wait
+        while time.monotonic() < deadline:
+            await asyncio.sleep(POLL_INTERVAL)
+            slot = _try_slot('slot', max_in_flight)
+            if slot is not None:
+                return slot
+    finally:
+        _track('queued', -1)
+        _release(queue_fd)
+
+    metrics.incr('admission.timeout')
+    return None
+
+
+# =====================================================
+# Request'siz ish (WebSocket sessiyalari va kadrlari)
+# =====================================================
+
+@contextlib.asynccontextmanager
+async def admitted():
+    """
+    Bitta ish birligi uchun slot (navbatda kutish bilan). HTTP so'rovlari
+    bilan bir xil chegara va yuklama jadvali. True - slot olindi (yoki
+    admission o'chiq), False - host band.
+    """
+    if fcntl is None:
+        yield True
+        return
+
+    slot = await _admit_async()
+    if slot is None:
+        yield False
+        return
+
+    metrics.incr('admission.admitted')
+    _track('in_flight', 1)
+    try:
+        yield True
+    finally:
+        _track('in_flight', -1)
+        _release(slot)
+
+
+@contextlib.contextmanager
+def named_slot(prefix, count):
+    """
+    Kutmasdan olinadigan nomlangan slot (masalan, WebSocket sessiyalari soni).
+    True - olindi (yoki admission o'chiq), False - count ta slot band.
+    """
+    if fcntl is None:
+        yield True
+        return
+
+    fd = _try_slot(prefix, count)
+    try:
+        yield fd is not None
+    finally:
+        _release(fd)
+
+
+# =====================================================
+# Decorator
+# =====================================================
+
+def admission_controlled(view):
+    """
+    View'ni host bo'yicha in-flight chegarasi ortiga qo'yish (sync va async view'lar uchun).
+    Bitta so'rov ichida qayta chaqirilsa (async view → sync view) ikkinchi slot olinmaydi.
+    """
+    if asyncio.iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            if fcntl is None or getattr(request, '_face_admitted', False):
+                return await view(request, *args, **kwargs)
+
+            async with admitted() as ok:
+                if not ok:
+                    return overloaded_response()
+                request._face_admitted = True
+                return await view(request, *args, **kwargs)
+
+        return async_wrapper
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if fcntl is None or getattr(request, '_face_admitted', False):
+            return view(request, *args, **kwargs)
+
+        slot = _admit_sync()
+        if slot is None:
+            return overloaded_response()
+
+        request._face_admitted = True
+        metrics.incr('admission.admitted')
+        _track('in_flight', 1)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _track('in_flight', -1)
+            _release(slot)
+
+    return wrapper
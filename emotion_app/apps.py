@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class EmotionAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'emotion_app'
+
+    def ready(self):
+        # Person/User o'zgarganda login profili cache'ini tozalash
+        from . import signals  # noqa: F401
@@ -0,0 +1,288 @@
+"""
+emotion_app/async_views.py
+Async yuz tanish API - CPU ishlari cheklangan thread pool'larda (ASGI uchun)
+
+Har bir bosqich (decode, detect, encode) o'z thread pool'iga va navbat
+chegarasiga ega. Navbat to'lsa so'rov kutib qolmaydi - darhol 503 qaytadi.
+ORM murojaatlari async ORM yoki sync_to_async orqali bajariladi.
+"""
+import asyncio
+import functools
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import login
+from django.http import JsonResponse
+
+from .admission import admission_controlled, overloaded_response
+from .face_pipeline import LOGIN_PROFILE, confirm_client_face, encode_face_at, locate_primary_face, pipeline_profile
+from . import login_profiles
+from .inference_client import InferenceUnavailable, inference_enabled, remote_encode
+from .views import (
+    PersonRecognitionResult,
+    create_login_log,
+    face_login_auth,
+    face_login_response,
+    get_or_create_login_user,
+    frame_quality_gate,
+    match_known_faces,
+    quality_feedback,
+    read_request_image,
+    recognition_response,
+    request_face_hint,
+    verify_person_encoding,
+)
+
+
+# =====================================================
+# Pipeline bosqichlari (bounded executor)
+# =====================================================
+
+class StageBusy(Exception):
+    """Bosqich navbati to'lgan"""
+
+
+class PipelineStage:
+    """
+    Pipeline bosqichi: o'z thread pool'i, parallel ishlar soni (workers)
+    va kutayotgan ishlar chegarasi (max_queue) bilan.
+    """
+
+    def __init__(self, name, workers, max_queue, timeout):
+        self.name = name
+        self.workers = workers
+        self.max_pending = workers + max_queue
+        self.timeout = timeout
+        self.pending = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f'face-{name}')
+
+    async def run(self, func, *args):
+        """
+        func'ni bosqich pool'ida bajarish. timeout'da so'rov kutmaydi, lekin
+        slot thread'dagi ish haqiqatan tugagandagina bo'shaydi - max_pending
+        ishlayotgan ishlarni ham cheklaydi.
+        """
+        with self._lock:
+            if self.pending >= self.max_pending:
+                raise StageBusy(self.name)
+            self.pending += 1
+
+        try:
+            future = self._executor.submit(functools.partial(func, *args))
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+        return await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.timeout)
+
+    def _release(self, future=None):
+        with self._lock:
+            self.pending -= 1
+
+
+# (workers, max_queue, timeout sekund)
+DECODE_STAGE = PipelineStage('decode', workers=2, max_queue=16, timeout=5)
+DETECT_STAGE = PipelineStage('detect', workers=2, max_queue=8, timeout=10)
+ENCODE_STAGE = PipelineStage('encode', workers=2, max_queue=8, timeout=10)
+
+
+def busy_response(error):
+    """Bosqich band yoki javob bermadi - 503"""
+    stage = error.args[0] if isinstance(error, StageBusy) and error.args else 'pipeline'
+    return overloaded_response(extra={'stage': stage})
+
+
+async def encode_primary_face(image, hint=None):
+    """
+    decode → detect → encode bosqichlari. Inference daemon sozlangan bo'lsa
+    butun ish daemon'ga topshiriladi (encode bosqichi faqat kutadi).
+    hint - client yuborgan yuz box'i (request_face_hint): tasdiqlansa
+    detection bajarilmaydi (sync encode_image bilan bir xil).
+
+    Returns:
+        (encoding yoki None, decode bo'ldimi)
+    """
+    if inference_enabled():
+        try:
+            return await ENCODE_STAGE.run(remote_encode, image.data, hint)
+        except InferenceUnavailable as e:
+            print(f"⚠️  Inference daemon javob bermadi, lokal pipeline: {e}")
+
+    rgb_frame = await DECODE_STAGE.run(image.rgb, pipeline_profile(LOGIN_PROFILE)['max_side'])
+    if rgb_frame is None:
+        return None, False
+
+    box = await DETECT_STAGE.run(confirm_client_face, rgb_frame, hint) if hint else None
+    if box is None:
+        box, _ = await DETECT_STAGE.run(locate_primary_face, rgb_frame)
+    if box is None:
+        return None, True
+
+    encoding = await ENCODE_STAGE.run(encode_face_at, rgb_frame, box)
+    return encoding, True
+
+
+# =====================================================
+# API - Face Recognition (async)
+# =====================================================
+
+# csrf_exempt decorator'i Django 4.2 da async view'ni sync funksiyaga o'raydi
+# (view kutilmagan coroutine qaytaradi) - shuning uchun belgi atribut bilan
+# qo'yiladi, coroutine funksiya o'zgarmaydi.
+
+@admission_controlled
+async def detect_face_async(request):
+    """
+    Yuzni tanish API (async) - /api/face-detect/ bilan bir xil javob.
+
+    Client box'i (face_box / face_crop) va sifat filtri sync view bilan bir
+    xil. Kadr dedupe va ROI tracker'i yo'q: ular jarayon ichidagi sync holat,
+    async oqim esa asosan inference daemon bilan ishlaydi.
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "Only POST method allowed"}, status=405)
+
+    try:
+        try:
+            fields, image = read_request_image(request)
+        except ValueError:
+            return JsonResponse({"error": "Failed to decode image"}, status=400)
+
+        if image is None:
+            return JsonResponse({"error": "No image provided"}, status=400)
+
+        try:
+            hint = request_face_hint(fields, image)
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+
+        # Qorong'i / o'ta yorug' / xira kadrlar HOG'gacha rad etiladi
+        thumbnail = await DECODE_STAGE.run(image.thumbnail)
+        quality_issue = frame_quality_gate(thumbnail)
+        if quality_issue:
+            return recognition_response(PersonRecognitionResult(), extra=quality_feedback(quality_issue))
+
+        encoding, decoded = await encode_primary_face(image, hint)
+        del image, thumbnail
+
+        if not decoded:
+            return JsonResponse({"error": "Invalid image data"}, status=400)
+
+        if encoding is None:
+            return recognition_response(PersonRecognitionResult())
+
+        # Galereya cache/ORM orqali yuklanadi - sync_to_async
+        recognition_result = await sync_to_async(match_known_faces)([encoding])
+        return recognition_response(recognition_result)
+
+    except (StageBusy, asyncio.TimeoutError) as e:
+        return busy_response(e)
+    except Exception as e:
+        return JsonResponse(
+            {
+                "error": str(e),
+                "message": "Xatolik yuz berdi",
+            },
+            status=500,
+        )
+
+
+detect_face_async.csrf_exempt = True
+
+
+# =====================================================
+# API - Authentication (async)
+# =====================================================
+
+@admission_controlled
+async def face_login_auth_async(request):
+    """
+    SMART LOGIN API (async) - /api/face-login/ bilan bir xil oqim.
+
+    1:1 yuz tekshiruvi async pipeline'da bajariladi (client box'i bilan).
+    Rasm saqlash (yangi/eskirgan rasm) kabi kam uchraydigan holatlar sync
+    view'ga sync_to_async orqali topshiriladi.
+
+    Sifat filtri yo'q - sync login ham uni qo'llamaydi: 1:1 solishtirishda
+    yaroqsiz kadr moslik chegarasidan o'tmaydi, sifat javobi esa login API
+    formatini o'zgartirgan bo'lardi.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Only POST method allowed'}, status=405)
+
+    try:
+        data, image = read_request_image(request)
+
+        username_input = (data.get('username') or '').strip().upper()
+        if not username_input or not re.fullmatch(r'([A-Z]{2})(\d{7})', username_input):
+            # Xato javoblari sync view bilan bir xil bo'lishi uchun
+            return await sync_to_async(face_login_auth)(request)
+
+        # Login profili cache'i - 2-qadamda DB so'rovi va fayl stat'i yo'q
+        profile = await sync_to_async(login_profiles.get_profile)(username_input)
+        if profile is None:
+            return JsonResponse({
+                'success': False,
+                'error': "Passport ma'lumotlari noto'g'ri"
+            }, status=404)
+
+        person = profile.person
+        photo_age_days = profile.photo_age_days()
+        needs_new_photo = not person.photo or (photo_age_days is not None and photo_age_days > 30)
+
+        if needs_new_photo or image is None:
+            # Rasm so'rash / yangi rasm saqlash - sync oqim
+            return await sync_to_async(face_login_auth)(request)
+
+        # =============================
+        # 1:1 FACE RECOGNITION (async pipeline)
+        # =============================
+        try:
+            hint = request_face_hint(data, image)
+        except ValueError as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+        try:
+            current_encoding, decoded = await encode_primary_face(image, hint)
+        except (StageBusy, asyncio.TimeoutError) as e:
+            return busy_response(e)
+
+        if not decoded:
+            return JsonResponse({
+                'success': False,
+                'error': 'Rasmni decode qilib bo\'lmadi'
+            }, status=400)
+
+        confidence, error_response = verify_person_encoding(person, current_encoding, profile.template)
+        if error_response is not None:
+            return error_response
+
+        # =============================
+        # USER, LOGIN VA LOG
+        # =============================
+        user = await sync_to_async(login_profiles.profile_user)(profile, get_or_create_login_user)
+        user.backend = 'django.contrib.auth.backends.ModelBackend'
+        await sync_to_async(login)(request, user)
+
+        await sync_to_async(create_login_log)(
+            person=person,
+            login_method='face',
+            request=request,
+            image_bytes=image.data,
+            confidence=confidence
+        )
+
+        return face_login_response(person, user, 'face', confidence, photo_age_days)
+
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e),
+            'message': 'Login jarayonida xatolik'
+        }, status=500)
+
+
+face_login_auth_async.csrf_exempt = True
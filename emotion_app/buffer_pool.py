@@ -0,0 +1,51 @@
+"""
+emotion_app/buffer_pool.py
+Thread bo'yicha qayta ishlatiladigan kadr buferlari
+
+Kiosk kadrlari doim bir xil o'lchamda keladi. Shuning uchun resize va rang
+o'tkazish natijalari har safar yangi massivga emas, thread'ning oldindan
+ajratilgan buferiga yoziladi (OpenCV dst= parametri). Barqaror skanerlashda
+resize va rang o'tkazish qo'shimcha xotira ajratmaydi.
+
+Decode bundan mustasno: cv2.imdecode Python API'sida dst parametri yo'q va
+decode qilingan kadr RequestImage'da so'rov oxirigacha saqlanadi (umumiy
+buferga yozib bo'lmaydi). Har bir so'rov bitta decode kadrini ajratadi.
+
+Har bir nom uchun faqat oxirgi shakldagi bufer saqlanadi - o'lcham o'zgarsa
+eski bufer almashtiriladi (xotira cheklangan). Bufer faqat chaqiruv ichida
+ishlatiladi: keyingi kadr uni qayta yozadi, natijada saqlab qo'yilmaydi.
+"""
+import threading
+
+import numpy as np
+
+from . import metrics
+
+
+_local = threading.local()
+
+
+def frame_buffer(name, shape, dtype=np.uint8):
+    """Joriy thread'ning `name` buferi (shape/dtype mos kelmasa qayta ajratiladi)"""
+    buffers = getattr(_local, 'buffers', None)
+    if buffers is None:
+        buffers = _local.buffers = {}
+
+    buffer = buffers.get(name)
+    if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+        buffer = np.empty(shape, dtype=dtype)
+        buffers[name] = buffer
+        metrics.incr('buffers.allocated')
+    return buffer
+
+
+def release_buffers():
+    """Joriy thread'ning barcha buferlarini bo'shatish"""
+    buffers = getattr(_local, 'buffers', None)
+    if buffers:
+        buffers.clear()
+
+
+def pooled_bytes():
+    """Joriy thread buferlarining umumiy hajmi (bayt)"""
+    return sum(buffer.nbytes for buffer in (getattr(_local, 'buffers', None) or {}).values())
@@ -0,0 +1,186 @@
+"""
+emotion_app/detectors.py
+Yuz detektorlari registri - almashtiriladigan CPU backend'lar
+
+Backend'lar:
+- hog:   dlib HOG (face_recognition.face_locations) - standart
+- haar:  OpenCV Haar cascade (opencv-python bilan birga keladi) - eng tez, aniqligi past
+- mtcnn: mtcnn paketi - sekinroq, burilgan va kichik yuzlarda yaxshiroq
+
+Barcha backend'lar box'ni face_encodings kutgan formatda qaytaradi:
+(top, right, bottom, left), kadr chegarasida kesilgan.
+
+Tanlash: settings.FACE_DETECTOR = 'hog' | 'haar' | 'mtcnn'.
+Solishtirish: python manage.py benchmark_face_detectors --images <papka>
+"""
+import os
+import threading
+
+import cv2
+
+
+class DetectorUnavailable(Exception):
+    """Backend kutubxonasi yoki modeli o'rnatilmagan"""
+
+
+DETECTORS = {}
+
+DEFAULT_DETECTOR = 'hog'
+
+
+def register_detector(cls):
+    """Detector klassini registrga qo'shish (cls.name bo'yicha)"""
+    DETECTORS[cls.name] = cls
+    return cls
+
+
+def clip_box(box, shape):
+    top, right, bottom, left = box
+    return (
+        max(0, int(top)),
+        min(shape[1], int(right)),
+        min(shape[0], int(bottom)),
+        max(0, int(left)),
+    )
+
+
+def xywh_to_box(x, y, w, h, shape):
+    """(x, y, width, height) → (top, right, bottom, left)"""
+    return clip_box((y, x + w, y + h, x), shape)
+
+
+# =====================================================
+# Backend'lar
+# =====================================================
+
+@register_detector
+class HogDetector:
+    """dlib HOG - upsample har bir qadamda minimal yuz o'lchamini ikki baravar kamaytiradi"""
+
+    name = 'hog'
+
+    def __init__(self):
+        import face_recognition
+        self._face_recognition = face_recognition
+
+    def detect(self, rgb_frame, upsample=1):
+        return self._face_recognition.face_locations(
+            rgb_frame,
+            number_of_times_to_upsample=upsample,
+            model="hog"
+        )
+
+
+@register_detector
+class HaarDetector:
+    """
+    OpenCV Haar cascade (frontal yuz). upsample HOG bilan mos bo'lishi uchun
+    minimal yuz o'lchamiga aylantiriladi: 0 → 80px, 1 → 40px, 2 → 20px.
+    """
+
+    name = 'haar'
+    cascade_file = 'haarcascade_frontalface_default.xml'
+
+    def __init__(self):
+        from django.conf import settings
+
+        path = getattr(settings, 'FACE_HAAR_CASCADE', '') or os.path.join(
+            getattr(getattr(cv2, 'data', None), 'haarcascades', ''), self.cascade_file
+        )
+        if not os.path.exists(path):
+            raise DetectorUnavailable(f"Haar cascade topilmadi: {path}")
+
+        self._path = path
+        # CascadeClassifier thread-safe emas - har bir thread o'z nusxasini oladi
+        self._local = threading.local()
+
+    def _cascade(self):
+        cascade = getattr(self._local, 'cascade', None)
+        if cascade is None:
+            cascade = cv2.CascadeClassifier(self._path)
+            self._local.cascade = cascade
+        return cascade
+
+    def detect(self, rgb_frame, upsample=1):
+        gray = cv2.cvtColor(rgb_frame, cv2.COLOR_RGB2GRAY)
+        min_side = max(20, 80 >> max(0, upsample))
+        faces = self._cascade().detectMultiScale(
+            gray,
+            scaleFactor=1.1,
+            minNeighbors=5,
+            minSize=(min_side, min_side)
+        )
+        return [xywh_to_box(x, y, w, h, rgb_frame.shape) for (x, y, w, h) in faces]
+
+
+@register_detector
+class MtcnnDetector:
+    """mtcnn paketi (CNN kaskadi) - upsample hisobga olinmaydi"""
+
+    name = 'mtcnn'
+    min_confidence = 0.9
+
+    def __init__(self):
+        try:
+            from mtcnn import MTCNN
+        except ImportError as e:
+            raise DetectorUnavailable(f"mtcnn o'rnatilmagan: {e}")
+
+        self._detector = MTCNN()
+        self._lock = threading.Lock()
+
+    def detect(self, rgb_frame, upsample=1):
+        with self._lock:
+            faces = self._detector.detect_faces(rgb_frame)
+        return [
+            xywh_to_box(*face['box'], rgb_frame.shape)
+            for face in faces
+            if face.get('confidence', 1.0) >= self.min_confidence
+        ]
+
+
+# =====================================================
+# Detector olish
+# =====================================================
+
+_instances = {}
+_instances_lock = threading.Lock()
+
+
+def create_detector(name):
+    """Yangi detector nusxasi (DetectorUnavailable - backend ishlamasa)"""
+    cls = DETECTORS.get(name)
+    if cls is None:
+        raise DetectorUnavailable(f"Noma'lum detector: {name} (mavjud: {', '.join(DETECTORS)})")
+    return cls()
+
+
+def get_detector(name=None):
+    """
+    Jarayon bo'yicha bitta detector nusxasi. name berilmasa settings.FACE_DETECTOR.
+    Sozlangan backend ishlamasa HOG ishlatiladi.
+    """
+    if name is None:
+        try:
+            from django.conf import settings
+            name = getattr(settings, 'FACE_DETECTOR', '') or DEFAULT_DETECTOR
+        except Exception:
+            name = DEFAULT_DETECTOR
+
+    detector = _instances.get(name)
+    if detector is not None:
+        return detector
+
+    with _instances_lock:
+        detector = _instances.get(name)
+        if detector is None:
+            try:
+                detector = create_detector(name)
+            except DetectorUnavailable as e:
+                if name == DEFAULT_DETECTOR:
+                    raise
+                print(f"⚠️ {e} - {DEFAULT_DETECTOR} ishlatiladi")
+                detector = _instances.get(DEFAULT_DETECTOR) or create_detector(DEFAULT_DETECTOR)
+                _instances[DEFAULT_DETECTOR] = detector
+            _instances[name] = detector
+    return detector
@@ -0,0 +1,187 @@
+"""
+emotion_app/enrollment.py
+Yagona enrollment servisi - Person rasmini saqlash va face encoding yaratish
+
+Rasm so'rovning RequestImage'idan olinadi: login oqimida allaqachon decode
+qilingan kadr qayta ishlatiladi (baytlar qayta decode qilinmaydi). Kadr
+EXIF bo'yicha burilgan, ENROLL_PHOTO_MAX_SIDE gacha kichraytirilgan holda
+decode qilinadi (IMREAD_REDUCED - 4000px telefon rasmi to'liq decode
+qilinmaydi). Yuz shu massivdan aniqlanadi va accurate-enroll profili bilan
+encoding qilinadi. Saqlanadigan rasm (har doim JPEG) MEDIA_ROOT/faces ga bir
+marta, atomik (vaqtinchalik fayl + os.replace) yoziladi - diskdan qayta
+o'qilmaydi.
+
+Eski rasm faqat Person saqlangandan va tranzaksiya commit bo'lgandan keyin
+o'chiriladi; saqlash muvaffaqiyatsiz bo'lsa yangi rasm o'chiriladi, eski
+rasm joyida qoladi (save_with_photo).
+
+V1 da Person.photo - MEDIA_ROOT ga nisbatan path string ("faces/...jpg").
+"""
+import io
+import os
+import tempfile
+from datetime import datetime
+
+from django.conf import settings
+from django.db import transaction
+
+from . import metrics
+from .face_pipeline import (
+    ENROLL_PROFILE,
+    MAX_FRAME_SIDE,
+    encode_face_at,
+    locate_primary_face,
+    pipeline_profile,
+    scale_to_max_side,
+)
+from .request_image import RequestImage
+
+
+# Saqlanadigan rasm papkasi (MEDIA_ROOT ga nisbatan)
+ENROLL_PHOTO_DIR = 'faces'
+
+# Saqlanadigan va encoding qilinadigan rasmning eng uzun tomoni (px)
+ENROLL_PHOTO_MAX_SIDE = getattr(settings, 'FACE_ENROLL_PHOTO_MAX_SIDE', MAX_FRAME_SIDE)
+
+ENROLL_JPEG_QUALITY = 90
+
+
+def photo_path(person):
+    """Person rasmining diskdagi to'liq yo'li (rasm bo'lmasa None)"""
+    if not person.photo:
+        return None
+    return os.path.join(settings.MEDIA_ROOT, str(person.photo))
+
+
+def enrollment_frame(image):
+    """
+    RequestImage'dan ENROLL_PHOTO_MAX_SIDE bilan cheklangan RGB kadr (so'rovda
+    shu yoki kattaroq o'lchamda decode qilingan bo'lsa qayta decode qilinmaydi).
+    Ochib bo'lmasa yoki o'lchami ruxsat etilmagan bo'lsa ValueError.
+    """
+    if image.size is None:
+        raise ValueError("Rasmni ochib bo'lmadi")
+    if not image.allowed:
+        raise ValueError(f"Rasm o'lchami juda katta: {image.size[0]}x{image.size[1]}")
+
+    rgb_frame = image.rgb(ENROLL_PHOTO_MAX_SIDE)
+    if rgb_frame is None:
+        raise ValueError("Rasmni ochib bo'lmadi")
+    return rgb_frame
+
+
+def encode_photo(rgb_frame, profile=ENROLL_PROFILE):
+    """RGB massivdagi asosiy yuz (katta va markazga yaqin) descriptor'i (yuz topilmasa None)"""
+    rgb_frame, _ = scale_to_max_side(rgb_frame, pipeline_profile(profile)['max_side'])
+    box, _ = locate_primary_face(rgb_frame)
+    if box is None:
+        return None
+    return encode_face_at(rgb_frame, box, profile)
+
+
+def write_photo(rgb_frame, filename):
+    """
+    RGB kadrni JPEG sifatida MEDIA_ROOT/faces ga atomik yozish: vaqtinchalik
+    fayl shu papkada yaratiladi va os.replace bilan joyiga qo'yiladi (yarim
+    yozilgan rasm ko'rinmaydi).
+
+    Returns:
+        MEDIA_ROOT ga nisbatan path ("faces/...jpg")
+    """
+    from PIL import Image
+
+    output = io.BytesIO()
+    Image.fromarray(rgb_frame).save(output, format='JPEG', quality=ENROLL_JPEG_QUALITY, optimize=True)
+
+    photo_dir = os.path.join(settings.MEDIA_ROOT, ENROLL_PHOTO_DIR)
+    os.makedirs(photo_dir, exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(dir=photo_dir, prefix='.enroll-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(output.getbuffer())
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, os.path.join(photo_dir, filename))
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return f"{ENROLL_PHOTO_DIR}/{filename}"
+
+
+def remove_photo(relative_path):
+    """Rasmni diskdan o'chirish (faqat MEDIA_ROOT ichida)"""
+    if not relative_path:
+        return
+    media_root = os.path.realpath(settings.MEDIA_ROOT)
+    path = os.path.realpath(os.path.join(media_root, str(relative_path)))
+    if not path.startswith(media_root + os.sep):
+        return
+    try:
+        os.remove(path)
+        print(f"✅ Rasm o'chirildi: {relative_path}")
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"⚠️  Rasmni o'chirishda xatolik: {e}")
+
+
+def save_with_photo(person, old_photo, **save_kwargs):
+    """
+    person.save() - rasm almashtirilgan bo'lsa eski rasm tranzaksiya commit
+    bo'lgandan keyin o'chiriladi. Saqlashda xatolik bo'lsa hech qayerdan
+    ishora qilinmaydigan yangi rasm o'chiriladi va xatolik qayta chiqariladi.
+    """
+    new_photo = str(person.photo) if person.photo else None
+    old_photo = str(old_photo) if old_photo else None
+    try:
+        person.save(**save_kwargs)
+    except Exception:
+        if new_photo and new_photo != old_photo:
+            remove_photo(new_photo)
+        raise
+    if old_photo and old_photo != new_photo:
+        transaction.on_commit(lambda: remove_photo(old_photo))
+
+
+def enroll_person(person, image, save=True, suffix=''):
+    """
+    Person uchun yangi rasm va face encoding.
+
+    image - so'rovning RequestImage'i (decode qilingan kadr qayta ishlatiladi)
+    yoki rasm baytlari (Excel / URL rasmlari).
+
+    1. RGB kadr olinadi (EXIF bo'yicha burilgan, ENROLL_PHOTO_MAX_SIDE)
+    2. Yuz shu massivdan aniqlanadi va encoding qilinadi
+    3. Rasm bir marta, atomik saqlanadi
+    4. person.photo va person.face_encoding yangilanadi (save=True bo'lsa
+       faqat shu ikki maydon saqlanadi - User sinxronizatsiyasi kerak emas)
+       va eski rasm commit'dan keyin o'chiriladi
+
+    save=False bo'lsa eski rasmga tegilmaydi: chaqiruvchi Person'ni
+    save_with_photo(person, old_photo) bilan saqlaydi.
+
+    Yuz topilmasa ham rasm saqlanadi (face_encoding = None).
+    Rasmni ochib bo'lmasa ValueError.
+
+    Returns:
+        encoding (numpy massiv) yoki None
+    """
+    if not isinstance(image, RequestImage):
+        image = RequestImage(bytes(image))
+    rgb_frame = enrollment_frame(image)
+    encoding = encode_photo(rgb_frame)
+
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    new_photo = write_photo(rgb_frame, f"person_{person.id}_{timestamp}{suffix}.jpg")
+
+    old_photo = str(person.photo) if person.photo else None
+    person.photo = new_photo
+    person.face_encoding = encoding.tolist() if encoding is not None else None
+    if save:
+        save_with_photo(person, old_photo, update_fields=['photo', 'face_encoding'])
+
+    metrics.incr('enroll.photos')
+    if encoding is None:
+        metrics.incr('enroll.no_face')
+    return encoding
@@ -0,0 +1,768 @@
+"""
+emotion_app/face_pipeline.py
+Yuz tanish pipeline - cheklangan o'lchamli kadr, avval detection, keyin encoding
+
+face_recognition (dlib modellari) faqat birinchi ishlatilganda import qilinadi -
+inference daemon ishlatilganda web worker'lar modellarni xotiraga yuklamaydi.
+"""
+import heapq
+import io
+
+import cv2
+import numpy as np
+
+from . import metrics
+from .buffer_pool import frame_buffer
+from .detectors import get_detector
+
+
+# =====================================================
+# Pipeline sozlamalari
+# =====================================================
+
+# Encoding qilinadigan kadrning maksimal tomoni (px)
+MAX_FRAME_SIDE = 1280
+
+# Detection kichraytirilgan kadrda ishlaydi (maksimal tomoni, px)
+DETECT_MAX_SIDE = 640
+
+# HOG upsample soni (kichik kadrda 1 marta)
+DETECT_UPSAMPLE = 1
+
+# Adaptiv detection zinapoyasi: (kadrning maksimal tomoni, upsample) - arzonidan boshlab.
+# Yuz topilmasa keyingi pog'onaga o'tiladi. settings.FACE_DETECTION_LADDER bilan almashtiriladi.
+DETECTION_LADDER = (
+    (640, 0),
+    (960, 1),
+)
+
+# Tezkor tanish (recognize_face_fast) ishlaydigan kadr o'lchami (1280x720 * 0.75).
+# Kiosk kadrni shu o'lchamda yuborsa serverda qo'shimcha resize kerak emas.
+WORKING_MAX_SIDE = 960
+
+# Galereya shablonlari (Person.face_encoding) shu landmark modeli bilan hisoblangan
+# (face_recognition standarti - mavjud qatorlar ham shunday). Probe boshqa model bilan
+# hisoblansa masofalar siljiydi va 0.5 chegarasi qayta kalibrlanmagan bo'ladi -
+# shuning uchun login va enrollment doim shu modelda.
+GALLERY_LANDMARK_MODEL = 'small'
+
+# Pipeline profillari - har bir chaqiruv joyi uchun aniqlik/tezlik muvozanati:
+# - landmark_model: 'small' (5 nuqta, tez) yoki 'large' (68 nuqta)
+# - num_jitters: descriptor necha marta siljitilgan nusxada hisoblanib o'rtachalanadi
+# - max_side: encoding qilinadigan kadrning maksimal tomoni
+# settings.FACE_PIPELINE_PROFILES = {'fast-login': {'num_jitters': 2}} bilan almashtiriladi
+# (login va enrollment profillarida landmark_model o'zgartirilmaydi).
+# Enrollment jitter'i mavjud shablonlar bilan bir xil (1) - har bir jitter
+# encoding vaqtini yana bir barobar oshiradi.
+PIPELINE_PROFILES = {
+    'fast-login': {'landmark_model': GALLERY_LANDMARK_MODEL, 'num_jitters': 1, 'max_side': WORKING_MAX_SIDE},
+    'accurate-enroll': {'landmark_model': GALLERY_LANDMARK_MODEL, 'num_jitters': 1, 'max_side': MAX_FRAME_SIDE},
+    # Faqat o'zaro solishtirish uchun (benchmark) - galereya bilan solishtirilmaydi
+    'audit': {'landmark_model': 'large', 'num_jitters': 10, 'max_side': MAX_FRAME_SIDE},
+}
+
+LOGIN_PROFILE = 'fast-login'
+ENROLL_PROFILE = 'accurate-enroll'
+
+# Galereya bilan solishtiriladigan encoding'lar hisoblanadigan profillar
+GALLERY_PROFILES = (LOGIN_PROFILE, ENROLL_PROFILE)
+
+# Qabul qilinadigan rasm o'lchami chegaralari (decode'dan oldin header'dan tekshiriladi)
+MAX_IMAGE_SIDE = 8192
+MAX_IMAGE_PIXELS = 32 * 1000 * 1000
+
+# JPEG'ni DCT bosqichida kichraytirib decode qilish (eng katta koeffitsiyent birinchi)
+REDUCED_COLOR_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+
+# =====================================================
+# Decode va o'lcham
+# =====================================================
+
+def probe_image_size(image_bytes):
+    """Rasm header'idan (width, height) - piksellar decode qilinmaydi. Aniqlab bo'lmasa None."""
+    from PIL import Image
+
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            return img.size
+    except Exception:
+        return None
+
+
+def image_size_allowed(size):
+    width, height = size
+    return (
+        0 < width <= MAX_IMAGE_SIDE
+        and 0 < height <= MAX_IMAGE_SIDE
+        and width * height <= MAX_IMAGE_PIXELS
+    )
+
+
+def decode_image_bytes(image_bytes, max_side=None, size=None):
+    """
+    Rasm baytlarini BGR numpy massivga aylantirish.
+
+    1. Header tekshiriladi - o'lchami aniqlanmagan yoki juda katta rasm decode qilinmaydi
+    2. max_side berilsa JPEG to'g'ridan-to'g'ri kichraytirilgan holda decode qilinadi
+       (IMREAD_REDUCED_COLOR_2/4/8, natija max_side dan kichik bo'lmaydi), keyin aniq cap
+
+    IMREAD_COLOR har doim 3 kanal qaytaradi (RGBA/grayscale muammosi yo'q).
+    size - oldindan o'qilgan header o'lchami (berilsa header qayta o'qilmaydi).
+    Natija yangi massiv (buffer_pool emas) - chaqiruvchi uni saqlab qo'yishi mumkin.
+    Decode bo'lmasa None qaytaradi.
+    """
+    if size is None:
+        size = probe_image_size(image_bytes)
+    if size is None:
+        return None
+    if not image_size_allowed(size):
+        print(f"⚠️  Rasm o'lchami ruxsat etilmagan: {size[0]}x{size[1]}")
+        return None
+
+    flag = cv2.IMREAD_COLOR
+    if max_side:
+        longest = max(size)
+        for factor, reduced_flag in REDUCED_COLOR_FLAGS:
+            if longest // factor >= max_side:
+                flag = reduced_flag
+                break
+
+    frame = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), flag)
+    if frame is None or frame.size == 0:
+        return None
+
+    if max_side:
+        frame, _ = scale_to_max_side(frame, max_side)
+    return frame
+
+
+def decode_thumbnail(image_bytes, size=None):
+    """
+    1/8 o'lchamli grayscale thumbnail - JPEG'da to'liq decode'dan bir necha
+    barobar arzon. Dedupe hash va sifat filtri uchun. Decode bo'lmasa None.
+    """
+    if size is None:
+        size = probe_image_size(image_bytes)
+    if size is None or not image_size_allowed(size):
+        return None
+
+    gray = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if gray is None or gray.size == 0:
+        return None
+    return gray
+
+
+def frame_dhash(thumbnail):
+    """Thumbnail'ning 64-bit perceptual hash'i (dHash)"""
+    small = cv2.resize(thumbnail, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def hamming_distance(hash_a, hash_b):
+    return bin(hash_a ^ hash_b).count('1')
+
+
+# =====================================================
+# Sifat filtri (HOG'dan oldin, thumbnail'da)
+# =====================================================
+
+# Standart chegaralar - settings.FACE_QUALITY_THRESHOLDS bilan almashtiriladi
+QUALITY_THRESHOLDS = {
+    'min_brightness': 40,         # o'rtacha yorqinlik (0-255) - past bo'lsa too_dark
+    'max_brightness': 220,        # yuqori bo'lsa too_bright
+    'max_clipped_ratio': 0.4,     # oq (>=250) piksellar ulushi - oshsa too_bright
+    'min_contrast': 12,           # yorqinlik std - past bo'lsa low_contrast
+    'min_sharpness': 15.0,        # Laplacian dispersiyasi - past bo'lsa blurry
+}
+
+QUALITY_MESSAGES = {
+    'too_dark': "Yorug'lik yetarli emas. Yorug'roq joyda turing.",
+    'too_bright': "Juda yorug'. Kameraga to'g'ridan-to'g'ri yorug'lik tushmasin.",
+    'low_contrast': "Kadr aniq emas. Kameraga to'g'ri qarang.",
+    'blurry': "Qimirlamang - kadr xira chiqdi.",
+}
+
+
+def frame_quality_issue(gray, thresholds=None):
+    """
+    Thumbnail (decode_thumbnail) bo'yicha kadr yuz tanish uchun yaroqsiz bo'lsa
+    sabab kodi, aks holda None. Sabablar: too_dark, too_bright, low_contrast, blurry
+    """
+    limits = dict(QUALITY_THRESHOLDS, **(thresholds or {}))
+
+    mean, std = cv2.meanStdDev(gray)
+    mean = float(mean[0][0])
+    std = float(std[0][0])
+
+    if mean < limits['min_brightness']:
+        return 'too_dark'
+    if mean > limits['max_brightness'] or np.count_nonzero(gray >= 250) > limits['max_clipped_ratio'] * gray.size:
+        return 'too_bright'
+    if std < limits['min_contrast']:
+        return 'low_contrast'
+    if cv2.Laplacian(gray, cv2.CV_32F).var() < limits['min_sharpness']:
+        return 'blurry'
+    return None
+
+
+def scale_to_max_side(frame, max_side, buffer_name=None):
+    """
+    Kadrni eng uzun tomoni max_side dan oshmaydigan qilib kichraytirish.
+    (kadr, scale) qaytaradi - kichraytirish kerak bo'lmasa scale = 1.0
+
+    buffer_name berilsa natija thread'ning qayta ishlatiladigan buferiga yoziladi
+    (buffer_pool) - faqat chaqiruv ichida ishlatiladigan kadrlar uchun.
+    """
+    h, w = frame.shape[:2]
+    longest = max(h, w)
+    if longest <= max_side:
+        return frame, 1.0
+
+    scale = max_side / float(longest)
+    size = (max(1, int(round(w * scale))), max(1, int(round(h * scale))))
+    # 2 martadan kam kichraytirishda INTER_LINEAR yetarli va INTER_AREA dan ~5x tez
+    interpolation = cv2.INTER_AREA if scale <= 0.5 else cv2.INTER_LINEAR
+    if buffer_name is None:
+        return cv2.resize(frame, size, interpolation=interpolation), scale
+
+    dst = frame_buffer(buffer_name, (size[1], size[0]) + frame.shape[2:], frame.dtype)
+    cv2.resize(frame, size, dst=dst, interpolation=interpolation)
+    return dst, scale
+
+
+def working_rgb(frame, max_side, buffer_name='working'):
+    """
+    BGR kadr → kichraytirilgan RGB kadr, thread buferida (yangi massiv ajratilmaydi).
+    Kichraytirilgan bo'lsa rang o'tkazish shu buferning o'zida bajariladi;
+    asl kadr o'zgartirilmaydi. Natija keyingi chaqiruvda qayta yoziladi.
+    """
+    small_frame, _ = scale_to_max_side(frame, max_side, buffer_name)
+    if small_frame is frame:
+        rgb_frame = frame_buffer(buffer_name, frame.shape, frame.dtype)
+    else:
+        rgb_frame = small_frame
+    cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB, dst=rgb_frame)
+    return rgb_frame
+
+
+def cap_frame_size(frame, max_side=MAX_FRAME_SIDE):
+    """Kadr o'lchamini MAX_FRAME_SIDE bilan cheklash"""
+    capped, _ = scale_to_max_side(frame, max_side)
+    return capped
+
+
+# =====================================================
+# Detection va encoding
+# =====================================================
+
+def box_area(box):
+    """(top, right, bottom, left) box maydoni"""
+    top, right, bottom, left = box
+    return max(0, bottom - top) * max(0, right - left)
+
+
+def primary_face_box(face_locations, frame_shape):
+    """
+    Kiosk oldidagi asosiy yuz: katta va markazga yaqin box.
+    Score = maydon * (1 - 0.5 * markazdan normallashgan masofa) - orqada
+    o'tayotgan kichik yuzlar yoki chetdagi odamlar tanlanmaydi.
+    """
+    h, w = frame_shape[:2]
+    center_y, center_x = h / 2.0, w / 2.0
+    half_diagonal = np.hypot(center_x, center_y) or 1.0
+
+    def score(box):
+        top, right, bottom, left = box
+        offset = np.hypot((left + right) / 2.0 - center_x, (top + bottom) / 2.0 - center_y)
+        return box_area(box) * (1.0 - 0.5 * offset / half_diagonal)
+
+    return max(face_locations, key=score)
+
+
+def map_box_to_frame(box, scale, frame_shape):
+    """Kichik kadrdagi box'ni asl kadr koordinatalariga qaytarish"""
+    h, w = frame_shape[:2]
+    top, right, bottom, left = box
+    inv = 1.0 / scale
+    return (
+        max(0, int(top * inv)),
+        min(w, int(round(right * inv))),
+        min(h, int(round(bottom * inv))),
+        max(0, int(left * inv)),
+    )
+
+
+def detection_ladder():
+    """Joriy detection zinapoyasi (settings.FACE_DETECTION_LADDER yoki standart)"""
+    try:
+        from django.conf import settings
+        return tuple(getattr(settings, 'FACE_DETECTION_LADDER', None) or DETECTION_LADDER)
+    except Exception:
+        return DETECTION_LADDER
+
+
+def detect_faces_adaptive(rgb_frame, ladder=None, detector=None):
+    """
+    Zinapoya bo'yicha detection: arzon pog'onada (kichik kadr, upsample 0)
+    yuz topilsa shu yerda to'xtaydi, topilmasa keyingi pog'onaga o'tadi.
+    Qaysi pog'onada topilgani metrics'da sanaladi (detect.rung_N / detect.miss).
+
+    detector berilmasa settings.FACE_DETECTOR backend'i (detectors.get_detector).
+
+    Returns:
+        (box'lar kadr koordinatalarida, yuz topilgan pog'ona indeksi yoki None)
+    """
+    detector = detector or get_detector()
+    ladder = ladder or detection_ladder()
+    for rung, (max_side, upsample) in enumerate(ladder):
+        small_frame, scale = scale_to_max_side(rgb_frame, max_side, f'detect_{max_side}')
+        face_locations = detector.detect(small_frame, upsample)
+        if face_locations:
+            metrics.incr(f'detect.rung_{rung}')
+            if rung > 0:
+                print(f"🔎 Yuz {rung}-pog'onada topildi ({max_side}px, upsample={upsample})")
+            return [map_box_to_frame(box, scale, rgb_frame.shape) for box in face_locations], rung
+
+    metrics.incr('detect.miss')
+    return [], None
+
+
+def pipeline_profile(name=LOGIN_PROFILE):
+    """Profil sozlamalari: standart qiymatlar + settings.FACE_PIPELINE_PROFILES"""
+    if name not in PIPELINE_PROFILES:
+        raise ValueError(f"Noma'lum pipeline profili: {name}")
+
+    profile = dict(PIPELINE_PROFILES[name])
+    try:
+        from django.conf import settings
+        profile.update((getattr(settings, 'FACE_PIPELINE_PROFILES', None) or {}).get(name, {}))
+    except Exception:
+        pass
+
+    if name in GALLERY_PROFILES and profile['landmark_model'] != GALLERY_LANDMARK_MODEL:
+        print(f"⚠️  {name}: landmark_model galereya bilan bir xil bo'lishi kerak ({GALLERY_LANDMARK_MODEL})")
+        profile['landmark_model'] = GALLERY_LANDMARK_MODEL
+    return profile
+
+
+def encoding_options(name=LOGIN_PROFILE):
+    """face_recognition.face_encodings uchun kalit argumentlar (model, num_jitters)"""
+    profile = pipeline_profile(name)
+    return {'model': profile['landmark_model'], 'num_jitters': profile['num_jitters']}
+
+
+def locate_primary_face(rgb_frame, detect_max_side=DETECT_MAX_SIDE, upsample=DETECT_UPSAMPLE):
+    """
+    Kichraytirilgan kadrda yuzlarni topish va asosiy yuz box'ini
+    (primary_face_box - katta va markazga yaqin) asl kadr koordinatalarida
+    qaytarish. Login, async view'lar, inference daemon va enrollment bir xil
+    kadrdan bir xil yuzni tanlaydi.
+
+    Returns:
+        (box yoki None, topilgan yuzlar soni)
+    """
+    # Avval upsample'siz, yuz topilmasa upsample bilan
+    ladder = ((detect_max_side, 0), (detect_max_side, upsample)) if upsample else ((detect_max_side, 0),)
+    face_locations, _ = detect_faces_adaptive(rgb_frame, ladder)
+
+    if not face_locations:
+        return None, 0
+
+    return primary_face_box(face_locations, rgb_frame.shape), len(face_locations)
+
+
+# =====================================================
+# Client yuborgan yuz box'i
+# =====================================================
+
+# Tasdiqlash ROI'si: box har tomonga o'z o'lchamining shuncha qismiga kengaytiriladi
+CLIENT_BOX_MARGIN = 0.25
+
+# Box kadrdan shuncha qismdan ko'p chiqib ketsa rad etiladi
+CLIENT_BOX_MAX_OVERFLOW = 0.2
+
+# Box cheklovlari (ishchi kadrda): minimal tomon (px) va eni/bo'yi nisbati
+CLIENT_BOX_MIN_SIDE = 40
+CLIENT_BOX_ASPECT = (0.5, 2.0)
+
+# Tasdiqlash detection'i uchun yuz shu o'lchamga keltiriladi (HOG oynasi 80px)
+CLIENT_BOX_CONFIRM_SIDE = 100
+
+
+def expand_box(box, ratio, shape):
+    """Box'ni har tomonga ratio qadar kengaytirish (kadr chegarasida kesiladi)"""
+    top, right, bottom, left = box
+    dy = int((bottom - top) * ratio)
+    dx = int((right - left) * ratio)
+    return (
+        max(0, top - dy),
+        min(shape[1], right + dx),
+        min(shape[0], bottom + dy),
+        max(0, left - dx),
+    )
+
+
+def parse_face_box(value):
+    """
+    Client box'i: [top, right, bottom, left] ro'yxati yoki "top,right,bottom,left" satri.
+    Berilmagan bo'lsa None, noto'g'ri formatda ValueError.
+    """
+    if value in (None, ''):
+        return None
+    if isinstance(value, str):
+        value = value.split(',')
+    if not isinstance(value, (list, tuple)) or len(value) != 4:
+        raise ValueError("face_box: [top, right, bottom, left] kutiladi")
+    return tuple(int(round(float(v))) for v in value)
+
+
+def client_face_hint(face_box=None, cropped=False, image_bytes=None, source_size=None):
+    """
+    Client yuborgan yuz ma'lumoti (JSON'ga o'tadigan dict - daemon'ga ham yuboriladi) yoki None.
+
+    - cropped: rasmning o'zi kesilgan yuz
+    - face_box: asl rasm koordinatalaridagi box; ishchi kadrga o'tkazish uchun
+      asl o'lcham header'dan olinadi (server kadrni kichraytirib decode qiladi)
+    """
+    if cropped:
+        return {'cropped': True}
+
+    box = parse_face_box(face_box)
+    if box is None:
+        return None
+
+    size = source_size
+    if size is None and image_bytes is not None:
+        size = probe_image_size(image_bytes)
+    return {'box': list(box), 'source_size': list(size) if size else None}
+
+
+def confirm_client_face(rgb_frame, hint, detector=None):
+    """
+    Client box'ini arzon tekshirish (butun kadr detection'i o'rniga):
+    1. Margin check - box kadr ichida, yetarli kattalikda va yuzga o'xshash nisbatda
+    2. Box atrofidagi kichik ROI'da detection (yuz ~CLIENT_BOX_CONFIRM_SIDE px ga keltiriladi)
+
+    Returns:
+        tasdiqlangan box (kadr koordinatalarida, detector aniqlagan) yoki None
+    """
+    height, width = rgb_frame.shape[:2]
+
+    if hint.get('cropped'):
+        box = (0, width, height, 0)
+    else:
+        source_width, source_height = hint.get('source_size') or (width, height)
+        sx = width / float(source_width)
+        sy = height / float(source_height)
+        top, right, bottom, left = hint['box']
+        box = (int(top * sy), int(right * sx), int(bottom * sy), int(left * sx))
+
+    top, right, bottom, left = box
+    face_width, face_height = right - left, bottom - top
+    clipped = (max(0, top), min(width, right), min(height, bottom), max(0, left))
+    if (face_width < CLIENT_BOX_MIN_SIDE or face_height < CLIENT_BOX_MIN_SIDE
+            or not CLIENT_BOX_ASPECT[0] <= face_width / float(face_height) <= CLIENT_BOX_ASPECT[1]
+            or box_area(clipped) < (1 - CLIENT_BOX_MAX_OVERFLOW) * box_area(box)):
+        metrics.incr('client_box.invalid')
+        return None
+
+    if hint.get('cropped'):
+        # Kesilgan yuz chetigacha to'la - HOG uchun atrofiga chegara qo'shiladi
+        dy, dx = int(face_height * CLIENT_BOX_MARGIN), int(face_width * CLIENT_BOX_MARGIN)
+        roi = cv2.copyMakeBorder(rgb_frame, dy, dy, dx, dx, cv2.BORDER_REPLICATE)
+        roi_top, roi_left = -dy, -dx
+    else:
+        roi_top, roi_right, roi_bottom, roi_left = expand_box(clipped, CLIENT_BOX_MARGIN, rgb_frame.shape)
+        roi = rgb_frame[roi_top:roi_bottom, roi_left:roi_right]
+
+    scale = min(1.0, CLIENT_BOX_CONFIRM_SIDE / float(min(face_width, face_height)))
+    if scale < 1.0:
+        roi = cv2.resize(roi, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    upsample = 0 if min(face_width, face_height) * scale >= 80 else 1
+
+    face_locations = (detector or get_detector()).detect(np.ascontiguousarray(roi), upsample)
+    if not face_locations:
+        metrics.incr('client_box.rejected')
+        return None
+
+    metrics.incr('client_box.confirmed')
+    t, r, b, l = max(face_locations, key=box_area)
+    return (
+        max(0, int(t / scale) + roi_top),
+        min(width, int(r / scale) + roi_left),
+        min(height, int(b / scale) + roi_top),
+        max(0, int(l / scale) + roi_left),
+    )
+
+
+def decode_to_rgb(image_bytes, max_side=MAX_FRAME_SIDE):
+    """Rasm baytlaridan cheklangan o'lchamli RGB kadr (decode bo'lmasa None)"""
+    frame = decode_image_bytes(image_bytes, max_side)
+    if frame is None:
+        return None
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+
+def encode_face_at(rgb_frame, box, profile=LOGIN_PROFILE):
+    """Berilgan box'dagi bitta yuz uchun descriptor (bo'lmasa None)"""
+    import face_recognition
+
+    encodings = face_recognition.face_encodings(rgb_frame, [box], **encoding_options(profile))
+    if not encodings:
+        return None
+    return encodings[0]
+
+
+def encode_primary_face(frame, profile=LOGIN_PROFILE, hint=None):
+    """
+    BGR kadrdan faqat asosiy yuz (primary_face_box) uchun 128 o'lchamli descriptor olish.
+
+    1. Kadr profil max_side'i bilan cheklanadi
+    2. Client box'i (hint) bo'lsa u tasdiqlanadi, aks holda (yoki tasdiqlanmasa)
+       detection kichik kadrda (DETECT_MAX_SIDE) bajariladi
+    3. Box cheklangan kadrga qaytariladi va faqat shu yuz encoding qilinadi
+       (profil landmark modeli va jitter soni bilan)
+
+    Yuz topilmasa None qaytaradi.
+    """
+    rgb_frame = working_rgb(frame, pipeline_profile(profile)['max_side'])
+
+    box = confirm_client_face(rgb_frame, hint) if hint else None
+    if box is None:
+        box, _ = locate_primary_face(rgb_frame)
+    if box is None:
+        return None
+
+    return encode_face_at(rgb_frame, box, profile)
+
+
+def face_encodings_from_file(path, profile=ENROLL_PROFILE):
+    """
+    Rasm faylidagi asosiy yuz descriptor'i - face_recognition.face_encodings
+    kabi ro'yxat qaytaradi (yuz topilmasa bo'sh).
+    """
+    with open(path, 'rb') as f:
+        frame = decode_image_bytes(f.read(), pipeline_profile(profile)['max_side'])
+    if frame is None:
+        return []
+
+    encoding = encode_primary_face(frame, profile)
+    return [encoding] if encoding is not None else []
+
+
+# =====================================================
+# Ko'p kadrli (batch) ishlov berish
+# =====================================================
+
+# Batch so'rovda ko'pi bilan nechta kadr qabul qilinadi
+MAX_BATCH_FRAMES = 5
+
+# Eng sifatli nechta yuz descriptor'i hisoblanadi
+BATCH_TOP_FACES = 2
+
+
+def face_sharpness(rgb_frame, box):
+    """Yuz qismining aniqligi (Laplacian dispersiyasi)"""
+    top, right, bottom, left = box
+    crop = rgb_frame[top:bottom, left:right]
+    if crop.size == 0:
+        return 0.0
+    gray = cv2.cvtColor(crop, cv2.COLOR_RGB2GRAY)
+    # O'lchamga bog'liq bo'lmasligi uchun bir xil kattalikka keltirish
+    gray = cv2.resize(gray, (96, 96), interpolation=cv2.INTER_AREA)
+    return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+
+def face_quality_score(rgb_frame, box):
+    """Yuz sifati bahosi: kattaroq va aniqroq yuz - yuqori ball"""
+    return float(np.sqrt(box_area(box)) * np.log1p(face_sharpness(rgb_frame, box)))
+
+
+def encode_faces_batched(items, profile=LOGIN_PROFILE):
+    """
+    Bir nechta kadrdagi yuzlar uchun descriptor'larni bitta dlib chaqiruvida hisoblash.
+
+    Args:
+        items: [(rgb_frame, [box, ...]), ...]
+        profile: pipeline profili (landmark modeli va jitter soni)
+
+    Returns:
+        Har bir kadr uchun encoding'lar ro'yxati: [[np.ndarray, ...], ...]
+    """
+    from face_recognition.api import face_encoder, pose_predictor_5_point, pose_predictor_68_point, _css_to_rect
+    import dlib
+
+    options = pipeline_profile(profile)
+    pose_predictor = pose_predictor_68_point if options['landmark_model'] == 'large' else pose_predictor_5_point
+
+    batch_images = []
+    batch_faces = []
+    for rgb_frame, boxes in items:
+        detections = dlib.full_object_detections()
+        for box in boxes:
+            detections.append(pose_predictor(rgb_frame, _css_to_rect(box)))
+        batch_images.append(np.ascontiguousarray(rgb_frame))
+        batch_faces.append(detections)
+
+    if not batch_images:
+        return []
+
+    descriptors = face_encoder.compute_face_descriptor(batch_images, batch_faces, options['num_jitters'])
+    return [[np.array(descriptor) for descriptor in per_image] for per_image in descriptors]
+
+
+def best_face_candidates(frames, top=BATCH_TOP_FACES):
+    """
+    Har bir BGR kadrda asosiy yuzni topish va sifati bo'yicha eng yaxshilarini tanlash.
+
+    Returns:
+        (kandidatlar, yuz topilgan kadrlar soni)
+        kandidat: {'index', 'rgb', 'box', 'score'} - score bo'yicha kamayish tartibida
+    """
+    candidates = []
+    for index, frame in enumerate(frames):
+        rgb_frame = cv2.cvtColor(cap_frame_size(frame), cv2.COLOR_BGR2RGB)
+        box, _ = locate_primary_face(rgb_frame)
+        if box is None:
+            continue
+        candidates.append({
+            'index': index,
+            'rgb': rgb_frame,
+            'box': box,
+            'score': face_quality_score(rgb_frame, box),
+        })
+
+    faces_found = len(candidates)
+    candidates.sort(key=lambda c: c['score'], reverse=True)
+    return candidates[:top], faces_found
+
+
+# =====================================================
+# Video klip (MJPEG oqimi yoki OpenCV ochadigan konteyner)
+# =====================================================
+
+# Klipdan ko'pi bilan nechta kadr baholanadi (teng oraliqda tanlanadi)
+CLIP_MAX_FRAMES = 30
+
+# Konteynerdan ko'pi bilan nechta kadr o'qiladi (~10 s, 30 fps)
+CLIP_MAX_READ_FRAMES = 300
+
+# Aniqlik bo'yicha eng yaxshi nechta kadrda yuz qidiriladi
+CLIP_DETECT_FRAMES = 4
+
+# Aniqlik baholanadigan kichik kadr eni (px)
+CLIP_SCORE_WIDTH = 160
+
+JPEG_SOI = b'\xff\xd8'
+JPEG_EOI = b'\xff\xd9'
+
+
+def is_mjpeg(data):
+    """MJPEG oqimimi: JPEG bilan yoki multipart boundary (--frame) + JPEG bilan boshlanadi"""
+    head = bytes(data[:1024])
+    return head.startswith(JPEG_SOI) or (head.startswith(b'--') and JPEG_SOI in head)
+
+
+def split_mjpeg(data):
+    """MJPEG oqimi (ketma-ket JPEG'lar, boundary'lar bilan yoki ularsiz) → JPEG baytlari ro'yxati"""
+    data = bytes(data)
+    frames = []
+    start = data.find(JPEG_SOI)
+    while start != -1:
+        end = data.find(JPEG_EOI, start + 2)
+        if end == -1:
+            break
+        frames.append(data[start:end + 2])
+        start = data.find(JPEG_SOI, end + 2)
+    return frames
+
+
+def sample_evenly(items, limit):
+    """Ro'yxatdan teng oraliqda ko'pi bilan limit ta element"""
+    if len(items) <= limit:
+        return list(items)
+    indexes = np.linspace(0, len(items) - 1, limit).round().astype(int)
+    return [items[i] for i in indexes]
+
+
+def gray_sharpness(gray):
+    """Kulrang kichik kadr aniqligi (Laplacian dispersiyasi)"""
+    return float(cv2.Laplacian(gray, cv2.CV_32F).var())
+
+
+def sharpest_mjpeg_frames(jpeg_frames, keep=CLIP_DETECT_FRAMES, max_side=MAX_FRAME_SIDE):
+    """
+    JPEG kadrlarni thumbnail bo'yicha baholab (1/8 decode, ~1 ms) faqat
+    eng aniq keep tasini to'liq decode qilish.
+
+    Returns:
+        [(kadr indeksi, BGR kadr), ...]
+    """
+    scored = []
+    for index, jpeg in enumerate(jpeg_frames):
+        thumbnail = decode_thumbnail(jpeg)
+        if thumbnail is not None:
+            scored.append((gray_sharpness(thumbnail), index))
+
+    selected = []
+    for _, index in sorted(scored, reverse=True)[:keep]:
+        frame = decode_image_bytes(jpeg_frames[index], max_side)
+        if frame is not None:
+            selected.append((index, frame))
+    return selected
+
+
+def sharpest_video_frames(path, keep=CLIP_DETECT_FRAMES, max_side=MAX_FRAME_SIDE):
+    """
+    Video fayldan (webm, mp4, avi...) CLIP_MAX_FRAMES gacha kadrni teng oraliqda
+    olib, aniqligi bo'yicha eng yaxshi keep tasini qaytarish.
+
+    Returns:
+        ([(kadr indeksi, BGR kadr), ...], baholangan kadrlar soni)
+    """
+    capture = cv2.VideoCapture(path)
+    try:
+        if not capture.isOpened():
+            return [], 0
+
+        total = int(capture.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        if 0 < total <= CLIP_MAX_READ_FRAMES:
+            wanted = set(sample_evenly(range(total), CLIP_MAX_FRAMES))
+        else:
+            # Kadrlar soni noma'lum (MediaRecorder webm) - har 3-kadr
+            wanted = set(range(0, CLIP_MAX_READ_FRAMES, 3))
+
+        # Xotirada faqat eng aniq keep ta kadr saqlanadi (min-heap)
+        best = []
+        scored = 0
+        for index in range(CLIP_MAX_READ_FRAMES):
+            # grab() kadrni decode qilmaydi - faqat tanlanganlari retrieve() qilinadi
+            if not capture.grab():
+                break
+            if index not in wanted:
+                continue
+            ok, frame = capture.retrieve()
+            if not ok:
+                continue
+            frame = cap_frame_size(frame, max_side)
+            small, _ = scale_to_max_side(frame, CLIP_SCORE_WIDTH)
+            item = (gray_sharpness(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)), index, frame)
+            if len(best) < keep:
+                heapq.heappush(best, item)
+            elif item[0] > best[0][0]:
+                heapq.heapreplace(best, item)
+            scored += 1
+            if scored >= CLIP_MAX_FRAMES:
+                break
+    finally:
+        capture.release()
+
+    best.sort(key=lambda item: item[0], reverse=True)
+    return [(index, frame) for _, index, frame in best], scored
+
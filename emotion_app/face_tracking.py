@@ -0,0 +1,112 @@
+"""
+emotion_app/face_tracking.py
+Skanerlash sessiyasi davomida yuz joyini kuzatish (ROI tracking)
+
+Kiosk oldidagi odam kadrdan kadrga deyarli joyidan qimirlamaydi. Shuning uchun
+keyingi kadrda avval oxirgi yuz box'ining kengaytirilgan atrofi (ROI) qidiriladi,
+u yerda topilmasagina butun kadr skanerlanadi.
+"""
+import threading
+
+import numpy as np
+
+from . import metrics
+from .cache_utils import TTLCache
+from .detectors import get_detector
+from .face_pipeline import detect_faces_adaptive, expand_box, primary_face_box
+
+
+# Oxirgi box har tomonga o'z o'lchamining shuncha qismiga kengaytiriladi
+ROI_EXPAND = 0.6
+
+# HOG oynasi 80x80 - yuz shundan katta bo'lsa ROI'da upsample kerak emas
+ROI_NO_UPSAMPLE_MIN_FACE = 90
+
+# HTTP client tracker'i qancha vaqt saqlanadi (sekund) - skanerlash sessiyasi
+TRACKER_TTL = 30
+
+
+class FaceTracker:
+    """
+    Bitta skanerlash sessiyasi (kiosk yoki WebSocket) uchun oxirgi yuz box'i.
+    Box'lar tracker'ga berilgan kadr koordinatalarida saqlanadi.
+    """
+
+    def __init__(self):
+        self.last_box = None
+        self.frame_shape = None
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self.last_box = None
+            self.frame_shape = None
+
+    def locate(self, rgb_frame, upsample=1):
+        """
+        Kadrdagi yuz box'lari - avval ROI'da (upsample - kichik yuzlar uchun),
+        topilmasa butun kadrda adaptiv zinapoya bo'yicha.
+
+        Returns:
+            (top, right, bottom, left) box'lar ro'yxati (kadr koordinatalarida)
+        """
+        face_locations, _ = self.scan(rgb_frame, upsample)
+        return face_locations
+
+    def scan(self, rgb_frame, upsample=1):
+        """
+        locate() kabi, qo'shimcha ravishda butun kadr skanerlanganmi.
+        ROI'da topilgan bo'lsa full_frame = False - ROI tashqarisidagi yuzlar ko'rilmagan.
+
+        Returns:
+            (box'lar ro'yxati, full_frame)
+        """
+        with self._lock:
+            last_box = self.last_box if self.frame_shape == rgb_frame.shape else None
+
+        if last_box is not None:
+            top, right, bottom, left = expand_box(last_box, ROI_EXPAND, rgb_frame.shape)
+            face_side = min(last_box[2] - last_box[0], last_box[1] - last_box[3])
+            roi_upsample = 0 if face_side >= ROI_NO_UPSAMPLE_MIN_FACE else upsample
+
+            roi = np.ascontiguousarray(rgb_frame[top:bottom, left:right])
+            roi_locations = get_detector().detect(roi, roi_upsample)
+
+            if roi_locations:
+                metrics.incr('tracker.roi_hit')
+                face_locations = [
+                    (t + top, r + left, b + top, l + left)
+                    for (t, r, b, l) in roi_locations
+                ]
+                self._remember(face_locations, rgb_frame.shape)
+                return face_locations, False
+
+            metrics.incr('tracker.roi_miss')
+
+        metrics.incr('tracker.full_scan')
+        face_locations, _ = detect_faces_adaptive(rgb_frame)
+        self._remember(face_locations, rgb_frame.shape)
+        return face_locations, True
+
+    def _remember(self, face_locations, shape):
+        with self._lock:
+            # Login tanlaydigan yuz kuzatiladi (katta va markazga yaqin)
+            self.last_box = primary_face_box(face_locations, shape) if face_locations else None
+            self.frame_shape = shape
+
+
+# =====================================================
+# HTTP client'lar uchun tracker'lar
+# =====================================================
+
+_client_trackers = TTLCache(max_entries=512, ttl=TRACKER_TTL)
+
+
+def tracker_for_client(key):
+    """Client (IP + X-Kiosk-Id) uchun tracker - sessiya TRACKER_TTL dan keyin unutiladi"""
+    tracker = _client_trackers.get(key)
+    if tracker is None:
+        tracker = FaceTracker()
+    # Har bir murojaatda TTL yangilanadi (uzluksiz skanerlash - bitta sessiya)
+    _client_trackers.set(key, tracker)
+    return tracker
@@ -0,0 +1,96 @@
+"""
+emotion_app/frame_dedupe.py
+Kiosk kadrlari dedupe - bir xil client'dan deyarli bir xil kadr kelsa
+oldingi tanish natijasi qaytariladi (HOG detection qayta ishlamaydi)
+
+Client kaliti: IP + X-Kiosk-Id header. Dedupe faqat X-Kiosk-Id yuborgan
+client'lar uchun ishlaydi - bitta NAT ortidagi kiosklar bir xil IP bilan
+keladi va header'siz bir-birining natijasini olib qo'yardi.
+
+Har bir client uchun faqat oxirgi kadr hash'i va natijasi saqlanadi. Faqat
+salbiy natijalar (yuz yo'q / tanilmadi) cache'lanadi: butun kadr dHash'i
+kiosk oldida odam almashganini sezmasligi mumkin, shuning uchun tanilgan
+shaxs hech qachon cache'dan qaytarilmaydi.
+"""
+import hashlib
+
+from django.conf import settings
+
+from . import metrics
+from .cache_utils import TTLCache
+from .face_pipeline import frame_dhash, hamming_distance
+
+
+# Natija qancha vaqt qayta ishlatiladi (sekund)
+DEDUPE_TTL = getattr(settings, 'FACE_DEDUPE_TTL', 6)
+
+# Kadrlar "bir xil" hisoblanadigan maksimal Hamming masofa (64 bitdan)
+DEDUPE_MAX_DISTANCE = getattr(settings, 'FACE_DEDUPE_MAX_DISTANCE', 6)
+
+_cache = TTLCache(max_entries=getattr(settings, 'FACE_DEDUPE_MAX_CLIENTS', 512), ttl=DEDUPE_TTL)
+
+
+def client_ip(request):
+    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if x_forwarded_for:
+        return x_forwarded_for.split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR')
+
+
+def kiosk_id(request):
+    return request.META.get('HTTP_X_KIOSK_ID', '').strip()[:64]
+
+
+def client_key(request):
+    """IP + X-Kiosk-Id; header bo'lmasa IP + User-Agent (tracker sessiyalari uchun)"""
+    kiosk = kiosk_id(request)
+    if kiosk:
+        return f"{client_ip(request)}|{kiosk}"
+    user_agent = request.META.get('HTTP_USER_AGENT', '').encode('utf-8', 'replace')
+    return f"{client_ip(request)}|ua:{hashlib.sha1(user_agent).hexdigest()[:12]}"
+
+
+def lookup(request, thumbnail):
+    """
+    thumbnail - face_pipeline.decode_thumbnail natijasi (None bo'lishi mumkin).
+    X-Kiosk-Id bo'lmasa dedupe ishlamaydi (hash None - natija saqlanmaydi).
+
+    Returns:
+        (client kaliti, kadr hash'i, oldingi natija yoki None)
+    """
+    key = client_key(request)
+    if thumbnail is None:
+        return key, None, None
+    if not kiosk_id(request):
+        metrics.incr('dedupe.no_kiosk_id')
+        return key, None, None
+
+    frame_hash = frame_dhash(thumbnail)
+
+    entry = _cache.get(key)
+    if entry is not None and hamming_distance(entry[0], frame_hash) <= DEDUPE_MAX_DISTANCE:
+        metrics.incr('dedupe.hit')
+        return key, frame_hash, entry[1]
+
+    metrics.incr('dedupe.miss')
+    return key, frame_hash, None
+
+
+def remember(key, frame_hash, result):
+    """
+    Client'ning oxirgi kadri va salbiy natijasini saqlash. Tanilgan shaxs
+    saqlanmaydi - client'ning oldingi yozuvi ham o'chiriladi.
+    """
+    if frame_hash is None:
+        return
+    if result.person is not None:
+        _cache.delete(key)
+        return
+    _cache.set(key, (frame_hash, result))
+
+
+def hit_rate():
+    counters = metrics.snapshot()['counters']
+    hits = counters.get('dedupe.hit', 0)
+    total = hits + counters.get('dedupe.miss', 0)
+    return round(hits / float(total), 3) if total else None
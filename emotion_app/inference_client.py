@@ -0,0 +1,135 @@
+"""
+emotion_app/inference_client.py
+Lokal yuz tanish daemon'i (run_face_inference_server) bilan Unix socket orqali aloqa
+
+Xabar formati (ikkala tomon uchun):
+    [4 bayt: header uzunligi][JSON header][4 bayt: payload uzunligi][payload baytlari]
+"""
+import json
+import socket
+import struct
+
+import numpy as np
+from django.conf import settings
+
+
+# Bitta xabarning maksimal hajmi (bayt)
+MAX_MESSAGE_BYTES = 16 * 1024 * 1024
+
+_LENGTH = struct.Struct('!I')
+
+
+class InferenceUnavailable(Exception):
+    """Daemon sozlanmagan, ishlamayapti yoki javob bermadi"""
+
+
+# =====================================================
+# Framing
+# =====================================================
+
+def _recv_exact(sock, size):
+    chunks = bytearray()
+    while len(chunks) < size:
+        chunk = sock.recv(size - len(chunks))
+        if not chunk:
+            raise ConnectionError("Socket yopildi")
+        chunks.extend(chunk)
+    return bytes(chunks)
+
+
+def _recv_block(sock):
+    (size,) = _LENGTH.unpack(_recv_exact(sock, _LENGTH.size))
+    if size > MAX_MESSAGE_BYTES:
+        raise ConnectionError(f"Xabar juda katta: {size} bayt")
+    return _recv_exact(sock, size) if size else b''
+
+
+def send_message(sock, header, payload=b''):
+    """JSON header va binary payload yuborish"""
+    header_bytes = json.dumps(header).encode('utf-8')
+    sock.sendall(_LENGTH.pack(len(header_bytes)) + header_bytes + _LENGTH.pack(len(payload)))
+    if payload:
+        sock.sendall(payload)
+
+
+def recv_message(sock):
+    """(header dict, payload bytes) qabul qilish"""
+    header = json.loads(_recv_block(sock).decode('utf-8'))
+    payload = _recv_block(sock)
+    return header, payload
+
+
+# =====================================================
+# Client API
+# =====================================================
+
+def inference_socket_path():
+    return getattr(settings, 'FACE_INFERENCE_SOCKET', None)
+
+
+def inference_enabled():
+    """Daemon sozlanganmi (settings.FACE_INFERENCE_SOCKET)"""
+    return bool(inference_socket_path())
+
+
+def request_inference(op, payload=b'', timeout=None, options=None):
+    """
+    Daemon'ga bitta so'rov yuborish va javobni olish.
+    options - header'ga qo'shiladigan qo'shimcha maydonlar (masalan client box'i).
+    Ulanib bo'lmasa yoki vaqt tugasa InferenceUnavailable.
+    """
+    path = inference_socket_path()
+    if not path:
+        raise InferenceUnavailable("FACE_INFERENCE_SOCKET sozlanmagan")
+
+    if timeout is None:
+        timeout = getattr(settings, 'FACE_INFERENCE_TIMEOUT', 10)
+
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(path)
+            send_message(sock, {'op': op, **(options or {})}, bytes(payload))
+            header, _ = recv_message(sock)
+    except (OSError, ConnectionError, ValueError) as e:
+        raise InferenceUnavailable(str(e))
+
+    return header
+
+
+def remote_recognize(image_bytes, hint=None):
+    """
+    Kadrni daemon'da tanish (hint - face_pipeline.client_face_hint natijasi).
+
+    Returns:
+        {'ok': bool, 'error': str?, 'faces': int, 'person_id': str|None, 'confidence': float|None}
+    """
+    return request_inference('recognize', image_bytes, options={'hint': hint} if hint else None)
+
+
+def remote_encode(image_bytes, hint=None):
+    """
+    Kadrdagi asosiy yuz descriptor'ini daemon'da hisoblash (hint - client box'i).
+
+    Returns:
+        (encoding yoki None, decode bo'ldimi)
+    """
+    result = request_inference('encode', image_bytes, options={'hint': hint} if hint else None)
+    if not result.get('ok'):
+        return None, False
+    encoding = result.get('encoding')
+    return (np.array(encoding, dtype=np.float64) if encoding else None), True
+
+
+def request_gallery_reload():
+    """
+    Person encoding'lari o'zgardi - daemon galereyasini keyingi batch'da
+    qayta yuklaydi (javob kutilmaydi). Daemon ishlamasa xatolik e'tiborsiz:
+    galereya baribir TTL bilan yangilanadi.
+    """
+    if not inference_enabled():
+        return
+    try:
+        request_inference('reload', timeout=1)
+    except InferenceUnavailable as e:
+        print(f"⚠️  Inference daemon galereyasini yangilab bo'lmadi: {e}")
@@ -0,0 +1,291 @@
+"""
+emotion_app/inference_server.py
+Lokal yuz tanish daemon'i - har bir host uchun bitta jarayon
+
+Modellar (dlib) va galereya faqat shu jarayonda yuklanadi. Web worker'lar
+Unix socket orqali kadr yuboradi. Decode va yuz detection'i worker pool'da
+(prepare_workers ta parallel) bajariladi; yuz topilgan kadrlar bir necha
+millisekund ichida bitta micro-batch'ga yig'iladi va descriptor'lar bitta
+dlib chaqiruvida hisoblanadi.
+
+Person encoding'lari o'zgarganda web jarayonlar 'reload' yuboradi
+(signals.py) - galereya keyingi batch'da qayta yuklanadi.
+
+Ishga tushirish: python manage.py run_face_inference_server
+"""
+import os
+import queue
+import socketserver
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from django.db import close_old_connections
+
+from .face_pipeline import (
+    LOGIN_PROFILE,
+    confirm_client_face,
+    decode_to_rgb,
+    encode_faces_batched,
+    locate_primary_face,
+    pipeline_profile,
+)
+from .inference_client import recv_message, send_message
+
+
+class InferenceSocketServer(socketserver.ThreadingUnixStreamServer):
+    # Ko'p worker bir vaqtda ulanganda connect() EAGAIN bermasligi uchun
+    request_queue_size = 128
+    daemon_threads = True
+
+
+class InferenceJob:
+    """Bitta so'rov - natija tayyor bo'lguncha handler thread kutadi"""
+
+    __slots__ = ('op', 'payload', 'hint', 'rgb_frame', 'box', 'faces', 'result', 'done')
+
+    def __init__(self, op, payload, hint=None):
+        self.op = op
+        self.payload = payload
+        self.hint = hint
+        self.rgb_frame = None
+        self.box = None
+        self.faces = None
+        self.result = None
+        self.done = threading.Event()
+
+    def finish(self, result):
+        self.result = result
+        self.done.set()
+
+
+class FaceGallery:
+    """
+    Person encoding'lari matritsasi (N, 128) - TTL bilan yoki invalidate()
+    dan keyin yangilanadi. (person_ids, matrix) bitta tuple sifatida
+    almashtiriladi - match() hech qachon aralash holatni ko'rmaydi.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._data = ([], np.zeros((0, 128), dtype=np.float64))
+        self.loaded_at = 0.0
+        self._stale = False
+        self._lock = threading.Lock()
+
+    @property
+    def person_ids(self):
+        return self._data[0]
+
+    def invalidate(self):
+        """Keyingi refresh() galereyani DB'dan qayta yuklaydi"""
+        self._stale = True
+
+    def refresh(self, force=False):
+        with self._lock:
+            if not (force or self._stale) and time.monotonic() - self.loaded_at < self.ttl:
+                return
+            self._stale = False
+            self._load()
+
+    def _load(self):
+        from .models import Person
+
+        close_old_connections()
+        rows = Person.objects.exclude(face_encoding=None).values_list('id', 'face_encoding')
+
+        person_ids = []
+        encodings = []
+        for person_id, encoding in rows:
+            if encoding and len(encoding) == 128:
+                person_ids.append(person_id)
+                encodings.append(encoding)
+
+        self._data = (person_ids, np.asarray(encodings, dtype=np.float64).reshape(-1, 128))
+        self.loaded_at = time.monotonic()
+        print(f"🗂️  Galereya yuklandi: {len(person_ids)} ta encoding")
+
+    def match(self, encoding):
+        """(person_id, confidence) yoki (None, None) - views.match_known_faces bilan bir xil chegaralar"""
+        person_ids, matrix = self._data
+        if encoding is None or not person_ids:
+            return None, None
+
+        distances = np.linalg.norm(matrix - encoding, axis=1)
+        best_match_idx = int(np.argmin(distances))
+        distance = float(distances[best_match_idx])
+
+        confidence = (1.0 - distance) * 100.0
+        if distance > 0.5 or confidence < 51.0:
+            return None, None
+
+        return person_ids[best_match_idx], confidence
+
+
+class FaceInferenceServer:
+    """
+    Micro-batching inference server.
+
+    Args:
+        socket_path: Unix socket fayli
+        batch_window_ms: birinchi so'rovdan keyin batch yig'ish oynasi
+        max_batch: bitta batch'dagi maksimal kadrlar
+        gallery_ttl: galereyani qayta yuklash oralig'i (sekund)
+        prepare_workers: decode + detection uchun parallel thread'lar
+    """
+
+    def __init__(self, socket_path, batch_window_ms=5, max_batch=8, gallery_ttl=60, prepare_workers=None):
+        self.socket_path = socket_path
+        self.batch_window = batch_window_ms / 1000.0
+        self.max_batch = max_batch
+        self.gallery = FaceGallery(gallery_ttl)
+        self.prepare_workers = prepare_workers or min(4, os.cpu_count() or 1)
+        self.prepare_pool = ThreadPoolExecutor(max_workers=self.prepare_workers, thread_name_prefix='face-prepare')
+        self.jobs = queue.Queue()   # encode'ga tayyor (yuz topilgan) ishlar
+        self.stats = {'requests': 0, 'batches': 0, 'max_batch_seen': 0}
+
+    # =====================================================
+    # So'rovlarni qabul qilish
+    # =====================================================
+
+    def handle_request(self, header, payload):
+        op = header.get('op')
+        self.stats['requests'] += 1
+
+        if op == 'ping':
+            return {'ok': True, 'pid': os.getpid(), 'gallery_size': len(self.gallery.person_ids), **self.stats}
+
+        if op == 'reload':
+            # Web so'rovi kutmaydi - galereya keyingi batch'da qayta yuklanadi
+            self.gallery.invalidate()
+            return {'ok': True, 'gallery_size': len(self.gallery.person_ids)}
+
+        if op not in ('recognize', 'encode'):
+            return {'ok': False, 'error': f'unknown_op: {op}'}
+        if not payload:
+            return {'ok': False, 'error': 'no_image'}
+
+        job = InferenceJob(op, payload, header.get('hint'))
+        self.prepare_pool.submit(self._prepare, job)
+        job.done.wait()
+        return job.result
+
+    # =====================================================
+    # Decode + detection (worker pool)
+    # =====================================================
+
+    def _prepare(self, job):
+        """Kadrni decode qilish va asosiy yuzni topish; yuz topilsa encode navbatiga"""
+        try:
+            rgb_frame = decode_to_rgb(job.payload, pipeline_profile(LOGIN_PROFILE)['max_side'])
+            job.payload = None
+            if rgb_frame is None:
+                job.finish({'ok': False, 'error': 'decode_failed'})
+                return
+
+            # Client box'i tasdiqlansa butun kadr detection'i o'tkazib yuboriladi
+            box = confirm_client_face(rgb_frame, job.hint) if job.hint else None
+            faces = None
+            if box is None:
+                box, faces = locate_primary_face(rgb_frame)
+            if box is None:
+                job.finish({'ok': True, 'faces': 0, 'encoding': None, 'person_id': None, 'confidence': None})
+                return
+
+            job.rgb_frame, job.box, job.faces = rgb_frame, box, faces
+            self.jobs.put(job)
+        except Exception as e:
+            print(f"❌ Inference decode/detect xatosi: {e}")
+            job.finish({'ok': False, 'error': str(e)})
+
+    # =====================================================
+    # Micro-batch ishlov berish
+    # =====================================================
+
+    def _collect_batch(self):
+        batch = [self.jobs.get()]
+        deadline = time.monotonic() + self.batch_window
+
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.jobs.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _batch_loop(self):
+        while True:
+            batch = self._collect_batch()
+            try:
+                self._process(batch)
+            except Exception as e:
+                print(f"❌ Inference batch xatosi: {e}")
+                for job in batch:
+                    if not job.done.is_set():
+                        job.finish({'ok': False, 'error': str(e)})
+
+    def _process(self, batch):
+        """Faqat descriptor'lar batch'da - decode/detection _prepare'da bajarilgan"""
+        self.gallery.refresh()
+
+        items = [(job.rgb_frame, [job.box]) for job in batch]
+        for job in batch:
+            job.rgb_frame = None
+
+        # Barcha kadrlar uchun bitta batch descriptor hisoblash
+        encodings = encode_faces_batched(items)
+        del items
+        self.stats['batches'] += 1
+        self.stats['max_batch_seen'] = max(self.stats['max_batch_seen'], len(batch))
+
+        for job, per_frame in zip(batch, encodings):
+            encoding = per_frame[0] if per_frame else None
+            if job.op == 'encode':
+                job.finish({
+                    'ok': True,
+                    'faces': job.faces,
+                    'encoding': encoding.tolist() if encoding is not None else None,
+                })
+            else:
+                person_id, confidence = self.gallery.match(encoding)
+                job.finish({'ok': True, 'faces': job.faces, 'person_id': person_id, 'confidence': confidence})
+
+    # =====================================================
+    # Server
+    # =====================================================
+
+    def serve_forever(self):
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+        self.gallery.refresh(force=True)
+        threading.Thread(target=self._batch_loop, name='face-inference-batch', daemon=True).start()
+
+        inference = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                while True:
+                    try:
+                        header, payload = recv_message(self.request)
+                    except (ConnectionError, OSError, ValueError):
+                        return
+                    send_message(self.request, inference.handle_request(header, payload))
+
+        server = InferenceSocketServer(self.socket_path, Handler)
+        os.chmod(self.socket_path, 0o660)
+
+        print(f"🚀 Face inference server: {self.socket_path} "
+              f"(batch oynasi: {self.batch_window * 1000:.0f} ms, max batch: {self.max_batch}, "
+              f"decode/detect: {self.prepare_workers} thread)")
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
@@ -0,0 +1,489 @@
+"""
+emotion_app/login_log_writer.py
+LoginLog yozuvlarini fon thread'ida paket (bulk_create) bilan yozish
+
+Login javobi audit yozuvini kutmaydi: LoginLog qatori va login rasmi jarayon
+ichidagi buferga qo'shiladi, fon thread'i ularni FACE_LOGIN_LOG_BATCH ta
+yig'ilganda yoki FACE_LOGIN_LOG_FLUSH_SECONDS o'tganda bitta bulk INSERT
+bilan yozadi.
+
+Qatorlar avval lokal spool fayliga (JSON lines, har bir jarayon uchun
+alohida) qo'shiladi. Spool fayllari jarayonning tasodifiy token'i bilan
+nomlanadi ("<token>-<n>.jsonl") va jarayon tirikligicha "<token>.lock"
+fayli flock bilan band turadi - PID qayta ishlatilishi ahamiyatsiz. Worker
+kutilmaganda to'xtasa, boshqa worker'lar spool papkasini davriy
+(FACE_LOGIN_LOG_ORPHAN_SCAN sekundda) ko'rib chiqadi: lock'ini olish mumkin
+bo'lgan token'ning fayllari bitta worker tomonidan o'ziga olinadi va
+qatorlar qayta yoziladi (id bir xil - ikki marta yozilmaydi). Rasmlar faqat
+xotirada turadi: crash bo'lsa qator saqlanadi, saqlanmagan rasm esa None bo'ladi.
+
+Xatoliklar:
+- DB vaqtincha ishlamasa paket buferda qoladi va qayta urinishlar oralig'i
+  eksponensial oshadi (FACE_LOGIN_LOG_MAX_BACKOFF gacha)
+- Paketni DB rad etsa (FK, noto'g'ri qiymat) qatorlar birma-bir yoziladi,
+  rad etilgan qatorlar spool papkasidagi dead_letters.jsonl ga tushadi
+- Bufer FACE_LOGIN_LOG_MAX_BUFFER qatordan oshsa yangi qatorlar faqat
+  spool'ga (rasmsiz) yoziladi va bufer bo'shagach qayta o'qiladi
+- Rasm bir marta saqlanadi: qayta urinishda saqlangan rasm qayta yozilmaydi
+
+FACE_LOGIN_LOG_ASYNC = False bo'lsa yozuv darhol (shu thread'da) bajariladi.
+"""
+import atexit
+import itertools
+import json
+import os
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import DataError, IntegrityError, close_old_connections, transaction
+from django.utils.dateparse import parse_datetime
+
+from . import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows - o'lgan jarayonlarning spool'lari olinmaydi
+    fcntl = None
+
+
+LOGIN_LOG_BATCH = getattr(settings, 'FACE_LOGIN_LOG_BATCH', 50)
+LOGIN_LOG_FLUSH_SECONDS = getattr(settings, 'FACE_LOGIN_LOG_FLUSH_SECONDS', 2.0)
+LOGIN_LOG_MAX_BACKOFF = getattr(settings, 'FACE_LOGIN_LOG_MAX_BACKOFF', 60.0)
+LOGIN_LOG_MAX_BUFFER = getattr(settings, 'FACE_LOGIN_LOG_MAX_BUFFER', 5000)
+LOGIN_LOG_ORPHAN_SCAN = getattr(settings, 'FACE_LOGIN_LOG_ORPHAN_SCAN', 60.0)
+
+# Rad etilgan qatorlar fayli (spool papkasida, claim qilinmaydi)
+DEAD_LETTER_FILE = 'dead_letters.jsonl'
+
+# Spool'ga yoziladigan LoginLog maydonlari
+SPOOL_FIELDS = ('id', 'inspector_id', 'login_method', 'login_time', 'login_photo', 'ip_address', 'confidence', 'success')
+
+_lock = threading.Lock()
+_wakeup = threading.Condition(_lock)
+_buffer = []        # yozilmagan LoginLog obyektlari
+_photos = {}        # login_photo nomi → rasm baytlari
+_segments = []      # _buffer'dagi qatorlar turgan spool fayllari
+_spool = None       # joriy ochiq spool fayli
+_spool_path = None
+_overflow = None    # bufer to'lganda qatorlar yoziladigan spool fayli
+_overflow_paths = []
+_overflow_rows = 0
+_sequence = itertools.count()
+_flushing = False
+_worker = None
+_token = None       # spool fayllari token'i (jarayon bo'yicha)
+_token_pid = None
+_token_dir = None
+_token_fd = None    # "<token>.lock" - jarayon tirikligicha band
+
+
+def spool_dir():
+    return str(getattr(settings, 'FACE_LOGIN_LOG_SPOOL_DIR', os.path.join(settings.BASE_DIR, 'var', 'login_log_spool')))
+
+
+def _owner_token():
+    """
+    _lock ostida: shu jarayonning spool token'i. Birinchi spool faylidan oldin
+    "<token>.lock" band qilinadi; fork'dan keyin (yoki papka o'zgarsa) yangi token.
+    """
+    global _token, _token_pid, _token_dir, _token_fd
+    directory = spool_dir()
+    if _token_pid == os.getpid() and _token_dir == directory:
+        return _token
+
+    if _token_fd is not None:
+        # Fork'dan keyin meros fd yopilsa ota jarayon lock'i saqlanib qoladi
+        os.close(_token_fd)
+        _token_fd = None
+    _token, _token_pid, _token_dir = uuid.uuid4().hex, os.getpid(), directory
+    os.makedirs(directory, exist_ok=True)
+    if fcntl is not None:
+        _token_fd = os.open(os.path.join(directory, f"{_token}.lock"), os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(_token_fd, fcntl.LOCK_EX)
+    return _token
+
+
+def _segment_path():
+    """_lock ostida: shu jarayonning yangi spool fayli yo'li"""
+    return os.path.join(spool_dir(), f"{_owner_token()}-{next(_sequence)}.jsonl")
+
+
+def photo_name(person_id, log_id):
+    """Login rasmi uchun yagona nom (eski upload_to bilan bir xil papka)"""
+    return f"login_photos/{time.strftime('%Y/%m/%d')}/{person_id}_{log_id[:8]}.jpg"
+
+
+# =====================================================
+# Yozuv qo'shish
+# =====================================================
+
+def record(logs, photo_bytes=None):
+    """
+    Saqlanmagan LoginLog'larni yozish navbatiga qo'shish. photo_bytes berilsa
+    ular loglarning login_photo nomi bilan saqlanadi (bir nechta log bitta
+    rasmga ishora qilishi mumkin).
+    """
+    if not logs:
+        return
+
+    if not getattr(settings, 'FACE_LOGIN_LOG_ASYNC', True):
+        photos = {logs[0].login_photo: photo_bytes} if photo_bytes and logs[0].login_photo else {}
+        _write(list(logs), photos)
+        return
+
+    global _worker
+    with _lock:
+        if len(_buffer) + len(logs) > LOGIN_LOG_MAX_BUFFER:
+            # Bufer to'la - qatorlar faqat spool'da (rasm xotirada saqlanmaydi)
+            for log in logs:
+                log.login_photo = None
+            _append_overflow(''.join(json.dumps(_spool_row(log)) + '\n' for log in logs), len(logs))
+            metrics.incr('login_log.overflow', len(logs))
+        else:
+            _append_spool(''.join(json.dumps(_spool_row(log)) + '\n' for log in logs))
+            _buffer.extend(logs)
+            if photo_bytes and logs[0].login_photo:
+                _photos[logs[0].login_photo] = bytes(photo_bytes)
+            metrics.incr('login_log.queued', len(logs))
+
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_worker_loop, name='login-log-writer', daemon=True)
+            _worker.start()
+        if len(_buffer) >= LOGIN_LOG_BATCH:
+            _wakeup.notify()
+
+
+def _spool_row(log):
+    row = {field: getattr(log, field) for field in SPOOL_FIELDS}
+    row['login_time'] = log.login_time.isoformat()
+    return row
+
+
+def _append_spool(lines):
+    """_lock ostida chaqiriladi"""
+    global _spool, _spool_path
+    try:
+        if _spool is None:
+            _spool_path = _segment_path()
+            _spool = open(_spool_path, 'a', encoding='utf-8')
+            _segments.append(_spool_path)
+        _spool.write(lines)
+        _spool.flush()
+    except OSError as e:
+        print(f"⚠️ LoginLog spool xatosi: {e}")
+
+
+def _append_overflow(lines, count):
+    """
+    _lock ostida chaqiriladi - bufer to'lganda qatorlar alohida spool fayliga.
+    Fayllar LOGIN_LOG_BATCH qatordan bo'linadi - qayta o'qishda bufer cheklangan qoladi.
+    """
+    global _overflow, _overflow_rows
+    try:
+        if _overflow is None:
+            path = _segment_path()
+            _overflow = open(path, 'a', encoding='utf-8')
+            _overflow_paths.append(path)
+            _overflow_rows = 0
+        _overflow.write(lines)
+        _overflow.flush()
+        _overflow_rows += count
+        if _overflow_rows >= LOGIN_LOG_BATCH:
+            _overflow.close()
+            _overflow = None
+    except OSError as e:
+        print(f"⚠️ LoginLog spool xatosi: {e}")
+
+
+# =====================================================
+# Fon thread'i
+# =====================================================
+
+def _worker_loop():
+    failures = 0
+    next_orphan_scan = 0.0
+    while True:
+        if time.monotonic() >= next_orphan_scan:
+            # O'lgan worker'lar spool'lari faqat ishga tushganda emas, davriy olinadi
+            _claim_orphans()
+            next_orphan_scan = time.monotonic() + LOGIN_LOG_ORPHAN_SCAN
+
+        with _lock:
+            deadline = time.monotonic() + LOGIN_LOG_FLUSH_SECONDS
+            while len(_buffer) < LOGIN_LOG_BATCH:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                _wakeup.wait(remaining)
+
+        if flush():
+            failures = 0
+            _reload_overflow()
+            continue
+
+        # DB ishlamayapti - qayta urinish oralig'i eksponensial oshadi
+        failures += 1
+        delay = min(LOGIN_LOG_MAX_BACKOFF, LOGIN_LOG_FLUSH_SECONDS * 2 ** failures)
+        metrics.incr('login_log.backoff')
+        time.sleep(delay)
+
+
+def flush():
+    """Buferdagi barcha qatorlarni yozish (True - hammasi yozildi yoki dead letter)"""
+    global _spool, _flushing
+    with _lock:
+        if not _buffer:
+            return True
+        logs, photos, segments = _buffer[:], dict(_photos), _segments[:]
+        _buffer.clear()
+        _photos.clear()
+        _segments.clear()
+        if _spool is not None:
+            _spool.close()
+            _spool = None
+        _flushing = True
+
+    try:
+        _write(logs, photos)
+    except Exception as e:
+        # _write yozilgan / rad etilgan qatorlarni logs'dan, saqlangan rasmlarni photos'dan olib tashlaydi
+        print(f"❌ LoginLog yozishda xatolik ({len(logs)} ta qoldi): {e}")
+        metrics.incr('login_log.failed')
+        with _lock:
+            _buffer[:0] = logs
+            _photos.update(photos)
+            _segments[:0] = segments
+            _flushing = False
+            _wakeup.notify_all()
+        return False
+    finally:
+        close_old_connections()
+
+    with _lock:
+        _flushing = False
+        _wakeup.notify_all()
+    for path in segments:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    return True
+
+
+def _write(logs, photos):
+    """
+    Rasmlarni saqlash va qatorlarni bitta bulk INSERT bilan yozish.
+
+    Paketni DB rad etsa (IntegrityError/DataError) qatorlar birma-bir
+    yoziladi, rad etilganlari dead letter bo'ladi. Boshqa xatolik (DB
+    ishlamayapti) tashqariga chiqadi: bu vaqtda logs'da faqat yozilmagan
+    qatorlar, photos'da faqat saqlanmagan rasmlar qoladi.
+    """
+    from .models import LoginLog
+
+    _save_photos(logs, photos)
+
+    try:
+        with transaction.atomic():
+            LoginLog.objects.bulk_create(logs, ignore_conflicts=True)
+    except (IntegrityError, DataError) as e:
+        print(f"⚠️ LoginLog paketi rad etildi, qatorlar birma-bir yoziladi: {e}")
+        metrics.incr('login_log.batch_rejected')
+        _write_rows(logs)
+        return
+
+    metrics.incr('login_log.written', len(logs))
+    metrics.incr('login_log.batches')
+    logs.clear()
+
+
+def _save_photos(logs, photos):
+    """
+    Login rasmlarini saqlash. Saqlangan (yoki saqlab bo'lmagan) rasm photos'dan
+    olib tashlanadi - qayta urinishda qayta yozilmaydi. Oldingi urinishda
+    saqlangan fayl (crash'dan keyin) ham qayta yozilmaydi.
+    """
+    for name in list(photos):
+        saved = name
+        try:
+            if not default_storage.exists(name):
+                saved = default_storage.save(name, ContentFile(bytes(photos[name])))
+        except Exception as e:
+            print(f"Rasm saqlashda xatolik: {e}")
+            saved = None
+        del photos[name]
+        if saved != name:
+            for log in logs:
+                if log.login_photo == name:
+                    log.login_photo = saved
+
+
+def _write_rows(logs):
+    """Qatorlarni birma-bir yozish; rad etilganlari dead letter (yozilganlari logs'dan olinadi)"""
+    from .models import LoginLog
+
+    done = 0
+    try:
+        for log in logs:
+            try:
+                with transaction.atomic():
+                    LoginLog.objects.bulk_create([log], ignore_conflicts=True)
+                metrics.incr('login_log.written')
+            except (IntegrityError, DataError) as e:
+                _dead_letter(log, e)
+            done += 1
+    finally:
+        del logs[:done]
+
+
+def _dead_letter(log, error):
+    """Rad etilgan qatorni dead_letters.jsonl ga yozish (qo'lda ko'rib chiqish uchun)"""
+    row = _spool_row(log)
+    row['error'] = str(error)
+    try:
+        os.makedirs(spool_dir(), exist_ok=True)
+        with open(os.path.join(spool_dir(), DEAD_LETTER_FILE), 'a', encoding='utf-8') as f:
+            f.write(json.dumps(row) + '\n')
+    except OSError as e:
+        print(f"⚠️ LoginLog dead letter yozilmadi ({log.id}): {e}")
+    metrics.incr('login_log.dead_letter')
+    print(f"❌ LoginLog qatori rad etildi ({log.id}): {error}")
+
+
+def _drain(timeout=30):
+    """
+    Jarayon tugashida buferni yozib qo'yish (yozilmasa spool'da qoladi).
+    Hammasi yozilgan bo'lsa token lock fayli ham o'chiriladi.
+    """
+    with _lock:
+        _wakeup.wait_for(lambda: not _flushing, timeout)
+    if not flush():
+        return
+    with _lock:
+        if _token_pid != os.getpid() or _token_fd is None or _overflow_paths:
+            return
+        try:
+            os.remove(os.path.join(_token_dir, f"{_token}.lock"))
+        except OSError:
+            pass
+
+
+atexit.register(_drain)
+
+
+# =====================================================
+# O'lgan worker'larning spool fayllari
+# =====================================================
+
+def _read_segment(path):
+    """Spool faylidagi qatorlardan LoginLog obyektlari"""
+    from .models import LoginLog
+
+    with open(path, encoding='utf-8') as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+
+    logs = []
+    for row in rows:
+        row['login_time'] = parse_datetime(row['login_time'])
+        # Rasm xotirada edi - fayl saqlanmagan bo'lsa yo'q deb belgilanadi
+        if row['login_photo'] and not default_storage.exists(row['login_photo']):
+            row['login_photo'] = None
+        logs.append(LoginLog(**row))
+    return logs
+
+
+def _claim_orphans():
+    """
+    O'lgan jarayonlarning spool fayllarini o'ziga olib, buferga qo'shish.
+    Token lock'i olinsa egasi o'lgan: fayllar lock ostida ko'chiriladi, shuning
+    uchun bir nechta worker bir token'ni ikki marta olmaydi.
+    """
+    if fcntl is None:
+        return
+    directory = spool_dir()
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return
+
+    # token → spool fayllari (faylsiz qolgan lock'lar ham tozalanadi)
+    segments = {}
+    for name in names:
+        if name.endswith('.jsonl') and '-' in name:
+            segments.setdefault(name.split('-', 1)[0], []).append(name)
+        elif name.endswith('.lock'):
+            segments.setdefault(name[:-len('.lock')], [])
+
+    with _lock:
+        own_token = _owner_token()
+
+    for token, token_names in segments.items():
+        if token == own_token:
+            continue
+        lock_path = os.path.join(directory, f"{token}.lock")
+        try:
+            fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+        except OSError:
+            continue
+        try:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                continue  # egasi tirik
+            for name in sorted(token_names):
+                _claim_segment(directory, name)
+            try:
+                os.remove(lock_path)
+            except OSError:
+                pass
+        finally:
+            os.close(fd)
+
+
+def _claim_segment(directory, name):
+    """O'lgan jarayon spool faylini o'z nomiga ko'chirib, qatorlarini buferga qo'shish"""
+    with _lock:
+        claimed = _segment_path()
+    try:
+        os.rename(os.path.join(directory, name), claimed)
+    except OSError:
+        return  # boshqa worker allaqachon olgan
+    try:
+        logs = _read_segment(claimed)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Spool faylini o'qib bo'lmadi ({name}): {e}")
+        return
+
+    with _lock:
+        _buffer.extend(logs)
+        _segments.append(claimed)
+    metrics.incr('login_log.replayed', len(logs))
+    print(f"♻️  LoginLog spool qayta yozilmoqda: {name} ({len(logs)} ta)")
+
+
+def _reload_overflow():
+    """Bufer bo'shagach to'lib ketgan qatorlarni spool'dan qayta o'qish"""
+    global _overflow
+    with _lock:
+        if not _overflow_paths or len(_buffer) + LOGIN_LOG_BATCH > LOGIN_LOG_MAX_BUFFER:
+            return
+        path = _overflow_paths.pop(0)
+        if _overflow is not None and not _overflow_paths:
+            # Hali yozilayotgan fayl - yopiladi, keyingi qatorlar yangi faylga
+            _overflow.close()
+            _overflow = None
+
+    try:
+        logs = _read_segment(path)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Spool faylini o'qib bo'lmadi ({path}): {e}")
+        return
+
+    with _lock:
+        _buffer.extend(logs)
+        _segments.append(path)
+    metrics.incr('login_log.replayed', len(logs))
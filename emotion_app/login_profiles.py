@@ -0,0 +1,208 @@
+"""
+emotion_app/login_profiles.py
+Passport bo'yicha login profili cache'i (face_login_auth ikki bosqichi uchun)
+
+1-bosqich (passport) profilni yuklaydi: Person, rasm vaqti (mtime) va
+float32 shablon. 2-bosqich (yuz) shu profildan foydalanadi - qo'shimcha DB
+so'rovi va fayl tizimi murojaati yo'q. Django User (username = passport) ham
+1-bosqichda profilga yuklanadi.
+
+Person yoki User o'zgarsa profil o'chiriladi (signals.py). Cache jarayon
+ichida, shuning uchun boshqa worker'lar ham xabardor bo'lishi kerak: host
+bo'yicha umumiy versiya jadvali (mmap fayl, passport hash'i bo'yicha
+bucket'lar) o'zgarishda oshiriladi. Profil yuklangandagi versiya bilan
+joriy versiya farq qilsa profil DB'dan qayta yuklanadi.
+
+Profil obyektlari thread'lar orasida umumiy - profile.person faqat o'qiladi,
+o'zgartirish kerak bo'lsa nusxasi olinadi.
+"""
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import zlib
+from datetime import datetime
+
+import numpy as np
+from django.conf import settings
+
+from . import metrics
+from .cache_utils import TTLCache
+from .models import Person
+
+
+# Profil qancha vaqt saqlanadi (sekund) - ikki bosqichli login uchun yetarli
+LOGIN_PROFILE_TTL = getattr(settings, 'FACE_LOGIN_PROFILE_TTL', 120)
+
+_profiles = TTLCache(max_entries=getattr(settings, 'FACE_LOGIN_PROFILE_MAX', 1024), ttl=LOGIN_PROFILE_TTL)
+
+# person_id → passport: passport o'zgarganda eski kalitni topish uchun
+_passports = {}
+_passports_lock = threading.Lock()
+
+# Worker'lar orasidagi versiya jadvali: passport bucket'i → versiya (uint32)
+VERSION_BUCKETS = 4096
+_VERSION = struct.Struct('I')
+
+_versions = None
+_versions_lock = threading.Lock()
+
+try:
+    import fcntl
+except ImportError:  # Windows - faqat jarayon ichidagi invalidatsiya
+    fcntl = None
+
+
+def versions_path():
+    return getattr(settings, 'FACE_LOGIN_PROFILE_VERSIONS', '') or os.path.join(
+        tempfile.gettempdir(), 'face_login_profile_versions'
+    )
+
+
+def _version_map():
+    """Versiya jadvali (mmap) - ochib bo'lmasa None"""
+    global _versions
+    if _versions is not None or fcntl is None:
+        return _versions
+    with _versions_lock:
+        if _versions is None:
+            size = _VERSION.size * VERSION_BUCKETS
+            try:
+                fd = os.open(versions_path(), os.O_RDWR | os.O_CREAT, 0o600)
+                try:
+                    if os.fstat(fd).st_size < size:
+                        os.ftruncate(fd, size)
+                    _versions = mmap.mmap(fd, size)
+                finally:
+                    os.close(fd)
+            except OSError as e:
+                print(f"⚠️  Login profil versiyalari ochilmadi: {e}")
+    return _versions
+
+
+def _bucket_offset(passport):
+    return zlib.crc32(passport.encode('utf-8')) % VERSION_BUCKETS * _VERSION.size
+
+
+def passport_version(passport):
+    """Passport bucket'ining joriy versiyasi (jadval bo'lmasa None)"""
+    versions = _version_map()
+    if versions is None:
+        return None
+    return _VERSION.unpack_from(versions, _bucket_offset(passport))[0]
+
+
+def _bump_version(passport):
+    """Barcha worker'lardagi shu passport profilini eskirgan deb belgilash"""
+    versions = _version_map()
+    if versions is None:
+        return
+    offset = _bucket_offset(passport)
+    try:
+        fd = os.open(versions_path(), os.O_RDWR)
+    except OSError:
+        return
+    try:
+        # Qisqa bloklovchi lock - ikki worker bir vaqtda oshirsa versiya yo'qolmasin
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        (version,) = _VERSION.unpack_from(versions, offset)
+        _VERSION.pack_into(versions, offset, (version + 1) & 0xFFFFFFFF)
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+
+class LoginProfile:
+    """Login uchun kerakli Person ma'lumotlari (bir marta yuklanadi)"""
+
+    __slots__ = (
+        'person', 'person_id', 'passport', 'full_name', 'photo', 'photo_mtime', 'template', 'user_id', 'user',
+        'version',
+    )
+
+    def __init__(self, person, photo_mtime, version=None):
+        self.person = person
+        self.person_id = person.id
+        self.passport = person.passport
+        self.full_name = person.full_name
+        self.photo = person.photo
+        self.photo_mtime = photo_mtime
+        self.template = np.asarray(person.face_encoding, dtype=np.float32) if person.face_encoding else None
+        self.user_id = None
+        self.user = None
+        self.version = version
+
+    def photo_age_days(self):
+        """Rasm necha kun oldin yangilangan (aniqlab bo'lmasa None)"""
+        if self.photo_mtime is None:
+            return None
+        return (datetime.now() - datetime.fromtimestamp(self.photo_mtime)).days
+
+
+def photo_mtime(person):
+    """Person rasmi faylining mtime'i (fayl yo'q bo'lsa None)"""
+    if not person.photo:
+        return None
+    try:
+        return os.path.getmtime(os.path.join(settings.MEDIA_ROOT, str(person.photo)))
+    except OSError:
+        return None
+
+
+def get_profile(passport):
+    """
+    Passport bo'yicha profil (cache'da bo'lmasa yoki boshqa worker uni
+    eskirtirgan bo'lsa DB'dan). Person topilmasa None.
+    """
+    # Versiya DB'dan o'qishdan oldin olinadi - yuklash paytidagi o'zgarish keyingi safar ko'rinadi
+    version = passport_version(passport)
+    profile = _profiles.get(passport)
+    if profile is not None and profile.version == version:
+        metrics.incr('login_profile.hit')
+        return profile
+
+    metrics.incr('login_profile.stale' if profile is not None else 'login_profile.miss')
+    person = Person.objects.filter(passport=passport).first()
+    if person is None:
+        return None
+
+    from django.contrib.auth.models import User
+
+    profile = LoginProfile(person, photo_mtime(person), version)
+    profile.user = User.objects.filter(username=passport).first()
+    profile.user_id = profile.user.id if profile.user else None
+    with _passports_lock:
+        _passports[person.id] = passport
+    _profiles.set(passport, profile)
+    return profile
+
+
+def profile_user(profile, get_or_create_user):
+    """
+    Profil Django User'i. User yo'q yoki admin huquqlari to'liq bo'lmasa
+    get_or_create_user(person) bilan yaratiladi/yangilanadi.
+    """
+    user = profile.user
+    if user is None or not (user.is_staff and user.is_superuser and user.is_active):
+        profile.user = get_or_create_user(profile.person)
+        profile.user_id = profile.user.id
+    return profile.user
+
+
+def invalidate_person(person_id=None, passport=None):
+    """
+    Person profilini o'chirish (eski va yangi passport kalitlari bo'yicha) -
+    shu jarayonda va versiya jadvali orqali boshqa worker'larda ham.
+    """
+    with _passports_lock:
+        old_passport = _passports.pop(person_id, None) if person_id else None
+    for key in {old_passport, passport} - {None}:
+        _bump_version(key)
+        _profiles.delete(key)
+
+
+def clear():
+    with _passports_lock:
+        _passports.clear()
+    _profiles.clear()
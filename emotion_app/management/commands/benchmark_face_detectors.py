@@ -0,0 +1,85 @@
+"""
+Management command - yuz detektori backend'larini solishtirish (tezlik va recall)
+
+Papkadagi har bir rasmda kamida bitta yuz bor deb hisoblanadi:
+recall = yuz topilgan rasmlar / barcha rasmlar.
+"""
+import os
+import time
+
+import cv2
+from django.core.management.base import BaseCommand, CommandError
+
+from emotion_app.detectors import DETECTORS, DetectorUnavailable, create_detector
+from emotion_app.face_pipeline import WORKING_MAX_SIDE, decode_image_bytes, scale_to_max_side
+from emotion_app.management.commands.benchmark_face_pipeline import IMAGE_EXTENSIONS, percentile_ms
+
+
+class Command(BaseCommand):
+    help = 'Yuz detektori backend\'larini rasm papkasida solishtirish (tezlik va recall)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--images', required=True, help="Yuzli rasmlar papkasi (ichki papkalar ham o'qiladi)")
+        parser.add_argument(
+            '--backends',
+            default=','.join(DETECTORS),
+            help=f"Vergul bilan ajratilgan backend'lar (mavjud: {', '.join(DETECTORS)})"
+        )
+        parser.add_argument('--max-side', type=int, default=WORKING_MAX_SIDE, help='Detection kadrining maksimal tomoni')
+        parser.add_argument('--upsample', type=int, default=1, help="Upsample (HOG) / minimal yuz o'lchami (Haar)")
+        parser.add_argument('--repeat', type=int, default=1, help='Har bir rasm necha marta')
+
+    def handle(self, *args, **options):
+        frames = self.load_frames(options['images'], options['max_side'])
+        if not frames:
+            raise CommandError(f"Rasm topilmadi: {options['images']}")
+
+        self.stdout.write(self.style.WARNING(
+            f"\nDetektorlar: {len(frames)} ta rasm | {options['max_side']}px | "
+            f"upsample: {options['upsample']} | takror: {options['repeat']}\n"
+        ))
+
+        for name in [n.strip() for n in options['backends'].split(',') if n.strip()]:
+            try:
+                detector = create_detector(name)
+            except DetectorUnavailable as e:
+                self.stdout.write(self.style.ERROR(f"  {name:<8} o'tkazib yuborildi: {e}"))
+                continue
+
+            # Birinchi chaqiruv (model yuklash) o'lchovga kirmaydi
+            detector.detect(frames[0], options['upsample'])
+
+            samples = []
+            found = 0
+            faces = 0
+            for _ in range(options['repeat']):
+                for rgb_frame in frames:
+                    start = time.perf_counter()
+                    boxes = detector.detect(rgb_frame, options['upsample'])
+                    samples.append(time.perf_counter() - start)
+                    found += bool(boxes)
+                    faces += len(boxes)
+
+            self.stdout.write(
+                f"  {name:<8} median: {percentile_ms(samples, 50):8.1f} ms   "
+                f"p95: {percentile_ms(samples, 95):8.1f} ms   "
+                f"recall: {found / float(len(samples)):6.1%}   "
+                f"yuz/rasm: {faces / float(len(samples)):4.2f}"
+            )
+
+    def load_frames(self, images_dir, max_side):
+        if not os.path.isdir(images_dir):
+            raise CommandError(f"Papka topilmadi: {images_dir}")
+
+        frames = []
+        for root, _, files in os.walk(images_dir):
+            for filename in sorted(files):
+                if not filename.lower().endswith(IMAGE_EXTENSIONS):
+                    continue
+                with open(os.path.join(root, filename), 'rb') as f:
+                    frame = decode_image_bytes(f.read(), max_side)
+                if frame is None:
+                    continue
+                frame, _ = scale_to_max_side(frame, max_side)
+                frames.append(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        return frames
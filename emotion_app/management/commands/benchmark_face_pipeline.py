@@ -0,0 +1,252 @@
+"""
+Management command - yuz tanish pipeline bosqichlarini o'lchash (benchmark)
+"""
+import base64
+import io
+import json
+import os
+import time
+
+import cv2
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+import face_recognition
+from emotion_app.face_pipeline import (
+    WORKING_MAX_SIDE,
+    decode_image_bytes,
+    detect_faces_adaptive,
+    detection_ladder,
+    encode_primary_face,
+)
+
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.bmp')
+
+# Odatiy kiosk kadri
+KIOSK_WIDTH = 1280
+KIOSK_HEIGHT = 720
+
+
+def percentile_ms(samples, q):
+    """Sekundlardagi namunalardan q-percentile (ms)"""
+    if not samples:
+        return 0.0
+    return float(np.percentile(np.array(samples) * 1000.0, q))
+
+
+def to_kiosk_frame(image):
+    """Rasmni 1280x720 kiosk kadriga joylashtirish (letterbox)"""
+    h, w = image.shape[:2]
+    scale = min(KIOSK_WIDTH / float(w), KIOSK_HEIGHT / float(h))
+    resized = cv2.resize(image, (int(w * scale), int(h * scale)))
+    canvas = np.zeros((KIOSK_HEIGHT, KIOSK_WIDTH, 3), dtype=np.uint8)
+    y = (KIOSK_HEIGHT - resized.shape[0]) // 2
+    x = (KIOSK_WIDTH - resized.shape[1]) // 2
+    canvas[y:y + resized.shape[0], x:x + resized.shape[1]] = resized
+    return canvas
+
+
+class Command(BaseCommand):
+    help = 'Yuz tanish pipeline bosqichlari uchun benchmark (1280x720 kiosk kadrlarida)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--stage',
+            choices=['verify', 'upload', 'detect'],
+            default='verify',
+            help="Qaysi bosqich o'lchanadi"
+        )
+        parser.add_argument(
+            '--images',
+            default=None,
+            help="Rasmlar papkasi (bo'lmasa sintetik kadrlar ishlatiladi)"
+        )
+        parser.add_argument('--repeat', type=int, default=3, help='Har bir kadr necha marta')
+        parser.add_argument('--quality', type=int, default=80, help='JPEG sifati (kiosk: 80)')
+
+    def handle(self, *args, **options):
+        frames = self.load_kiosk_frames(options['images'], options['quality'])
+        if not frames:
+            raise CommandError("Benchmark uchun rasm topilmadi")
+
+        self.stdout.write(self.style.WARNING(
+            f"\nBenchmark: {options['stage']} | kadrlar: {len(frames)} | takror: {options['repeat']}\n"
+        ))
+
+        if options['stage'] == 'verify':
+            self.benchmark_verify(frames, options['repeat'])
+        elif options['stage'] == 'upload':
+            self.benchmark_upload(frames, options['repeat'])
+        elif options['stage'] == 'detect':
+            self.benchmark_detect(frames, options['repeat'])
+
+    # =====================================================
+    # Kadrlarni tayyorlash
+    # =====================================================
+
+    def load_kiosk_frames(self, images_dir, quality):
+        """Kiosk JPEG baytlari ro'yxati (1280x720)"""
+        encode_params = [int(cv2.IMWRITE_JPEG_QUALITY), quality]
+        frames = []
+
+        if images_dir:
+            if not os.path.isdir(images_dir):
+                raise CommandError(f"Papka topilmadi: {images_dir}")
+            for name in sorted(os.listdir(images_dir)):
+                if not name.lower().endswith(IMAGE_EXTENSIONS):
+                    continue
+                image = cv2.imread(os.path.join(images_dir, name), cv2.IMREAD_COLOR)
+                if image is None:
+                    continue
+                ok, buf = cv2.imencode('.jpg', to_kiosk_frame(image), encode_params)
+                if ok:
+                    frames.append(buf.tobytes())
+        else:
+            self.stdout.write(self.style.WARNING(
+                "⚠️  --images berilmadi: sintetik kadrlar (yuzsiz) - faqat detection narxi o'lchanadi"
+            ))
+            rng = np.random.default_rng(0)
+            for _ in range(5):
+                image = rng.integers(0, 255, (KIOSK_HEIGHT, KIOSK_WIDTH, 3), dtype=np.uint8)
+                image = cv2.GaussianBlur(image, (15, 15), 0)
+                ok, buf = cv2.imencode('.jpg', image, encode_params)
+                if ok:
+                    frames.append(buf.tobytes())
+
+        return frames
+
+    def report(self, label, samples):
+        self.stdout.write(
+            f"  {label:<28} median: {percentile_ms(samples, 50):8.1f} ms   "
+            f"p95: {percentile_ms(samples, 95):8.1f} ms"
+        )
+
+    # =====================================================
+    # 1:1 verification (face_login_auth)
+    # =====================================================
+
+    def benchmark_verify(self, frames, repeat):
+        from PIL import Image as PILImage
+
+        def legacy_verify(image_bytes):
+            # Oldingi yo'l: PIL decode + to'liq kadrda face_encodings
+            img_array = np.array(PILImage.open(io.BytesIO(image_bytes)))
+            encodings = face_recognition.face_encodings(img_array)
+            return encodings[0] if encodings else None
+
+        def bounded_verify(image_bytes):
+            # Yangi yo'l: cheklangan o'lcham, kichik kadrda detection, bitta yuz
+            frame = decode_image_bytes(image_bytes)
+            return encode_primary_face(frame) if frame is not None else None
+
+        results = {}
+        for label, func in (('oldingi (PIL + full frame)', legacy_verify),
+                            ('yangi (bounded, primary)', bounded_verify)):
+            samples = []
+            found = 0
+            for _ in range(repeat):
+                for image_bytes in frames:
+                    start = time.perf_counter()
+                    encoding = func(image_bytes)
+                    samples.append(time.perf_counter() - start)
+                    found += encoding is not None
+            results[label] = samples
+            self.report(label, samples)
+            self.stdout.write(f"  {'':<28} yuz topildi: {found}/{len(samples)}")
+
+        old, new = list(results.values())
+        if percentile_ms(new, 50) > 0:
+            self.stdout.write(self.style.SUCCESS(
+                f"\n✅ Median tezlanish: {percentile_ms(old, 50) / percentile_ms(new, 50):.2f}x\n"
+            ))
+
+    # =====================================================
+    # Upload rejimlari: JSON (base64) va binary JPEG
+    # =====================================================
+
+    def benchmark_upload(self, frames, repeat):
+        def json_mode(payload):
+            # Eski yo'l: json.loads + split("base64,") + b64decode + imdecode
+            image_data = json.loads(payload)['image']
+            if "base64," in image_data:
+                image_data = image_data.split("base64,")[1]
+            return decode_image_bytes(base64.b64decode(image_data))
+
+        def binary_mode(payload):
+            # Yangi yo'l: request.body to'g'ridan-to'g'ri imdecode ga
+            return decode_image_bytes(payload)
+
+        json_payloads = [
+            json.dumps({'image': 'data:image/jpeg;base64,' + base64.b64encode(f).decode()}).encode()
+            for f in frames
+        ]
+
+        for label, func, payloads in (('JSON (base64 data URL)', json_mode, json_payloads),
+                                      ('binary (image/jpeg)', binary_mode, frames)):
+            wall = []
+            cpu = []
+            for _ in range(repeat):
+                for payload in payloads:
+                    start_wall = time.perf_counter()
+                    start_cpu = time.process_time()
+                    func(payload)
+                    cpu.append(time.process_time() - start_cpu)
+                    wall.append(time.perf_counter() - start_wall)
+            avg_bytes = sum(len(p) for p in payloads) / len(payloads)
+            self.report(label, wall)
+            self.stdout.write(
+                f"  {'':<28} CPU median: {percentile_ms(cpu, 50):6.2f} ms   "
+                f"o'rtacha hajm: {avg_bytes / 1024:7.1f} KB"
+            )
+
+    # =====================================================
+    # Detection: qat'iy (960px, upsample 1) va adaptiv zinapoya
+    # =====================================================
+
+    def benchmark_detect(self, frames, repeat):
+        rgb_frames = []
+        for image_bytes in frames:
+            frame = decode_image_bytes(image_bytes, WORKING_MAX_SIDE)
+            if frame is not None:
+                rgb_frames.append(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+
+        ladder = detection_ladder()
+        self.stdout.write(f"  Zinapoya: {', '.join(f'{side}px/up{up}' for side, up in ladder)}\n")
+
+        def fixed_detect(rgb_frame):
+            # Oldingi yo'l: har doim butun kadr upsample=1 bilan
+            return face_recognition.face_locations(rgb_frame, number_of_times_to_upsample=1, model="hog"), None
+
+        def adaptive_detect(rgb_frame):
+            return detect_faces_adaptive(rgb_frame, ladder)
+
+        results = {}
+        for label, func in (('qat\'iy (960px, upsample 1)', fixed_detect),
+                            ('adaptiv zinapoya', adaptive_detect)):
+            samples = []
+            found = 0
+            rungs = {}
+            for _ in range(repeat):
+                for rgb_frame in rgb_frames:
+                    start = time.perf_counter()
+                    face_locations, rung = func(rgb_frame)
+                    samples.append(time.perf_counter() - start)
+                    found += bool(face_locations)
+                    rungs[rung] = rungs.get(rung, 0) + 1
+            results[label] = samples
+            self.report(label, samples)
+            self.stdout.write(f"  {'':<28} yuz topildi: {found}/{len(samples)}")
+            if func is adaptive_detect:
+                distribution = ', '.join(
+                    f"{rung}-pog'ona: {rungs[rung]}" for rung in sorted(r for r in rungs if r is not None)
+                )
+                if None in rungs:
+                    distribution = ', '.join(filter(None, [distribution, f"topilmadi: {rungs[None]}"]))
+                self.stdout.write(f"  {'':<28} pog'onalar: {distribution}")
+
+        old, new = list(results.values())
+        if percentile_ms(new, 50) > 0:
+            self.stdout.write(self.style.SUCCESS(
+                f"\n✅ Median tezlanish: {percentile_ms(old, 50) / percentile_ms(new, 50):.2f}x\n"
+            ))
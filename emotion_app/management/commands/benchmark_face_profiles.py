@@ -0,0 +1,103 @@
+"""
+Management command - pipeline profillarini solishtirish (latency va masofa taqsimoti)
+
+Belgilangan to'plam: <papka>/<label>/*.jpg - bitta label = bitta odam.
+Har bir profil uchun:
+- encoding latency (median / p95)
+- bir odam juftliklari masofasi (genuine) va turli odamlar masofasi (impostor)
+- MATCH_THRESHOLD bo'yicha noto'g'ri rad etish / noto'g'ri qabul qilish ulushi
+"""
+import itertools
+import os
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from emotion_app.face_pipeline import PIPELINE_PROFILES, decode_image_bytes, encode_primary_face, pipeline_profile
+from emotion_app.management.commands.benchmark_face_pipeline import IMAGE_EXTENSIONS, percentile_ms
+
+
+# views.match_known_faces chegarasi
+MATCH_THRESHOLD = 0.5
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else float('nan')
+
+
+class Command(BaseCommand):
+    help = "Pipeline profillari (fast-login, accurate-enroll, audit) uchun latency va masofa taqsimoti"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--images', required=True, help='Belgilangan rasmlar papkasi: <papka>/<label>/*.jpg')
+        parser.add_argument(
+            '--profiles',
+            default=','.join(PIPELINE_PROFILES),
+            help=f"Vergul bilan ajratilgan profillar (mavjud: {', '.join(PIPELINE_PROFILES)})"
+        )
+
+    def handle(self, *args, **options):
+        samples = self.load_labelled(options['images'])
+        labels = {label for label, _ in samples}
+        if len(samples) < 2:
+            raise CommandError(f"Kamida 2 ta rasm kerak: {options['images']}")
+
+        self.stdout.write(self.style.WARNING(
+            f"\nProfillar: {len(samples)} ta rasm | {len(labels)} ta odam | chegara: {MATCH_THRESHOLD}\n"
+        ))
+
+        for name in [n.strip() for n in options['profiles'].split(',') if n.strip()]:
+            try:
+                profile = pipeline_profile(name)
+            except ValueError as e:
+                raise CommandError(str(e))
+            self.benchmark_profile(name, profile, samples)
+
+    def benchmark_profile(self, name, profile, samples):
+        timings = []
+        encoded = []
+        for label, image_bytes in samples:
+            start = time.perf_counter()
+            frame = decode_image_bytes(image_bytes, profile['max_side'])
+            encoding = encode_primary_face(frame, name) if frame is not None else None
+            timings.append(time.perf_counter() - start)
+            if encoding is not None:
+                encoded.append((label, encoding))
+
+        genuine = []
+        impostor = []
+        for (label_a, enc_a), (label_b, enc_b) in itertools.combinations(encoded, 2):
+            distance = float(np.linalg.norm(enc_a - enc_b))
+            (genuine if label_a == label_b else impostor).append(distance)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"  {name} ({profile['landmark_model']}, jitters={profile['num_jitters']}, {profile['max_side']}px)"
+        ))
+        self.stdout.write(
+            f"    latency      median: {percentile_ms(timings, 50):8.1f} ms   "
+            f"p95: {percentile_ms(timings, 95):8.1f} ms   yuz topildi: {len(encoded)}/{len(samples)}"
+        )
+        self.stdout.write(
+            f"    genuine      median: {percentile(genuine, 50):.3f}   p95: {percentile(genuine, 95):.3f}   "
+            f"rad etildi: {sum(d > MATCH_THRESHOLD for d in genuine)}/{len(genuine)}"
+        )
+        self.stdout.write(
+            f"    impostor     p5: {percentile(impostor, 5):.3f}   median: {percentile(impostor, 50):.3f}   "
+            f"qabul qilindi: {sum(d <= MATCH_THRESHOLD for d in impostor)}/{len(impostor)}\n"
+        )
+
+    def load_labelled(self, images_dir):
+        if not os.path.isdir(images_dir):
+            raise CommandError(f"Papka topilmadi: {images_dir}")
+
+        samples = []
+        for label in sorted(os.listdir(images_dir)):
+            label_dir = os.path.join(images_dir, label)
+            if not os.path.isdir(label_dir):
+                continue
+            for filename in sorted(os.listdir(label_dir)):
+                if filename.lower().endswith(IMAGE_EXTENSIONS):
+                    with open(os.path.join(label_dir, filename), 'rb') as f:
+                        samples.append((label, f.read()))
+        return samples
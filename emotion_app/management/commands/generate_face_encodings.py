@@ -3,12 +3,20 @@ Management command to generate face encodings for all persons with photos
 """
 from django.core.management.base import BaseCommand
 from emotion_app.models import Person
-import face_recognition
+from emotion_app.enrollment import photo_path
+from emotion_app.face_pipeline import ENROLL_PROFILE, face_encodings_from_file
 
 
 class Command(BaseCommand):
     help = 'Barcha rasmli Person yozuvlari uchun face encoding yaratish'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help="Mavjud encoding'larni ham qayta hisoblash (profil landmark modeli / jitter o'zgarganda)",
+        )
+
     def handle(self, *args, **options):
         self.stdout.write(self.style.WARNING('\nFace encoding yaratilmoqda...\n'))
 
@@ -23,19 +31,18 @@ class Command(BaseCommand):
         error_count = 0
 
         for person in persons:
-            # Agar face_encoding allaqachon bo'lsa, o'tkazib yuborish
-            if person.face_encoding:
+            # Agar face_encoding allaqachon bo'lsa, o'tkazib yuborish (--force bo'lmasa)
+            if person.face_encoding and not options['force']:
                 skipped_count += 1
                 continue
 
             try:
                 # Face encoding yaratish
-                image = face_recognition.load_image_file(person.photo.path)
-                encodings = face_recognition.face_encodings(image)
+                encodings = face_encodings_from_file(photo_path(person), ENROLL_PROFILE)
 
                 if encodings:
                     person.face_encoding = encodings[0].tolist()
-                    person.save()
+                    person.save(update_fields=['face_encoding'])
                     generated_count += 1
                     self.stdout.write(
                         self.style.SUCCESS(
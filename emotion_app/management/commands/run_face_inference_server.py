@@ -0,0 +1,43 @@
+"""
+Management command - lokal yuz tanish daemon'ini ishga tushirish
+
+Web worker'lar settings.FACE_INFERENCE_SOCKET orqali shu daemon'ga ulanadi.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from emotion_app.inference_server import FaceInferenceServer
+
+
+class Command(BaseCommand):
+    help = 'Yuz tanish daemon\'i (Unix socket, micro-batching) ni ishga tushirish'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--socket', default=None,
+                            help='Unix socket yo\'li (default: settings.FACE_INFERENCE_SOCKET)')
+        parser.add_argument('--batch-window-ms', type=float, default=5,
+                            help='Batch yig\'ish oynasi, ms (default: 5)')
+        parser.add_argument('--max-batch', type=int, default=8,
+                            help='Bitta batch\'dagi maksimal kadrlar (default: 8)')
+        parser.add_argument('--gallery-ttl', type=int, default=60,
+                            help='Galereyani qayta yuklash oralig\'i, sekund (default: 60)')
+        parser.add_argument('--prepare-workers', type=int, default=None,
+                            help='Decode + detection thread\'lari (default: min(4, CPU soni))')
+
+    def handle(self, *args, **options):
+        socket_path = options['socket'] or settings.FACE_INFERENCE_SOCKET
+        if not socket_path:
+            raise CommandError('Socket yo\'li berilmagan: --socket yoki FACE_INFERENCE_SOCKET')
+
+        server = FaceInferenceServer(
+            socket_path,
+            batch_window_ms=options['batch_window_ms'],
+            max_batch=options['max_batch'],
+            gallery_ttl=options['gallery_ttl'],
+            prepare_workers=options['prepare_workers'],
+        )
+
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('\nDaemon to\'xtatildi'))
@@ -0,0 +1,42 @@
+"""
+emotion_app/metrics.py
+Jarayon ichidagi oddiy hisoblagichlar (counter) va joriy qiymatlar (gauge)
+
+Har bir gunicorn worker o'z qiymatlarini saqlaydi; /api/face-metrics/
+so'rovni qabul qilgan worker'ning qiymatlarini qaytaradi.
+"""
+import os
+import threading
+from collections import defaultdict
+
+
+_lock = threading.Lock()
+_counters = defaultdict(int)
+_gauges = {}
+
+
+def incr(name, value=1):
+    """Hisoblagichni oshirish"""
+    with _lock:
+        _counters[name] += value
+
+
+def gauge_add(name, delta):
+    """Joriy qiymatni o'zgartirish (masalan in-flight +1 / -1)"""
+    with _lock:
+        _gauges[name] = _gauges.get(name, 0) + delta
+
+
+def set_gauge(name, value):
+    with _lock:
+        _gauges[name] = value
+
+
+def snapshot():
+    """Barcha qiymatlar nusxasi"""
+    with _lock:
+        return {
+            'pid': os.getpid(),
+            'counters': dict(_counters),
+            'gauges': dict(_gauges),
+        }
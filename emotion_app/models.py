@@ -5,6 +5,9 @@ Faqat login uchun kerakli modellar.
 """
 
 from django.db import models
+from django.utils import timezone
+
+from . import user_sync
 
 
 class Person(models.Model):
@@ -222,67 +225,41 @@ class Person(models.Model):
         """Jeton seriyasi (backward compatibility)"""
         return self.badge_number
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # DB'dagi identity holati - save()da User sinxronizatsiyasi kerakligini aniqlash uchun
+        if all(field in field_names for field in user_sync.IDENTITY_FIELDS):
+            instance._user_identity = user_sync.identity(instance)
+        return instance
+
     def save(self, *args, **kwargs):
         """
-        Person saqlanganda avtomatik Django User yaratish/yangilash
-        V1 database bilan ishlaydi
+        Person'ni saqlash. Django User (username = passport, parol = birth_date)
+        faqat identity maydonlari o'zgarganda fon thread'ida sinxronlanadi
+        (user_sync.py). Faqat rasm/encoding saqlash User'ga tegmaydi.
         """
         # ID yaratish (agar yangi bo'lsa)
         if not self.id:
             import uuid
             self.id = str(uuid.uuid4())
 
-        # Avval Person'ni saqlash
+        update_fields = kwargs.get('update_fields')
+        previous = getattr(self, '_user_identity', None)
+        current = user_sync.identity(self)
+
         super().save(*args, **kwargs)
 
-        # Django User yaratish/yangilash
-        try:
-            from django.contrib.auth.models import User
-
-            # USERNAME: passport (to'liq)
-            username = self.passport if self.passport else f"person_{self.id}"
-
-            # PASSWORD: birth_date (DDMMYYYY)
-            password = 'password123'  # Default
-            if self.birth_date:
-                try:
-                    from datetime import date
-                    if isinstance(self.birth_date, date):
-                        password = str(self.birth_date.strftime('%d%m%Y'))
-                    else:
-                        password = 'password123'
-                except Exception:
-                    password = 'password123'
-
-            # User yaratish yoki yangilash
-            user, created = User.objects.get_or_create(
-                username=username,
-                defaults={
-                    'first_name': self.first_name,
-                    'last_name': self.last_name,
-                    'is_staff': True,
-                    'is_superuser': True,
-                    'is_active': True,
-                }
-            )
-
-            if not created:
-                # Mavjud user'ni yangilash
-                user.first_name = self.first_name
-                user.last_name = self.last_name
-                user.set_password(password)
-                user.is_staff = True
-                user.is_superuser = True
-                user.is_active = True
-                user.save()
-
-            if created:
-                user.set_password(password)
-                user.save()
-
-        except Exception as e:
-            # Xatolik bo'lsa ham Person saqlangan bo'ladi
-            print(f"Django User yaratishda xatolik (Inspector {self.id}): {e}")
+        if update_fields is not None and not set(update_fields) & set(user_sync.IDENTITY_FIELDS):
+            return
+        if previous == current:
+            return
+
+        # Parol faqat passport yoki birth_date o'zgarganda qayta hash qilinadi
+        password_fields = [user_sync.IDENTITY_FIELDS.index(f) for f in user_sync.PASSWORD_FIELDS]
+        rehash = previous is None or any(previous[i] != current[i] for i in password_fields)
+        self._user_identity = current
+        user_sync.schedule(self.id, rehash)
 
     def __str__(self) -> str:
         return self.full_name
@@ -324,7 +301,7 @@ class LoginLog(models.Model):
 
     # === Login vaqti ===
     login_time = models.DateTimeField(
-        auto_now_add=True,
+        default=timezone.now,
         db_column='login_time',
         verbose_name='Kirish vaqti'
     )
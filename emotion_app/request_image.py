@@ -0,0 +1,111 @@
+"""
+emotion_app/request_image.py
+So'rov rasmi - bir marta decode qilinadi, barcha bosqichlar shu obyektdan foydalanadi
+
+Login oqimida bitta rasm bir necha bosqichdan o'tadi: sifat filtri va dedupe
+(thumbnail), client box (header o'lchami), tanish / encoding (BGR yoki RGB
+kadr), enrollment (accurate-enroll o'lchamdagi kadr) va LoginLog rasmi
+(baytlar). RequestImage har birini birinchi so'ralganda hisoblaydi va
+so'rov davomida saqlaydi - base64, header va piksellar qayta decode
+qilinmaydi.
+"""
+import base64
+
+import cv2
+
+from .face_pipeline import decode_image_bytes, decode_thumbnail, image_size_allowed, probe_image_size, scale_to_max_side
+
+
+def decode_data_url(image_data):
+    """Base64 data URL (yoki sof base64) dan rasm baytlarini olish"""
+    if "base64," in image_data:
+        image_data = image_data.split("base64,")[1]
+    return base64.b64decode(image_data)
+
+
+class RequestImage:
+    """
+    Bitta so'rov rasmi: baytlar, header o'lchami, BGR/RGB kadr va thumbnail
+    (hammasi lazy, natijalar cache'lanadi).
+
+    Kadrlar max_side bo'yicha saqlanadi: katta o'lchamda decode qilingan kadr
+    kichikroq so'rov uchun qayta decode qilinmaydi - shunchaki kichraytiriladi.
+    """
+
+    __slots__ = ('_data', '_data_url', '_size', '_frames', '_rgb', '_thumbnail')
+
+    def __init__(self, data=None, data_url=None):
+        self._data = data
+        self._data_url = data_url
+        self._size = None
+        self._frames = {}
+        self._rgb = {}
+        self._thumbnail = None
+
+    @classmethod
+    def from_data_url(cls, image_data):
+        return cls(data_url=image_data)
+
+    @property
+    def data(self):
+        """Rasm baytlari (data URL bo'lsa birinchi murojaatda decode qilinadi)"""
+        if self._data is None and self._data_url:
+            self._data = decode_data_url(self._data_url)
+            self._data_url = None
+        return self._data
+
+    @property
+    def size(self):
+        """Header'dagi (width, height) - aniqlab bo'lmasa None"""
+        if self._size is None:
+            self._size = probe_image_size(self.data) or ()
+        return self._size or None
+
+    @property
+    def allowed(self):
+        return self.size is not None and image_size_allowed(self.size)
+
+    def bgr(self, max_side=None):
+        """max_side bilan cheklangan BGR kadr (decode bo'lmasa None)"""
+        if max_side in self._frames:
+            return self._frames[max_side]
+
+        frame = None
+        # Kattaroq o'lchamda allaqachon decode qilingan kadrdan foydalanish
+        for side, cached in self._frames.items():
+            if cached is not None and max_side and (side is None or side >= max_side):
+                frame, _ = scale_to_max_side(cached, max_side)
+                break
+
+        if frame is None and self.allowed:
+            frame = decode_image_bytes(self.data, max_side, size=self.size)
+        elif frame is None and self.size is not None:
+            print(f"⚠️  Rasm o'lchami ruxsat etilmagan: {self.size[0]}x{self.size[1]}")
+
+        self._frames[max_side] = frame
+        return frame
+
+    def rgb(self, max_side=None):
+        """
+        max_side bilan cheklangan RGB kadr (decode bo'lmasa None).
+        BGR kadr oldin so'ralmagan bo'lsa u saqlanmaydi (xotirada bitta nusxa).
+        """
+        if max_side not in self._rgb:
+            keep_bgr = max_side in self._frames
+            frame = self.bgr(max_side)
+            self._rgb[max_side] = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB) if frame is not None else None
+            if not keep_bgr and frame is not None:
+                del self._frames[max_side]
+        return self._rgb[max_side]
+
+    def thumbnail(self):
+        """1/8 o'lchamli grayscale thumbnail (sifat filtri va dedupe uchun)"""
+        if self._thumbnail is None:
+            self._thumbnail = decode_thumbnail(self.data, size=self.size) if self.allowed else False
+        return self._thumbnail if self._thumbnail is not False else None
+
+    def release(self):
+        """Decode qilingan kadrlarni bo'shatish (baytlar qoladi)"""
+        self._frames.clear()
+        self._rgb.clear()
+        self._thumbnail = None
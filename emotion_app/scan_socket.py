@@ -0,0 +1,335 @@
+"""
+emotion_app/scan_socket.py
+WebSocket orqali uzluksiz yuz skanerlash sessiyasi (ASGI)
+
+Protokol (/ws/face-scan/):
+- Client binary xabar sifatida JPEG kadr yuboradi
+- Server bir vaqtda faqat bitta kadrni ishlaydi; band paytida kelgan
+  kadrlardan faqat eng oxirgisi saqlanadi (eskilari tashlab yuboriladi)
+- Har bir kadr ishlangandan keyin server {"type": "ready"} yuboradi -
+  client keyingi kadrni shundan keyin yuboradi (backpressure server qo'lida)
+- Birinchi ishonchli moslikda {"type": "match", "person": {...}} yuboriladi
+  va sessiya yopiladi
+- Client {"type": "stop"} yuborib sessiyani to'xtatishi mumkin
+
+Cheklovlar (HTTP endpoint'lari bilan bir xil):
+- Ulanish faqat ruxsat etilgan Origin'dan va capture profili bergan imzoli
+  ticket bilan qabul qilinadi (core/asgi.py accept'dan oldin tekshiradi)
+- Host va client bo'yicha bir vaqtdagi sessiyalar soni cheklangan - ortig'i
+  accept qilinmasdan yopiladi (client HTTP polling'ga o'tadi)
+- Har bir kadr admission slot'i bilan ishlanadi va yuklama jadvalida
+  hisoblanadi; host yoki executor navbati band bo'lsa kadr tashlab
+  yuboriladi va {"type": "ready", "busy": true} biroz kechiktirib yuboriladi
+"""
+import asyncio
+import hashlib
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+from django.conf import settings
+from django.core import signing
+from django.db import close_old_connections
+from django.http.request import validate_host
+
+from . import admission, metrics
+
+
+# Sessiya maksimal davomiyligi (sekund)
+SCAN_SESSION_TIMEOUT = 30
+
+# Bitta kadr hajmi chegarasi (bayt)
+MAX_FRAME_BYTES = 2 * 1024 * 1024
+
+# Tanish uchun thread'lar soni (barcha sessiyalar uchun umumiy)
+SCAN_EXECUTOR_WORKERS = 4
+
+# Executor'da ishlanayotgan + kutayotgan kadrlar chegarasi (oshsa kadr tashlanadi)
+SCAN_EXECUTOR_MAX_PENDING = SCAN_EXECUTOR_WORKERS * 2
+
+# Band paytida keyingi "ready" gacha pauza (sekund)
+SCAN_BUSY_DELAY = 0.5
+
+# Ticket imzosi uchun salt
+TICKET_SALT = 'emotion_app.scan_socket'
+
+# WebSocket close kodlari
+CLOSE_FORBIDDEN = 4403
+CLOSE_TRY_AGAIN = 1013
+
+_executor = ThreadPoolExecutor(max_workers=SCAN_EXECUTOR_WORKERS, thread_name_prefix='face-scan')
+_executor_slots = threading.BoundedSemaphore(SCAN_EXECUTOR_MAX_PENDING)
+
+
+def _session_limits():
+    return (
+        getattr(settings, 'FACE_SCAN_MAX_SESSIONS', 16),
+        getattr(settings, 'FACE_SCAN_MAX_SESSIONS_PER_CLIENT', 2),
+    )
+
+
+# =====================================================
+# Ulanishni tekshirish (Origin va ticket)
+# =====================================================
+
+def issue_ticket():
+    """Capture profili bilan beriladigan imzoli, muddatli skanerlash ticket'i"""
+    return signing.TimestampSigner(salt=TICKET_SALT).sign(uuid.uuid4().hex)
+
+
+def _headers(scope):
+    return {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope.get('headers', [])}
+
+
+def origin_allowed(scope):
+    """Origin CSRF_TRUSTED_ORIGINS da yoki host'i ALLOWED_HOSTS da bo'lsa True (Origin'siz - False)"""
+    origin = _headers(scope).get('origin', '')
+    if not origin:
+        return False
+    if origin in getattr(settings, 'CSRF_TRUSTED_ORIGINS', []):
+        return True
+    host = urlsplit(origin).netloc
+    return bool(host) and validate_host(host, settings.ALLOWED_HOSTS)
+
+
+def ticket_valid(scope):
+    """?ticket= imzosi to'g'ri va FACE_SCAN_TICKET_TTL dan eskirmagan bo'lsa True"""
+    query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+    ticket = (query.get('ticket') or [''])[0]
+    if not ticket:
+        return False
+    try:
+        signing.TimestampSigner(salt=TICKET_SALT).unsign(
+            ticket, max_age=getattr(settings, 'FACE_SCAN_TICKET_TTL', 600)
+        )
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def client_key(scope):
+    """IP + User-Agent hash'i (frame_dedupe.client_key kabi) - client bo'yicha sessiya chegarasi uchun"""
+    headers = _headers(scope)
+    ip = headers.get('x-forwarded-for', '').split(',')[0].strip() or (scope.get('client') or ('',))[0]
+    user_agent = headers.get('user-agent', '').encode('utf-8', 'replace')
+    return f"{ip}|ua:{hashlib.sha1(user_agent).hexdigest()[:12]}"
+
+
+def _submit(fn, *args):
+    """
+    Kadrni executor'ga berish - navbat to'la bo'lsa None (kadr tashlanadi).
+    Slot future tugaganda bo'shatiladi.
+    """
+    if not _executor_slots.acquire(blocking=False):
+        return None
+    try:
+        future = _executor.submit(fn, *args)
+    except Exception:
+        _executor_slots.release()
+        raise
+    future.add_done_callback(lambda _: _executor_slots.release())
+    return future
+
+
+def _recognize_frame(image_bytes, tracker):
+    """
+    Kadrni tanish - inference daemon yoki lokal (executor thread'ida ishlaydi).
+
+    Returns:
+        (PersonRecognitionResult, sifat sababi yoki None)
+    """
+    from .request_image import RequestImage
+    from .views import PersonRecognitionResult, frame_quality_gate, recognize_image
+
+    image = RequestImage(image_bytes)
+    quality_issue = frame_quality_gate(image.thumbnail())
+    if quality_issue:
+        return PersonRecognitionResult(), quality_issue
+
+    close_old_connections()
+    try:
+        return recognize_image(image, tracker) or PersonRecognitionResult(), None
+    finally:
+        close_old_connections()
+
+
+async def _send_json(send, payload):
+    await send({'type': 'websocket.send', 'text': json.dumps(payload)})
+
+
+async def reject(receive, send, code):
+    """Ulanishni accept qilmasdan yopish (handshake rad etiladi)"""
+    message = await receive()
+    if message['type'] == 'websocket.connect':
+        await send({'type': 'websocket.close', 'code': code})
+
+
+async def face_scan_session(scope, receive, send):
+    """
+    ASGI WebSocket handler - bitta kiosk skanerlash sessiyasi.
+    Origin va ticket core/asgi.py da tekshirilgan; bu yerda sessiya chegaralari.
+    """
+    max_sessions, max_per_client = _session_limits()
+    client_prefix = 'scan_client_' + hashlib.sha1(client_key(scope).encode('utf-8')).hexdigest()[:16]
+
+    with admission.named_slot('scan_session', max_sessions) as host_ok, \
+            admission.named_slot(client_prefix, max_per_client) as client_ok:
+        if not (host_ok and client_ok):
+            metrics.incr('scan.session_rejected')
+            await reject(receive, send, CLOSE_TRY_AGAIN)
+            return
+        metrics.incr('scan.sessions')
+        await _scan_session(receive, send)
+
+
+async def _recognize_admitted(frame_bytes, tracker):
+    """
+    Kadrni admission slot'i bilan executor'da tanish - host yoki executor
+    navbati band bo'lsa None. Sessiya bekor qilinsa ham slot kadr thread'da
+    tugaguncha band turadi.
+    """
+    async with admission.admitted() as ok:
+        future = _submit(_recognize_frame, frame_bytes, tracker) if ok else None
+        if future is None:
+            return None
+
+        wrapped = asyncio.wrap_future(future)
+        try:
+            return await asyncio.shield(wrapped)
+        except asyncio.CancelledError:
+            await asyncio.wait([wrapped])
+            raise
+
+
+async def _scan_session(receive, send):
+    from .face_tracking import FaceTracker
+    from .views import crowding_feedback, quality_feedback, recognized_person_data
+
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+    await send({'type': 'websocket.accept'})
+
+    frame_ready = asyncio.Event()
+    tracker = FaceTracker()  # sessiya davomida yuz joyi
+    state = {
+        'latest': None,      # eng oxirgi kelgan kadr
+        'closed': False,
+        'received': 0,
+        'dropped': 0,
+        'processed': 0,
+    }
+
+    async def reader():
+        """Kadrlarni qabul qilish - band bo'lsa eski kadrni yangisi bilan almashtirish"""
+        while not state['closed']:
+            message = await receive()
+
+            if message['type'] == 'websocket.disconnect':
+                state['closed'] = True
+                frame_ready.set()
+                return
+
+            if message['type'] != 'websocket.receive':
+                continue
+
+            if message.get('bytes'):
+                frame_bytes = message['bytes']
+                if len(frame_bytes) > MAX_FRAME_BYTES:
+                    await _send_json(send, {'type': 'error', 'error': 'Kadr hajmi juda katta'})
+                    continue
+                state['received'] += 1
+                if state['latest'] is not None:
+                    state['dropped'] += 1
+                state['latest'] = frame_bytes
+                frame_ready.set()
+            elif message.get('text'):
+                try:
+                    command = json.loads(message['text'])
+                except ValueError:
+                    continue
+                if command.get('type') == 'stop':
+                    state['closed'] = True
+                    frame_ready.set()
+                    return
+
+    async def worker():
+        """Kadrlarni navbat bilan tanish; birinchi moslikda natijani darhol yuborish"""
+        await _send_json(send, {'type': 'ready'})
+
+        while not state['closed']:
+            await frame_ready.wait()
+            frame_ready.clear()
+
+            frame_bytes, state['latest'] = state['latest'], None
+            if state['closed'] or frame_bytes is None:
+                continue
+
+            started = time.perf_counter()
+            recognized = await _recognize_admitted(frame_bytes, tracker)
+            if recognized is None:
+                # Host yoki executor band - kadr tashlanadi, client biroz kutadi
+                metrics.incr('scan.frame_busy')
+                state['dropped'] += 1
+                await asyncio.sleep(SCAN_BUSY_DELAY)
+                await _send_json(send, {
+                    'type': 'ready',
+                    'busy': True,
+                    'frames_processed': state['processed'],
+                    'frames_dropped': state['dropped'],
+                })
+                continue
+
+            result, quality_issue = recognized
+            state['processed'] += 1
+
+            if result.is_registered:
+                await _send_json(send, {
+                    'type': 'match',
+                    'success': True,
+                    'person': recognized_person_data(result.person, result.confidence),
+                    'message': f"{result.person.full_name} tanildi",
+                    'latency_ms': round((time.perf_counter() - started) * 1000.0, 1),
+                    'frames_received': state['received'],
+                    'frames_dropped': state['dropped'],
+                })
+                state['closed'] = True
+                return
+
+            await _send_json(send, {
+                'type': 'ready',
+                'frames_processed': state['processed'],
+                'frames_dropped': state['dropped'],
+                **crowding_feedback(result),
+                **(quality_feedback(quality_issue) if quality_issue else {}),
+            })
+
+    reader_task = asyncio.ensure_future(reader())
+    worker_task = asyncio.ensure_future(worker())
+
+    try:
+        done, _ = await asyncio.wait(
+            [worker_task, reader_task],
+            timeout=SCAN_SESSION_TIMEOUT,
+            return_when=asyncio.FIRST_COMPLETED,
+        )
+        if not done:
+            await _send_json(send, {'type': 'timeout', 'message': 'Yuz aniqlanmadi'})
+        elif reader_task in done and not worker_task.done():
+            # Client uzildi yoki to'xtatdi - joriy kadr tugashini kutmaymiz
+            state['closed'] = True
+    except Exception as e:
+        print(f"WebSocket skanerlash xatosi: {e}")
+    finally:
+        state['closed'] = True
+        frame_ready.set()
+        for task in (reader_task, worker_task):
+            if not task.done():
+                task.cancel()
+        try:
+            await send({'type': 'websocket.close', 'code': 1000})
+        except Exception:
+            pass
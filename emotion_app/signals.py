@@ -0,0 +1,53 @@
+"""
+emotion_app/signals.py
+Model signal'lari - Person yoki User o'zgarganda login profili cache'ini tozalash,
+Person encoding'i o'zgarganda inference daemon galereyasini yangilash
+"""
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import login_profiles, user_sync
+from .inference_client import request_gallery_reload
+from .models import Person
+
+
+@receiver(post_save, sender=Person)
+@receiver(post_delete, sender=Person)
+def person_changed(sender, instance, **kwargs):
+    """
+    Person (rasm, encoding, passport...) o'zgardi - profil barcha worker'larda
+    qayta yuklanadi. Commit'dan keyin yana bir marta: commit'gacha boshqa
+    worker eski qatorni o'qib profilga olgan bo'lishi mumkin.
+    """
+    passports = {instance.passport}
+    # DB'dan o'qilgan (saqlashdan oldingi) passport - passport o'zgargan bo'lsa eski kalit
+    previous = getattr(instance, '_user_identity', None)
+    if previous:
+        passports.add(previous[user_sync.IDENTITY_FIELDS.index('passport')])
+
+    def invalidate():
+        for passport in passports - {None}:
+            login_profiles.invalidate_person(instance.id, passport)
+
+    invalidate()
+    transaction.on_commit(invalidate)
+
+
+@receiver(post_save, sender=Person)
+@receiver(post_delete, sender=Person)
+def person_encoding_changed(sender, instance, update_fields=None, **kwargs):
+    """Galereyaga ta'sir qiladigan o'zgarish (enrollment, tahrir, o'chirish) - daemon'ga reload"""
+    if update_fields is not None and 'face_encoding' not in update_fields:
+        return
+    transaction.on_commit(request_gallery_reload)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    """User o'zgardi (username = passport). Login'dagi last_login yangilanishi e'tiborga olinmaydi."""
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    login_profiles.invalidate_person(passport=instance.username)
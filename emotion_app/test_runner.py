@@ -0,0 +1,29 @@
+"""
+emotion_app/test_runner.py
+Test runner - test bazasida V1 jadvallarini (managed = False) ham yaratadi
+
+Person (inspectors) va LoginLog (login_logs) V1 bazasidagi jadvallar, Django
+migrations ularni yaratmaydi. Test bazasi bo'sh bo'lgani uchun runner migrate
+dan keyin ularni modellardan yaratadi.
+"""
+from django.apps import apps
+from django.db import connections
+from django.test.runner import DiscoverRunner
+
+
+class UnmanagedTablesTestRunner(DiscoverRunner):
+    """DiscoverRunner + managed = False modellar uchun jadvallar"""
+
+    def setup_databases(self, **kwargs):
+        old_config = super().setup_databases(**kwargs)
+
+        models = [model for model in apps.get_app_config('emotion_app').get_models() if not model._meta.managed]
+        for alias in connections:
+            connection = connections[alias]
+            existing = set(connection.introspection.table_names())
+            with connection.schema_editor() as editor:
+                # FK tartibi: Person modellari LoginLog'dan oldin e'lon qilingan
+                for model in models:
+                    if model._meta.db_table not in existing:
+                        editor.create_model(model)
+        return old_config
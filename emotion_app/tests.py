@@ -1,3 +1,1404 @@
-from django.test import TestCase
+import asyncio
+import base64
+import contextlib
+import datetime
+import io
+import json
+import mmap
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError, OperationalError, transaction
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from . import (
+    admission,
+    async_views,
+    buffer_pool,
+    detectors,
+    enrollment,
+    face_pipeline,
+    face_tracking,
+    frame_dedupe,
+    inference_server,
+    login_log_writer,
+    login_profiles,
+    request_image,
+    scan_socket,
+    user_sync,
+    views,
+)
+from .models import LoginLog, Person
+from .views import PersonRecognitionResult
+
+
+# =====================================================
+# Yordamchi funksiyalar
+# =====================================================
+
+def make_person(passport='AA1234567', **fields):
+    fields.setdefault('first_name', 'Ali')
+    fields.setdefault('last_name', 'Valiyev')
+    fields.setdefault('birth_date', datetime.date(1990, 5, 17))
+    fields.setdefault('pinfl', str(uuid.uuid4().int)[:14])
+    return Person.objects.create(passport=passport, **fields)
+
+
+def make_login_log(person_id, photo=False):
+    log = LoginLog(
+        id=str(uuid.uuid4()),
+        inspector_id=person_id,
+        login_method='face',
+        login_time=timezone.now(),
+        success=True,
+    )
+    if photo:
+        log.login_photo = login_log_writer.photo_name(person_id, log.id)
+    return log
+
+
+def jpeg_bytes(size=(64, 48), color=(120, 90, 60)):
+    from PIL import Image
+
+    output = io.BytesIO()
+    Image.new('RGB', size, color).save(output, format='JPEG')
+    return output.getvalue()
+
+
+def use_settings(test, **overrides):
+    """Sozlamalarni test oxirigacha almashtirish (cleanup'da qaytariladi)"""
+    settings_override = override_settings(**overrides)
+    settings_override.enable()
+    test.addCleanup(settings_override.disable)
+
+
+def temp_dir(test, prefix):
+    """Test oxirida o'chiriladigan vaqtinchalik papka"""
+    path = tempfile.mkdtemp(prefix=prefix)
+    test.addCleanup(shutil.rmtree, path, ignore_errors=True)
+    return path
+
+
+class AdmissionDirMixin:
+    """View'lar orqali o'tadigan testlar uchun alohida admission slot papkasi"""
+
+    def setUp(self):
+        super().setUp()
+        use_settings(self, FACE_ADMISSION_DIR=temp_dir(self, 'face-admission-test-'))
+
+
+class TempDirsMixin:
+    """MEDIA_ROOT va spool uchun vaqtinchalik papkalar"""
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = temp_dir(self, 'face-media-test-')
+        self.spool_root = temp_dir(self, 'face-spool-test-')
+        use_settings(
+            self,
+            MEDIA_ROOT=self.media_root,
+            FACE_LOGIN_LOG_SPOOL_DIR=self.spool_root,
+            FACE_USER_SYNC_ASYNC=False,
+            # Fon thread'i test tugagandan keyin boshqa papka / DB ga yozmasin
+            FACE_LOGIN_LOG_ASYNC=False,
+            PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+        )
+
+
+# =====================================================
+# Async view'lar
+# =====================================================
+
+class AsyncViewTests(AdmissionDirMixin, SimpleTestCase):
+    """Async endpoint'lar haqiqiy HttpResponse qaytaradi (coroutine emas)"""
+
+    def setUp(self):
+        super().setUp()
+        self.client = Client(enforce_csrf_checks=True)
+
+    def test_views_stay_coroutine_functions(self):
+        for view in (async_views.detect_face_async, async_views.face_login_auth_async):
+            self.assertTrue(asyncio.iscoroutinefunction(view))
+            self.assertTrue(view.csrf_exempt)
+
+    def test_stage_slot_held_until_thread_finishes(self):
+        stage = async_views.PipelineStage('test', workers=1, max_queue=0, timeout=0.05)
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        with self.assertRaises(asyncio.TimeoutError):
+            asyncio.run(stage.run(release.wait, 5))
+        # Thread hali ishlayapti - yangi ish qabul qilinmaydi
+        self.assertEqual(stage.pending, 1)
+        with self.assertRaises(async_views.StageBusy):
+            asyncio.run(stage.run(time.sleep, 0))
+
+        release.set()
+        stage._executor.submit(lambda: None).result(5)
+        self.assertEqual(stage.pending, 0)
+
+    def test_detect_face_async_without_image(self):
+        response = self.client.post('/api/async/face-detect/', data='{}', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(json.loads(response.content), {'error': 'No image provided'})
+
+    def test_detect_face_async_rejects_get(self):
+        response = self.client.get('/api/async/face-detect/')
+        self.assertEqual(response.status_code, 405)
+
+    def test_face_login_async_requires_passport(self):
+        response = self.client.post('/api/async/face-login/', data='{}', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(json.loads(response.content)['success'])
+
+
+# =====================================================
+# Admission control
+# =====================================================
+
+class AdmissionTests(SimpleTestCase):
+    """Host slot'lari, 503 javobi va lock'siz yuklama o'lchovi"""
+
+    def setUp(self):
+        use_settings(
+            self,
+            FACE_ADMISSION_DIR=temp_dir(self, 'face-admission-slots-'),
+            FACE_MAX_IN_FLIGHT=1, FACE_MAX_QUEUE=1, FACE_QUEUE_WAIT=0.1,
+        )
+
+    @staticmethod
+    def request():
+        return mock.Mock(spec=[])
+
+    def test_usage_counts_in_flight_request(self):
+        seen = []
+
+        @admission.admission_controlled
+        def view(request):
+            seen.append(admission.host_usage())
+            return 'ok'
+
+        self.assertEqual(view(self.request()), 'ok')
+        self.assertEqual(seen, [{'in_flight': 1, 'queued': 0}])
+        self.assertEqual(admission.host_usage(), {'in_flight': 0, 'queued': 0})
+
+    def test_full_host_returns_503(self):
+        slot = admission._try_slot('slot', 1)
+        queue = admission._try_slot('queue', 1)
+        self.addCleanup(admission._release, slot)
+        self.addCleanup(admission._release, queue)
+
+        view = admission.admission_controlled(lambda request: 'ok')
+        response = view(self.request())
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '2')
+
+    def test_queued_request_times_out_with_503(self):
+        slot = admission._try_slot('slot', 1)
+        self.addCleanup(admission._release, slot)
+
+        view = admission.admission_controlled(lambda request: 'ok')
+        self.assertEqual(view(self.request()).status_code, 503)
+        self.assertEqual(admission.host_usage(), {'in_flight': 0, 'queued': 0})
+
+    def test_usage_probe_does_not_take_slot_locks(self):
+        with mock.patch.object(admission, '_try_slot', side_effect=AssertionError('slot lock olindi')):
+            admission.host_usage()
+            admission.host_load()
+
+    def test_nested_view_does_not_take_second_slot(self):
+        inner = admission.admission_controlled(lambda request: 'inner')
+        outer = admission.admission_controlled(lambda request: inner(request))
+        self.assertEqual(outer(self.request()), 'inner')
+
+
+# =====================================================
+# Kadr dedupe
+# =====================================================
+
+class FrameDedupeTests(SimpleTestCase):
+    """Faqat salbiy natijalar, faqat X-Kiosk-Id bo'yicha, TTL bilan"""
+
+    def setUp(self):
+        frame_dedupe._cache.clear()
+        self.addCleanup(frame_dedupe._cache.clear)
+        self.factory = RequestFactory()
+        gradient = np.tile(np.arange(0, 256, 4, dtype=np.uint8), (48, 1))
+        self.frame = gradient
+        self.similar_frame = gradient.copy()
+        self.similar_frame[0, 0] += 1
+        self.other_frame = gradient[:, ::-1].copy()
+
+    def request(self, kiosk='kiosk-1', ip='10.0.0.5'):
+        headers = {'HTTP_X_KIOSK_ID': kiosk} if kiosk else {}
+        return self.factory.post('/api/face-detect/', REMOTE_ADDR=ip, **headers)
+
+    def remember(self, thumbnail, result, kiosk='kiosk-1'):
+        key, frame_hash, cached = frame_dedupe.lookup(self.request(kiosk), thumbnail)
+        self.assertIsNone(cached)
+        frame_dedupe.remember(key, frame_hash, result)
+
+    def test_negative_result_hit_and_miss(self):
+        self.remember(self.frame, PersonRecognitionResult(faces_count=0))
+
+        _, _, cached = frame_dedupe.lookup(self.request(), self.similar_frame)
+        self.assertEqual(cached.faces_count, 0)
+        _, _, cached = frame_dedupe.lookup(self.request(), self.other_frame)
+        self.assertIsNone(cached)
+
+    def test_positive_result_is_never_cached(self):
+        self.remember(self.frame, PersonRecognitionResult(faces_count=0))
+        self.remember(self.other_frame, PersonRecognitionResult(person=mock.Mock(), confidence=90.0, faces_count=1))
+
+        for thumbnail in (self.frame, self.other_frame):
+            _, _, cached = frame_dedupe.lookup(self.request(), thumbnail)
+            self.assertIsNone(cached)
+
+    def test_entry_expires(self):
+        self.remember(self.frame, PersonRecognitionResult(faces_count=0))
+        later = time.monotonic() + frame_dedupe.DEDUPE_TTL + 1
+        with mock.patch('emotion_app.cache_utils.time.monotonic', return_value=later):
+            _, _, cached = frame_dedupe.lookup(self.request(), self.frame)
+        self.assertIsNone(cached)
+
+    def test_kiosks_behind_one_ip_are_separate(self):
+        self.remember(self.frame, PersonRecognitionResult(faces_count=0), kiosk='kiosk-1')
+        _, _, cached = frame_dedupe.lookup(self.request('kiosk-2'), self.frame)
+        self.assertIsNone(cached)
+
+    def test_no_dedupe_without_kiosk_id(self):
+        key, frame_hash, cached = frame_dedupe.lookup(self.request(kiosk=None), self.frame)
+        self.assertIsNone(frame_hash)
+        frame_dedupe.remember(key, frame_hash, PersonRecognitionResult(faces_count=0))
+        self.assertEqual(len(frame_dedupe._cache), 0)
+
+        other = self.factory.post('/', REMOTE_ADDR='10.0.0.5', HTTP_USER_AGENT='kiosk-b')
+        self.assertNotEqual(frame_dedupe.client_key(self.request(kiosk=None)), frame_dedupe.client_key(other))
+
+
+# =====================================================
+# Inference daemon
+# =====================================================
+
+class InferenceServerTests(SimpleTestCase):
+    """Decode/detection pool'da, faqat encoding batch'da; reload galereyani eskirtiradi"""
+
+    def setUp(self):
+        self.server = inference_server.FaceInferenceServer('/tmp/unused.sock', batch_window_ms=50, prepare_workers=4)
+        self.loads = []
+
+        def load():
+            self.loads.append(time.monotonic())
+            self.server.gallery._data = (['p1'], np.zeros((1, 128)))
+            self.server.gallery.loaded_at = time.monotonic()
+
+        patches = [
+            mock.patch.object(self.server.gallery, '_load', side_effect=load),
+            mock.patch.object(inference_server, 'decode_to_rgb', side_effect=self.decode),
+            mock.patch.object(inference_server, 'locate_primary_face', side_effect=self.locate),
+            mock.patch.object(inference_server, 'encode_faces_batched', side_effect=self.encode),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.server.gallery.refresh(force=True)
+        threading.Thread(target=self.server._batch_loop, daemon=True).start()
+
+        self.prepare_threads = set()
+        self.batches = []
+
+    def decode(self, payload, max_side):
+        self.prepare_threads.add(threading.current_thread().name)
+        return None if payload == b'broken' else np.zeros((10, 10, 3), dtype=np.uint8)
+
+    def locate(self, rgb_frame):
+        time.sleep(0.01)
+        return (1, 8, 8, 1), 1
+
+    def encode(self, items):
+        self.batches.append(len(items))
+        return [[np.zeros(128)] for _ in items]
+
+    def test_prepare_in_pool_and_encode_in_one_batch(self):
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(self.server.handle_request({'op': 'recognize'}, b'jpeg')))
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(len(results), 4)
+        self.assertTrue(all(result['person_id'] == 'p1' for result in results))
+        self.assertTrue(all(name.startswith('face-prepare') for name in self.prepare_threads))
+        self.assertGreater(len(self.prepare_threads), 1)
+        self.assertEqual(sum(self.batches), 4)
+        self.assertLess(len(self.batches), 4)
+
+    def test_decode_failure_skips_batch(self):
+        result = self.server.handle_request({'op': 'encode'}, b'broken')
+        self.assertEqual(result, {'ok': False, 'error': 'decode_failed'})
+        self.assertEqual(self.batches, [])
+
+    def test_reload_marks_gallery_stale(self):
+        self.assertEqual(len(self.loads), 1)
+        self.assertTrue(self.server.handle_request({'op': 'reload'}, b'')['ok'])
+        self.assertEqual(len(self.loads), 1)
+
+        self.server.handle_request({'op': 'encode'}, b'jpeg')
+        self.assertEqual(len(self.loads), 2)
+
+
+# =====================================================
+# Guruh yo'qlamasi
+# =====================================================
+
+class AssignKnownFacesTests(SimpleTestCase):
+    """Har bir shaxs kadrda ko'pi bilan bitta yuzga biriktiriladi"""
+
+    def setUp(self):
+        basis = np.eye(128)
+        self.gallery = [np.zeros(128), 0.5 * basis[1]]   # A, B
+        patcher = mock.patch.object(views, 'load_known_faces_cached', return_value=(self.gallery, ['A', 'B']))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_person_is_assigned_once(self):
+        basis = np.eye(128)
+        faces = [
+            0.1 * basis[0],   # A: 0.1, B: 0.51
+            0.2 * basis[1],   # A: 0.2, B: 0.3 - A band bo'lgani uchun B
+            basis[2],         # hech kimga yaqin emas
+        ]
+        assignments = views.assign_known_faces(faces)
+
+        self.assertEqual([(face, result.person) for face, result in assignments], [(0, 'A'), (1, 'B')])
+        self.assertAlmostEqual(assignments[0][1].confidence, 90.0)
+        self.assertAlmostEqual(assignments[1][1].confidence, 70.0)
+
+    def test_no_faces(self):
+        self.assertEqual(views.assign_known_faces([]), [])
+
+
+class RollCallAuthTests(AdmissionDirMixin, TestCase):
+    """Davomatni faqat tizimga kirgan staff yozadi (CSRF bilan)"""
+
+    # CSRF cookie qiymati (32 belgili secret)
+    CSRF_TOKEN = 'a' * 32
+
+    def setUp(self):
+        super().setUp()
+        self.client = Client(enforce_csrf_checks=True)
+        self.client.cookies['csrftoken'] = self.CSRF_TOKEN
+
+    def post_photo(self, **extra):
+        return self.client.post('/api/roll-call/', data=jpeg_bytes(), content_type='image/jpeg', **extra)
+
+    def login(self, is_staff):
+        from django.contrib.auth.models import User
+
+        user = User.objects.create_user('teacher', password='secret', is_staff=is_staff)
+        self.client.force_login(user)
+
+    def test_anonymous_is_rejected(self):
+        with mock.patch.object(views.login_log_writer, 'record') as record:
+            response = self.post_photo(HTTP_X_CSRFTOKEN=self.CSRF_TOKEN)
+        self.assertEqual(response.status_code, 401)
+        record.assert_not_called()
+
+    def test_non_staff_is_rejected(self):
+        self.login(is_staff=False)
+        response = self.post_photo(HTTP_X_CSRFTOKEN=self.CSRF_TOKEN)
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(json.loads(response.content)['error'], 'Permission denied')
+
+    def test_staff_without_csrf_token_is_rejected(self):
+        self.login(is_staff=True)
+        with mock.patch.object(views, 'detect_faces_adaptive') as detect:
+            response = self.post_photo()
+        self.assertEqual(response.status_code, 403)
+        detect.assert_not_called()
+
+    def test_staff_with_csrf_token(self):
+        self.login(is_staff=True)
+        with mock.patch.object(views, 'detect_faces_adaptive', return_value=([], 0)):
+            response = self.post_photo(HTTP_X_CSRFTOKEN=self.CSRF_TOKEN)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['faces_count'], 0)
+
+
+# =====================================================
+# WebSocket skanerlash
+# =====================================================
+
+def run_websocket(app, scope):
+    """ASGI WebSocket ilovasini connect xabari bilan ishga tushirib, yuborilgan xabarlarni qaytarish"""
+    sent = []
+    messages = [{'type': 'websocket.connect'}]
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        return {'type': 'websocket.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    return sent
+
+
+@override_settings(ALLOWED_HOSTS=['localhost'], CSRF_TRUSTED_ORIGINS=[])
+class ScanSocketTests(AdmissionDirMixin, SimpleTestCase):
+    """Origin, ticket, sessiya chegarasi va executor navbati"""
+
+    def scope(self, origin='http://localhost', ticket=None):
+        headers = [(b'user-agent', b'kiosk-test')]
+        if origin:
+            headers.append((b'origin', origin.encode()))
+        return {
+            'type': 'websocket',
+            'path': '/ws/face-scan/',
+            'headers': headers,
+            'query_string': f'ticket={ticket}'.encode() if ticket else b'',
+            'client': ('127.0.0.1', 50000),
+        }
+
+    def test_origin_and_ticket(self):
+        ticket = scan_socket.issue_ticket()
+        self.assertTrue(scan_socket.origin_allowed(self.scope()))
+        self.assertFalse(scan_socket.origin_allowed(self.scope(origin='https://evil.example')))
+        self.assertFalse(scan_socket.origin_allowed(self.scope(origin=None)))
+        self.assertTrue(scan_socket.ticket_valid(self.scope(ticket=ticket)))
+        self.assertFalse(scan_socket.ticket_valid(self.scope(ticket=ticket + 'x')))
+        self.assertFalse(scan_socket.ticket_valid(self.scope()))
+        with override_settings(FACE_SCAN_TICKET_TTL=-1):
+            self.assertFalse(scan_socket.ticket_valid(self.scope(ticket=ticket)))
+
+    def test_connection_without_ticket_is_not_accepted(self):
+        from core.asgi import application
+
+        sent = run_websocket(application, self.scope())
+        self.assertEqual(sent, [{'type': 'websocket.close', 'code': scan_socket.CLOSE_FORBIDDEN}])
+
+    @override_settings(FACE_SCAN_MAX_SESSIONS=0)
+    def test_session_over_host_limit_is_not_accepted(self):
+        sent = run_websocket(scan_socket.face_scan_session, self.scope())
+        self.assertEqual(sent, [{'type': 'websocket.close', 'code': scan_socket.CLOSE_TRY_AGAIN}])
+
+    def test_executor_queue_is_bounded(self):
+        release = threading.Event()
+        with mock.patch.object(scan_socket, '_executor_slots', threading.BoundedSemaphore(1)):
+            first = scan_socket._submit(release.wait, 5)
+            self.assertIsNone(scan_socket._submit(release.wait, 5))
+            release.set()
+            first.result(5)
+            second = scan_socket._submit(lambda: 'ok')
+            self.assertEqual(second.result(5), 'ok')
+
+    def test_busy_host_drops_frame(self):
+        @contextlib.asynccontextmanager
+        async def busy():
+            yield False
+
+        with mock.patch.object(scan_socket.admission, 'admitted', busy), \
+                mock.patch.object(scan_socket, '_submit') as submit:
+            self.assertIsNone(asyncio.run(scan_socket._recognize_admitted(b'jpeg', None)))
+        submit.assert_not_called()
+
+
+# =====================================================
+# Klip chegaralari
+# =====================================================
+
+class ClipLimitTests(AdmissionDirMixin, SimpleTestCase):
+    """Katta klip 413, ko'p kadr 400 - 500 emas"""
+
+    def post_images(self, count):
+        files = [SimpleUploadedFile(f'{i}.jpg', b'jpeg', content_type='image/jpeg') for i in range(count)]
+        return self.client.post('/api/face-detect-clip/', {'images': files})
+
+    def test_too_many_images(self):
+        with mock.patch.object(views, 'CLIP_MAX_IMAGES', 2):
+            response = self.post_images(3)
+        self.assertEqual(response.status_code, 400)
+
+    def test_images_over_byte_limit(self):
+        with mock.patch.object(views, 'CLIP_MAX_BYTES', 10):
+            response = self.post_images(3)
+        self.assertEqual(response.status_code, 413)
+
+    def test_clip_body_over_limit_is_not_read(self):
+        with mock.patch.object(views, 'CLIP_MAX_BYTES', 100), \
+                mock.patch.object(views, 'sharpest_video_frames') as decode:
+            response = self.client.post('/api/face-detect-clip/', data=b'x' * 200, content_type='video/webm')
+        self.assertEqual(response.status_code, 413)
+        decode.assert_not_called()
+
+    @override_settings(DATA_UPLOAD_MAX_MEMORY_SIZE=100)
+    def test_request_data_too_big_is_413(self):
+        response = self.client.post('/api/face-detect-clip/', data=b'x' * 200, content_type='video/webm')
+        self.assertEqual(response.status_code, 413)
+
+
+# =====================================================
+# Client yuz box'i
+# =====================================================
+
+class ClientFaceHintTests(SimpleTestCase):
+    """Asl rasm box'i ishchi kadrga, ROI natijasi kadr koordinatalariga o'tkaziladi"""
+
+    def setUp(self):
+        self.frame = np.zeros((480, 640, 3), dtype=np.uint8)
+        self.detector = mock.Mock()
+
+    def test_box_is_mapped_from_source_size(self):
+        # 1280x960 rasm 640x480 ga kichraytirib decode qilingan: box (100, 350, 300, 150),
+        # ROI (50, 400, 350, 100) yuz 100px bo'lishi uchun 0.5 barobar kichraytiriladi
+        self.detector.detect.return_value = [(25, 125, 125, 25)]
+        hint = {'box': [200, 700, 600, 300], 'source_size': [1280, 960]}
+
+        box = face_pipeline.confirm_client_face(self.frame, hint, detector=self.detector)
+
+        self.assertEqual(box, (100, 350, 300, 150))
+        roi, upsample = self.detector.detect.call_args[0]
+        self.assertEqual(roi.shape, (150, 150, 3))
+        self.assertEqual(upsample, 0)
+
+    def test_box_outside_frame_is_rejected_without_detection(self):
+        hint = {'box': [200, 1400, 600, 1000], 'source_size': [640, 480]}
+        self.assertIsNone(face_pipeline.confirm_client_face(self.frame, hint, detector=self.detector))
+        self.detector.detect.assert_not_called()
+
+    def test_unconfirmed_box_is_rejected(self):
+        self.detector.detect.return_value = []
+        hint = {'box': [100, 350, 300, 150], 'source_size': [640, 480]}
+        self.assertIsNone(face_pipeline.confirm_client_face(self.frame, hint, detector=self.detector))
+
+
+# =====================================================
+# Pipeline profillari
+# =====================================================
+
+class PipelineProfileTests(SimpleTestCase):
+    """Login probe'lari va galereya shablonlari bir xil landmark modeli bilan"""
+
+    def test_login_and_enroll_share_landmark_model(self):
+        login = face_pipeline.pipeline_profile(face_pipeline.LOGIN_PROFILE)
+        enroll = face_pipeline.pipeline_profile(face_pipeline.ENROLL_PROFILE)
+        self.assertEqual(login['landmark_model'], enroll['landmark_model'])
+        self.assertEqual(enroll['num_jitters'], 1)
+
+    @override_settings(FACE_PIPELINE_PROFILES={'fast-login': {'landmark_model': 'large', 'num_jitters': 2}})
+    def test_override_cannot_change_gallery_landmark_model(self):
+        profile = face_pipeline.pipeline_profile('fast-login')
+        self.assertEqual(profile['landmark_model'], face_pipeline.GALLERY_LANDMARK_MODEL)
+        self.assertEqual(profile['num_jitters'], 2)
+
+    @override_settings(FACE_PIPELINE_PROFILES={
+        'accurate-enroll': {'num_jitters': 3},
+        'audit': {'landmark_model': 'small', 'max_side': 800},
+    })
+    def test_overrides_from_settings(self):
+        self.assertEqual(
+            face_pipeline.encoding_options(face_pipeline.ENROLL_PROFILE),
+            {'model': face_pipeline.GALLERY_LANDMARK_MODEL, 'num_jitters': 3},
+        )
+        audit = face_pipeline.pipeline_profile('audit')
+        self.assertEqual((audit['landmark_model'], audit['max_side']), ('small', 800))
+        # Standart jadval o'zgarmaydi
+        self.assertEqual(face_pipeline.PIPELINE_PROFILES['audit']['landmark_model'], 'large')
+
+    @override_settings(FACE_PIPELINE_PROFILES={'fast-login': {'max_side': 480}})
+    def test_login_decodes_at_profile_size(self):
+        image = mock.Mock()
+        image.bgr.return_value = None
+        self.assertIsNone(views.recognize_image(image))
+        image.bgr.assert_called_once_with(480)
+
+    def test_unknown_profile(self):
+        with self.assertRaises(ValueError):
+            face_pipeline.pipeline_profile('turbo')
+
+
+# =====================================================
+# Detection zinapoyasi
+# =====================================================
+
+class DetectionLadderTests(SimpleTestCase):
+    """Arzon pog'onada yuz topilsa to'xtaydi, topilmasa keyingisiga o'tadi"""
+
+    def setUp(self):
+        self.frame = np.zeros((720, 1280, 3), dtype=np.uint8)
+        self.detector = mock.Mock()
+
+    def detect_calls(self):
+        return [(max(call[0][0].shape[:2]), call[0][1]) for call in self.detector.detect.call_args_list]
+
+    def test_hit_on_first_rung_stops(self):
+        self.detector.detect.return_value = [(10, 40, 50, 0)]
+        boxes, rung = face_pipeline.detect_faces_adaptive(self.frame, detector=self.detector)
+
+        self.assertEqual(rung, 0)
+        self.assertEqual(self.detect_calls(), [(640, 0)])
+        # 640px kadrdagi box asl (1280px) kadrga qaytariladi
+        self.assertEqual(boxes, [(20, 80, 100, 0)])
+
+    def test_miss_escalates_to_next_rung(self):
+        self.detector.detect.side_effect = [[], [(30, 60, 90, 0)]]
+        with mock.patch.object(face_pipeline.metrics, 'incr') as incr:
+            boxes, rung = face_pipeline.detect_faces_adaptive(self.frame, detector=self.detector)
+
+        self.assertEqual(rung, 1)
+        self.assertEqual(self.detect_calls(), [(640, 0), (960, 1)])
+        self.assertEqual(boxes, [(40, 80, 120, 0)])
+        incr.assert_any_call('detect.rung_1')
+        self.assertNotIn(mock.call('detect.rung_0'), incr.call_args_list)
+
+    def test_miss_on_every_rung(self):
+        self.detector.detect.return_value = []
+        with mock.patch.object(face_pipeline.metrics, 'incr') as incr:
+            self.assertEqual(face_pipeline.detect_faces_adaptive(self.frame, detector=self.detector), ([], None))
+        self.assertEqual(len(self.detect_calls()), len(face_pipeline.DETECTION_LADDER))
+        incr.assert_any_call('detect.miss')
+
+    @override_settings(FACE_DETECTION_LADDER=[(320, 0), (1280, 2)])
+    def test_ladder_from_settings(self):
+        self.detector.detect.return_value = []
+        face_pipeline.detect_faces_adaptive(self.frame, detector=self.detector)
+        self.assertEqual(self.detect_calls(), [(320, 0), (1280, 2)])
+
+
+# =====================================================
+# Yuz detektorlari
+# =====================================================
+
+class FakeDetector:
+    name = 'fake'
+    created = 0
+
+    def __init__(self):
+        FakeDetector.created += 1
+
+    def detect(self, rgb_frame, upsample=1):
+        return [(0, 10, 10, 0)]
+
+
+class MissingDetector:
+    name = 'missing'
+
+    def __init__(self):
+        raise detectors.DetectorUnavailable("missing o'rnatilmagan")
+
+
+class DetectorSelectionTests(SimpleTestCase):
+    """settings.FACE_DETECTOR backend'ni tanlaydi, ishlamasa HOG ishlatiladi"""
+
+    def setUp(self):
+        FakeDetector.created = 0
+        for patcher in (
+            mock.patch.dict(detectors.DETECTORS, {'fake': FakeDetector, 'missing': MissingDetector}),
+            mock.patch.dict(detectors._instances, clear=True),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    @override_settings(FACE_DETECTOR='fake')
+    def test_backend_from_settings_is_shared(self):
+        detector = detectors.get_detector()
+        self.assertIsInstance(detector, FakeDetector)
+        self.assertIs(detectors.get_detector(), detector)
+        self.assertEqual(FakeDetector.created, 1)
+
+        boxes, rung = face_pipeline.detect_faces_adaptive(np.zeros((48, 64, 3), dtype=np.uint8))
+        self.assertEqual((boxes, rung), ([(0, 10, 10, 0)], 0))
+
+    def test_unavailable_backend_falls_back_to_hog(self):
+        with mock.patch.dict(detectors.DETECTORS, {'hog': FakeDetector}):
+            detector = detectors.get_detector('missing')
+        self.assertIsInstance(detector, FakeDetector)
+        self.assertIs(detectors._instances[detectors.DEFAULT_DETECTOR], detector)
+
+    def test_unknown_backend(self):
+        with self.assertRaises(detectors.DetectorUnavailable):
+            detectors.create_detector('nope')
+
+    @override_settings(FACE_HAAR_CASCADE='/nonexistent/cascade.xml')
+    def test_haar_without_cascade_is_unavailable(self):
+        with self.assertRaises(detectors.DetectorUnavailable):
+            detectors.HaarDetector()
+
+    def test_boxes_are_clipped_to_frame(self):
+        self.assertEqual(detectors.xywh_to_box(-5, 10, 30, 50, (40, 20, 3)), (10, 20, 40, 0))
+
+
+# =====================================================
+# Kadr buferlari
+# =====================================================
+
+class BufferPoolTests(SimpleTestCase):
+    """Resize va rang o'tkazish barqaror holatda yangi massiv ajratmaydi"""
+
+    def test_working_rgb_reuses_thread_buffer(self):
+        frame = np.zeros((720, 1280, 3), dtype=np.uint8)
+        first = face_pipeline.working_rgb(frame, 640)
+        with mock.patch.object(buffer_pool.metrics, 'incr') as incr:
+            second = face_pipeline.working_rgb(frame, 640)
+
+        self.assertIs(first, second)
+        self.assertEqual(second.shape, (360, 640, 3))
+        incr.assert_not_called()
+
+    def test_scale_to_max_side(self):
+        frame = np.zeros((300, 400, 3), dtype=np.uint8)
+        same, scale = face_pipeline.scale_to_max_side(frame, 400)
+        self.assertIs(same, frame)
+        self.assertEqual(scale, 1.0)
+
+        small, scale = face_pipeline.scale_to_max_side(frame, 100)
+        self.assertEqual(small.shape, (75, 100, 3))
+        self.assertEqual(scale, 0.25)
+        pooled, _ = face_pipeline.scale_to_max_side(frame, 100, 'scale_test')
+        self.assertIs(face_pipeline.scale_to_max_side(frame, 100, 'scale_test')[0], pooled)
+
+    def test_working_rgb_converts_without_touching_source(self):
+        bgr = np.zeros((40, 60, 3), dtype=np.uint8)
+        bgr[..., 0] = 255  # ko'k
+        for max_side in (60, 30):
+            rgb = face_pipeline.working_rgb(bgr, max_side, f'rgb_test_{max_side}')
+            self.assertEqual(max(rgb.shape[:2]), max_side)
+            self.assertEqual(tuple(rgb[5, 5]), (0, 0, 255))
+        self.assertEqual(tuple(bgr[5, 5]), (255, 0, 0))
+
+    def test_decoded_frame_is_not_pooled(self):
+        image_bytes = jpeg_bytes((1280, 720))
+        first = face_pipeline.decode_image_bytes(image_bytes, 640)
+        second = face_pipeline.decode_image_bytes(image_bytes, 640)
+        self.assertFalse(np.shares_memory(first, second))
+
+
+# =====================================================
+# Face tracker
+# =====================================================
+
+class FaceTrackerTests(SimpleTestCase):
+    """ROI'da topilgan yuzlar butun kadr soni sifatida ko'rsatilmasin"""
+
+    def setUp(self):
+        self.frame = np.zeros((240, 320, 3), dtype=np.uint8)
+        self.tracker = face_tracking.FaceTracker()
+        self.tracker.last_box = (80, 180, 160, 100)
+        self.tracker.frame_shape = self.frame.shape
+
+    def test_roi_hit_is_not_full_frame(self):
+        detector = mock.Mock()
+        detector.detect.return_value = [(10, 70, 70, 10)]
+        with mock.patch.object(face_tracking, 'get_detector', return_value=detector), \
+                mock.patch.object(face_tracking, 'detect_faces_adaptive') as full_scan:
+            face_locations, full_frame = self.tracker.scan(self.frame)
+
+        self.assertFalse(full_frame)
+        self.assertEqual(len(face_locations), 1)
+        full_scan.assert_not_called()
+
+    def test_roi_miss_scans_full_frame(self):
+        detector = mock.Mock()
+        detector.detect.return_value = []
+        boxes = [(80, 180, 160, 100), (20, 300, 60, 260)]
+        with mock.patch.object(face_tracking, 'get_detector', return_value=detector), \
+                mock.patch.object(face_tracking, 'detect_faces_adaptive', return_value=(boxes, 0)):
+            face_locations, full_frame = self.tracker.scan(self.frame)
+
+        self.assertTrue(full_frame)
+        self.assertEqual(face_locations, boxes)
+
+    def test_faces_count_unknown_on_roi_hit(self):
+        detector = mock.Mock()
+        detector.detect.return_value = [(10, 70, 70, 10)]
+        with mock.patch.object(face_tracking, 'get_detector', return_value=detector), \
+                mock.patch.object(views, 'load_known_faces_cached', return_value=([np.zeros(128)], [None])), \
+                mock.patch('face_recognition.face_encodings', return_value=[]):
+            result = views.recognize_face_fast(self.frame[:, :, ::-1].copy(), tracker=self.tracker)
+
+        self.assertIsNone(result.faces_count)
+
+    def test_all_paths_pick_the_same_primary_face(self):
+        # Chetdagi katta yuz va markazdagi biroz kichikroq yuz - markazdagisi asosiy
+        corner, centred = (0, 90, 90, 0), (80, 200, 160, 120)
+        boxes = [corner, centred]
+        self.assertEqual(face_pipeline.primary_face_box(boxes, self.frame.shape), centred)
+
+        with mock.patch.object(face_pipeline, 'detect_faces_adaptive', return_value=(boxes, 0)), \
+                mock.patch.object(face_pipeline, 'encode_face_at') as encode_face_at:
+            self.assertEqual(face_pipeline.locate_primary_face(self.frame), (centred, 2))
+            face_pipeline.encode_primary_face(self.frame[:, :, ::-1].copy())
+        self.assertEqual(encode_face_at.call_args[0][1], centred)
+
+        self.tracker._remember(boxes, self.frame.shape)
+        self.assertEqual(self.tracker.last_box, centred)
+
+
+# =====================================================
+# So'rov rasmi
+# =====================================================
+
+class RequestImageTests(SimpleTestCase):
+    """Rasm bir marta decode qilinadi, kichikroq kadrlar shu kadrdan olinadi"""
+
+    def decode_spy(self):
+        patcher = mock.patch.object(
+            request_image, 'decode_image_bytes', wraps=face_pipeline.decode_image_bytes,
+        )
+        self.addCleanup(patcher.stop)
+        return patcher.start()
+
+    def test_data_url_is_decoded_lazily(self):
+        data_url = 'data:image/jpeg;base64,' + base64.b64encode(jpeg_bytes()).decode()
+        with mock.patch.object(request_image, 'decode_data_url', wraps=request_image.decode_data_url) as decode:
+            image = request_image.RequestImage.from_data_url(data_url)
+            decode.assert_not_called()
+            self.assertEqual(image.size, (64, 48))
+            self.assertEqual(image.data, jpeg_bytes())
+        decode.assert_called_once()
+
+    def test_smaller_frame_reuses_decoded_frame(self):
+        decode = self.decode_spy()
+        image = request_image.RequestImage(jpeg_bytes((1280, 720)))
+
+        large = image.bgr(1280)
+        small = image.bgr(640)
+
+        decode.assert_called_once()
+        self.assertEqual(large.shape, (720, 1280, 3))
+        self.assertEqual(small.shape, (360, 640, 3))
+        self.assertIs(image.bgr(640), small)
+
+    def test_rgb_does_not_keep_bgr_copy(self):
+        decode = self.decode_spy()
+        image = request_image.RequestImage(jpeg_bytes(color=(255, 0, 0)))
+
+        rgb = image.rgb()
+        self.assertEqual(tuple(rgb[24, 32]), tuple(image.rgb()[24, 32]))
+        self.assertGreater(rgb[24, 32, 0], 200)
+        self.assertNotIn(None, image._frames)
+        decode.assert_called_once()
+
+    def test_oversized_image_is_not_decoded(self):
+        decode = self.decode_spy()
+        image = request_image.RequestImage(jpeg_bytes())
+
+        with mock.patch.object(request_image, 'image_size_allowed', return_value=False):
+            self.assertIsNone(image.bgr())
+            self.assertIsNone(image.thumbnail())
+        decode.assert_not_called()
+
+    def test_size_is_read_from_header_only(self):
+        with mock.patch.object(face_pipeline.cv2, 'imdecode') as imdecode:
+            self.assertEqual(face_pipeline.probe_image_size(jpeg_bytes((1280, 720))), (1280, 720))
+        imdecode.assert_not_called()
+
+    def test_oversized_header_is_not_decoded(self):
+        with mock.patch.object(face_pipeline, 'MAX_IMAGE_SIDE', 1000), \
+                mock.patch.object(face_pipeline.cv2, 'imdecode') as imdecode:
+            self.assertIsNone(face_pipeline.decode_image_bytes(jpeg_bytes((1280, 720))))
+        imdecode.assert_not_called()
+
+    def test_jpeg_is_decoded_at_reduced_scale(self):
+        image_bytes = jpeg_bytes((1280, 720))
+        cases = (
+            (300, face_pipeline.cv2.IMREAD_REDUCED_COLOR_4, (169, 300, 3)),
+            (640, face_pipeline.cv2.IMREAD_REDUCED_COLOR_2, (360, 640, 3)),
+            (800, face_pipeline.cv2.IMREAD_COLOR, (450, 800, 3)),
+        )
+        for max_side, flag, shape in cases:
+            with self.subTest(max_side=max_side), \
+                    mock.patch.object(face_pipeline.cv2, 'imdecode', wraps=face_pipeline.cv2.imdecode) as imdecode:
+                frame = face_pipeline.decode_image_bytes(image_bytes, max_side)
+                self.assertEqual(imdecode.call_args[0][1], flag)
+                self.assertEqual(frame.shape, shape)
+
+    def test_undecodable_bytes(self):
+        image = request_image.RequestImage(b'not an image')
+        self.assertIsNone(image.size)
+        self.assertIsNone(image.bgr())
+        self.assertIsNone(image.thumbnail())
+
+
+# =====================================================
+# Kadr sifati filtri
+# =====================================================
+
+class QualityGateTests(AdmissionDirMixin, SimpleTestCase):
+    """Qorong'i, o'ta yorug', kontrastsiz va xira kadrlar HOG'gacha rad etiladi"""
+
+    def flat(self, value):
+        return np.full((60, 80), value, dtype=np.uint8)
+
+    def test_brightness_and_contrast_reasons(self):
+        self.assertEqual(face_pipeline.frame_quality_issue(self.flat(20)), 'too_dark')
+        self.assertEqual(face_pipeline.frame_quality_issue(self.flat(240)), 'too_bright')
+        self.assertEqual(face_pipeline.frame_quality_issue(self.flat(128)), 'low_contrast')
+
+    def test_smooth_gradient_is_blurry(self):
+        # Kontrast yetarli, lekin chegara (edge) yo'q - Laplacian dispersiyasi ~0
+        gradient = np.tile(np.linspace(0, 255, 80).astype(np.uint8), (60, 1))
+        self.assertEqual(face_pipeline.frame_quality_issue(gradient), 'blurry')
+
+    def test_textured_frame_passes(self):
+        texture = np.random.default_rng(7).integers(60, 200, (60, 80)).astype(np.uint8)
+        self.assertIsNone(face_pipeline.frame_quality_issue(texture))
+
+    def test_thresholds_from_settings(self):
+        with override_settings(FACE_QUALITY_THRESHOLDS={'min_brightness': 10, 'min_contrast': 0, 'min_sharpness': 0}):
+            self.assertIsNone(views.frame_quality_gate(self.flat(20)))
+        with override_settings(FACE_QUALITY_GATE=False):
+            self.assertIsNone(views.frame_quality_gate(self.flat(20)))
+        self.assertEqual(views.frame_quality_gate(self.flat(20)), 'too_dark')
+
+    def test_dark_frame_is_rejected_before_recognition(self):
+        with mock.patch.object(views, 'recognize_image') as recognize:
+            response = Client().post(
+                '/api/face-detect/', data=jpeg_bytes((320, 240), color=(5, 5, 5)), content_type='image/jpeg',
+            )
+
+        self.assertEqual(response.status_code, 200)
+        payload = json.loads(response.content)
+        self.assertEqual(payload['quality'], 'too_dark')
+        self.assertEqual(payload['quality_message'], face_pipeline.QUALITY_MESSAGES['too_dark'])
+        recognize.assert_not_called()
+
+
+# =====================================================
+# LoginLog writer
+# =====================================================
+
+class V1TablesTransactionTestCase(TransactionTestCase):
+    """TransactionTestCase V1 jadvallarini (managed = False) tozalamaydi - test o'zi tozalaydi"""
+
+    def tearDown(self):
+        LoginLog.objects.all().delete()
+        Person.objects.all().delete()
+        super().tearDown()
+
+
+class LoginLogWriterTests(TempDirsMixin, V1TablesTransactionTestCase):
+    """Bufer, qayta urinish, dead letter, spool replay va bufer chegarasi"""
+
+    def setUp(self):
+        super().setUp()
+        use_settings(self, FACE_LOGIN_LOG_ASYNC=True)
+        self.inspector = make_person('AE3141592', first_name='Dilshod', last_name='Karimov')
+        self.reset_writer()
+        self.addCleanup(self.reset_writer)
+        # Fon thread'i ishga tushmaydi - flush() testda qo'lda chaqiriladi
+        worker = mock.patch.object(login_log_writer, '_worker', mock.Mock(is_alive=lambda: True))
+        worker.start()
+        self.addCleanup(worker.stop)
+
+    @staticmethod
+    def reset_writer():
+        w = login_log_writer
+        with w._lock:
+            w._buffer.clear()
+            w._photos.clear()
+            w._segments.clear()
+            w._overflow_paths.clear()
+            for handle in (w._spool, w._overflow):
+                if handle is not None:
+                    handle.close()
+            w._spool = w._overflow = None
+
+    def spool_files(self):
+        # Faqat navbat segmentlari (.lock va dead-letter emas)
+        return sorted(
+            name for name in os.listdir(self.spool_root)
+            if name.endswith('.jsonl') and name != login_log_writer.DEAD_LETTER_FILE
+        )
+
+    def test_flush_writes_batch_and_photo(self):
+        logs = [make_login_log(self.inspector.id, photo=True), make_login_log(self.inspector.id)]
+        login_log_writer.record(logs[:1], b'jpeg-bytes')
+        login_log_writer.record(logs[1:])
+        self.assertEqual(len(self.spool_files()), 1)
+
+        self.assertTrue(login_log_writer.flush())
+        self.assertEqual(LoginLog.objects.count(), 2)
+        self.assertEqual(self.spool_files(), [])
+        with open(os.path.join(self.media_root, logs[0].login_photo), 'rb') as f:
+            self.assertEqual(f.read(), b'jpeg-bytes')
+
+    def test_failed_flush_keeps_rows_and_saves_photo_once(self):
+        log = make_login_log(self.inspector.id, photo=True)
+        login_log_writer.record([log], b'jpeg-bytes')
+
+        with mock.patch.object(LoginLog.objects, 'bulk_create', side_effect=OperationalError('db down')):
+            self.assertFalse(login_log_writer.flush())
+        self.assertEqual(login_log_writer._buffer, [log])
+        self.assertEqual(login_log_writer._photos, {})
+        self.assertEqual(len(self.spool_files()), 1)
+
+        with mock.patch('emotion_app.login_log_writer.default_storage.save') as save:
+            self.assertTrue(login_log_writer.flush())
+        save.assert_not_called()
+        self.assertEqual(LoginLog.objects.get(id=log.id).login_photo, log.login_photo)
+        self.assertEqual(os.listdir(os.path.dirname(os.path.join(self.media_root, log.login_photo))),
+                         [os.path.basename(log.login_photo)])
+
+    def test_rejected_row_goes_to_dead_letters(self):
+        good = make_login_log(self.inspector.id)
+        bad = make_login_log('missing-person')
+        login_log_writer.record([good, bad])
+
+        self.assertTrue(login_log_writer.flush())
+        self.assertTrue(LoginLog.objects.filter(id=good.id).exists())
+        self.assertFalse(LoginLog.objects.filter(id=bad.id).exists())
+        with open(os.path.join(self.spool_root, login_log_writer.DEAD_LETTER_FILE)) as f:
+            rows = [json.loads(line) for line in f]
+        self.assertEqual([row['id'] for row in rows], [bad.id])
+        self.assertIn('error', rows[0])
+
+    def write_foreign_spool(self, token):
+        log = make_login_log(self.inspector.id, photo=True)
+        with open(os.path.join(self.spool_root, f'{token}-0.jsonl'), 'w') as f:
+            f.write(json.dumps(login_log_writer._spool_row(log)) + '\n')
+        return log
+
+    def test_spool_is_named_by_process_token(self):
+        login_log_writer.record([make_login_log(self.inspector.id)])
+        token = login_log_writer._token
+        self.assertNotIn(str(os.getpid()), token)
+        self.assertEqual([name.split('-', 1)[0] for name in self.spool_files()], [token])
+
+    def test_orphan_spool_is_replayed(self):
+        # Egasi o'lgan: lock fayli band emas (yoki umuman yo'q)
+        log = self.write_foreign_spool('deadworker')
+
+        login_log_writer._claim_orphans()
+        self.assertTrue(login_log_writer.flush())
+
+        saved = LoginLog.objects.get(id=log.id)
+        # Rasm faqat o'lgan jarayon xotirasida edi
+        self.assertIsNone(saved.login_photo)
+        self.assertEqual(self.spool_files(), [])
+        self.assertFalse(os.path.exists(os.path.join(self.spool_root, 'deadworker.lock')))
+
+    def test_live_worker_spool_is_not_claimed(self):
+        self.write_foreign_spool('liveworker')
+        fd = os.open(os.path.join(self.spool_root, 'liveworker.lock'), os.O_RDWR | os.O_CREAT)
+        self.addCleanup(os.close, fd)
+        login_log_writer.fcntl.flock(fd, login_log_writer.fcntl.LOCK_EX)
+
+        login_log_writer._claim_orphans()
+        self.assertEqual(login_log_writer._buffer, [])
+        self.assertIn('liveworker-0.jsonl', self.spool_files())
+
+    def test_full_buffer_spills_to_spool(self):
+        logs = [make_login_log(self.inspector.id, photo=True) for _ in range(4)]
+        with mock.patch.object(login_log_writer, 'LOGIN_LOG_MAX_BUFFER', 2), \
+                mock.patch.object(login_log_writer, 'LOGIN_LOG_BATCH', 2):
+            for log in logs:
+                login_log_writer.record([log], b'jpeg-bytes')
+            self.assertEqual(len(login_log_writer._buffer), 2)
+            self.assertEqual(len(login_log_writer._photos), 2)
+
+            self.assertTrue(login_log_writer.flush())
+            login_log_writer._reload_overflow()
+            self.assertEqual(len(login_log_writer._buffer), 2)
+            self.assertTrue(login_log_writer.flush())
+
+        self.assertEqual(LoginLog.objects.count(), 4)
+        self.assertEqual(self.spool_files(), [])
+        # Spool'ga tushgan qatorlar rasmsiz yoziladi
+        self.assertEqual(LoginLog.objects.filter(login_photo__isnull=True).count(), 2)
+
+
+# =====================================================
+# Enrollment
+# =====================================================
+
+@mock.patch('emotion_app.enrollment.encode_photo', return_value=np.zeros(128))
+class EnrollmentTests(TempDirsMixin, TestCase):
+    """Rasm almashtirish: eski rasm faqat muvaffaqiyatli commit'dan keyin o'chiriladi"""
+
+    def setUp(self):
+        super().setUp()
+        os.makedirs(os.path.join(self.media_root, 'faces'))
+        self.old_photo = 'faces/old.jpg'
+        with open(os.path.join(self.media_root, self.old_photo), 'wb') as f:
+            f.write(jpeg_bytes())
+        self.person = make_person(photo=self.old_photo)
+
+    def photos(self):
+        return sorted(os.listdir(os.path.join(self.media_root, 'faces')))
+
+    def test_replaces_photo_after_commit(self, encode_photo):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            encoding = enrollment.enroll_person(self.person, jpeg_bytes())
+            self.assertEqual(len(self.photos()), 2)
+        for callback in callbacks:
+            callback()
+
+        self.assertEqual(len(encoding), 128)
+        self.person.refresh_from_db()
+        self.assertNotEqual(self.person.photo, self.old_photo)
+        self.assertEqual(self.photos(), [os.path.basename(self.person.photo)])
+        self.assertEqual(len(self.person.face_encoding), 128)
+
+    def test_failed_save_keeps_old_photo(self, encode_photo):
+        with mock.patch.object(Person, 'save', side_effect=IntegrityError('duplicate')):
+            with self.assertRaises(IntegrityError):
+                enrollment.enroll_person(self.person, jpeg_bytes())
+        self.assertEqual(self.photos(), ['old.jpg'])
+
+    def test_deferred_save_rolled_back_keeps_old_photo(self, encode_photo):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                old_photo = self.person.photo
+                enrollment.enroll_person(self.person, jpeg_bytes(), save=False)
+                self.assertEqual(len(self.photos()), 2)
+                enrollment.save_with_photo(self.person, old_photo)
+                raise RuntimeError('rollback')
+
+        self.assertEqual(callbacks, [])
+        self.assertIn('old.jpg', self.photos())
+        self.assertEqual(Person.objects.get(id=self.person.id).photo, self.old_photo)
+
+    def test_invalid_image_raises_value_error(self, encode_photo):
+        with self.assertRaises(ValueError):
+            enrollment.enroll_person(self.person, b'not an image')
+        self.assertEqual(self.photos(), ['old.jpg'])
+
+    def test_reuses_decoded_request_frame(self, encode_photo):
+        image = request_image.RequestImage(jpeg_bytes((1280, 720)))
+        frame = image.rgb(enrollment.ENROLL_PHOTO_MAX_SIDE)
+
+        with mock.patch.object(request_image, 'decode_image_bytes') as decode:
+            enrollment.enroll_person(self.person, image)
+
+        decode.assert_not_called()
+        self.assertIs(encode_photo.call_args[0][0], frame)
+
+    def test_upload_login_photo_passes_request_image(self, encode_photo):
+        with mock.patch.object(views, 'enroll_person', return_value=None) as enroll, \
+                mock.patch.object(views, 'create_login_log'):
+            response = self.client.post(
+                f'/api/upload-login-photo/?person_id={self.person.id}', data=jpeg_bytes(), content_type='image/jpeg',
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertIsInstance(enroll.call_args[0][1], request_image.RequestImage)
+
+
+@mock.patch('emotion_app.signals.request_gallery_reload')
+class GalleryReloadSignalTests(TempDirsMixin, TestCase):
+    """Person encoding'i o'zgarganda (va faqat shunda) daemon'ga reload"""
+
+    def setUp(self):
+        super().setUp()
+        self.person = make_person()
+
+    def test_encoding_change_sends_reload(self, reload):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.person.face_encoding = [0.0] * 128
+            self.person.save(update_fields=['photo', 'face_encoding'])
+        reload.assert_called_once_with()
+
+    def test_unrelated_update_does_not_reload(self, reload):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.person.first_name = 'Vali'
+            self.person.save(update_fields=['first_name'])
+        reload.assert_not_called()
+
+    def test_delete_sends_reload(self, reload):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.person.delete()
+        reload.assert_called_once_with()
+
+
+# =====================================================
+# Login profillari
+# =====================================================
+
+class LoginProfileTests(TempDirsMixin, TestCase):
+    """Profil cache'i boshqa worker'lardagi o'zgarishni ko'radi, Person nusxasi o'zgartiriladi"""
+
+    PASSPORT = 'AD2423695'
+
+    def setUp(self):
+        super().setUp()
+        use_settings(self, FACE_LOGIN_PROFILE_VERSIONS=os.path.join(self.spool_root, 'versions'))
+        self.reset_profiles()
+        self.addCleanup(self.reset_profiles)
+        self.person = make_person(self.PASSPORT, first_name='Nodira', last_name='Yusupova')
+
+    @staticmethod
+    def reset_profiles():
+        login_profiles.clear()
+        if login_profiles._versions is not None:
+            login_profiles._versions.close()
+        login_profiles._versions = None
+
+    def bump_from_other_worker(self, passport):
+        """Boshqa jarayon kabi: versiya faylini alohida mmap bilan o'zgartirish"""
+        with open(login_profiles.versions_path(), 'r+b') as f:
+            versions = mmap.mmap(f.fileno(), 0)
+            offset = login_profiles._bucket_offset(passport)
+            (version,) = login_profiles._VERSION.unpack_from(versions, offset)
+            login_profiles._VERSION.pack_into(versions, offset, version + 1)
+            versions.close()
+
+    def test_profile_is_cached(self):
+        profile = login_profiles.get_profile(self.PASSPORT)
+        self.assertIs(login_profiles.get_profile(self.PASSPORT), profile)
+
+    def test_other_worker_invalidation_reloads_profile(self):
+        profile = login_profiles.get_profile(self.PASSPORT)
+        Person.objects.filter(id=self.person.id).update(first_name='Vali')
+        self.bump_from_other_worker(self.PASSPORT)
+
+        reloaded = login_profiles.get_profile(self.PASSPORT)
+        self.assertIsNot(reloaded, profile)
+        self.assertEqual(reloaded.person.first_name, 'Vali')
+
+    def test_passport_change_invalidates_old_key(self):
+        person = Person.objects.get(id=self.person.id)
+        self.assertIsNotNone(login_profiles.get_profile(self.PASSPORT))
+        with self.captureOnCommitCallbacks(execute=True):
+            person.passport = 'AB7654321'
+            person.save()
+        self.assertIsNone(login_profiles.get_profile(self.PASSPORT))
+        self.assertEqual(login_profiles.get_profile('AB7654321').person_id, self.person.id)
+
+    def test_face_login_enrolls_a_copy_of_cached_person(self):
+        profile = login_profiles.get_profile(self.PASSPORT)
+        image = 'data:image/jpeg;base64,' + base64.b64encode(jpeg_bytes()).decode()
+
+        with mock.patch('emotion_app.views.enroll_person', return_value=None) as enroll:
+            response = self.client.post(
+                '/api/face-login/', data=json.dumps({'username': self.PASSPORT, 'image': image}),
+                content_type='application/json',
+            )
+        self.assertEqual(response.status_code, 200)
+        enrolled = enroll.call_args[0][0]
+        self.assertEqual(enrolled.id, profile.person.id)
+        self.assertIsNot(enrolled, profile.person)
+
+
+# =====================================================
+# Passport login
+# =====================================================
+
+class PassportLoginTests(TempDirsMixin, TestCase):
+    """Passport bo'yicha login face login bilan bir xil admin User'ni oladi"""
+
+    def setUp(self):
+        super().setUp()
+        self.person = make_person('AF7700112', first_name='Sardor', last_name='Rahimov')
+
+    def post_passport(self):
+        return self.client.post(
+            '/api/passport-login/', data=json.dumps({'username': 'af7700112'}), content_type='application/json',
+        )
+
+    def test_creates_admin_user_and_logs_in(self):
+        response = self.post_passport()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['user']['username'], 'AF7700112')
+        user = views.User.objects.get(username='AF7700112')
+        self.assertTrue(user.is_staff and user.is_superuser and user.is_active)
+        self.assertEqual(self.client.session['_auth_user_id'], str(user.id))
+
+    def test_existing_user_is_restored_to_admin(self):
+        views.User.objects.create(username='AF7700112', is_staff=False, is_active=False)
+        with mock.patch.object(views, 'get_or_create_login_user', wraps=views.get_or_create_login_user) as get_user:
+            self.assertEqual(self.post_passport().status_code, 200)
+
+        get_user.assert_called_once()
+        user = views.User.objects.get(username='AF7700112')
+        self.assertTrue(user.is_staff and user.is_superuser and user.is_active)
+
+
+# =====================================================
+# User sinxronizatsiyasi
+# =====================================================
+
+class UserSyncTests(TempDirsMixin, TestCase):
+    """Parol faqat kerak bo'lganda hash qilinadi, navbatda bir Person bitta yozuv"""
+
+    PASSPORT = 'AC5550011'
+
+    def setUp(self):
+        super().setUp()
+        from django.contrib.auth.models import User
+
+        self.User = User
+        set_password = User.set_password
+        self.hashes = []
+
+        def counting_set_password(user, raw_password):
+            self.hashes.append(raw_password)
+            return set_password(user, raw_password)
+
+        patch = mock.patch.object(User, 'set_password', counting_set_password)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def create_person(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            person = make_person(self.PASSPORT, birth_date=datetime.date(1990, 5, 17))
+        return Person.objects.get(id=person.id)
+
+    def test_new_person_creates_user_with_one_hash(self):
+        self.create_person()
+        user = self.User.objects.get(username=self.PASSPORT)
+        self.assertEqual(self.hashes, ['17051990'])
+        self.assertTrue(user.check_password('17051990'))
+        self.assertTrue(user.is_superuser)
+
+    def test_name_change_does_not_rehash(self):
+        person = self.create_person()
+        with self.captureOnCommitCallbacks(execute=True):
+            person.first_name = 'Vali'
+            person.save()
+        self.assertEqual(len(self.hashes), 1)
+        self.assertEqual(self.User.objects.get(username=self.PASSPORT).first_name, 'Vali')
+
+    def test_photo_only_save_does_not_sync(self):
+        person = self.create_person()
+        with mock.patch.object(user_sync, 'schedule') as schedule, self.captureOnCommitCallbacks(execute=True):
+            person.photo = 'faces/new.jpg'
+            person.save(update_fields=['photo'])
+        schedule.assert_not_called()
+
+    def test_birth_date_change_rehashes(self):
+        person = self.create_person()
+        with self.captureOnCommitCallbacks(execute=True):
+            person.birth_date = datetime.date(1991, 1, 2)
+            person.save()
+        self.assertEqual(self.hashes, ['17051990', '02011991'])
+        self.assertTrue(self.User.objects.get(username=self.PASSPORT).check_password('02011991'))
+
+    @override_settings(FACE_USER_SYNC_ASYNC=True)
+    def test_queue_merges_requests_per_person(self):
+        worker = mock.patch.object(user_sync, '_worker', mock.Mock(is_alive=lambda: True))
+        worker.start()
+        self.addCleanup(worker.stop)
+        self.addCleanup(user_sync._pending.clear)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            user_sync.schedule('person-1', rehash=False)
+            user_sync.schedule('person-1', rehash=True)
+            user_sync.schedule('person-1', rehash=False)
+            user_sync.schedule('person-2', rehash=False)
+
+        self.assertEqual(user_sync._pending, {'person-1': True, 'person-2': False})
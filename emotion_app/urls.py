@@ -5,6 +5,10 @@ from .views import (
     face_login,
     dashboard,
     detect_face,
+    detect_face_batch,
+    detect_face_clip,
+    roll_call,
+    capture_profile,
     face_login_auth,
     passport_login_auth,
     person_crud_api,
@@ -14,9 +18,11 @@ from .views import (
     upload_excel,
     upload_excel_page,
     get_statistics,
+    face_metrics,
     get_person_statistics,
     get_login_logs
 )
+from .async_views import detect_face_async, face_login_auth_async
 
 urlpatterns = [
     # === SAHIFALAR ===
@@ -26,10 +32,18 @@ urlpatterns = [
 
     # === LOGIN API ===
     path('api/face-detect/', detect_face, name='face-detect'),
+    path('api/face-detect-batch/', detect_face_batch, name='face-detect-batch'),
+    path('api/face-detect-clip/', detect_face_clip, name='face-detect-clip'),
+    path('api/capture-profile/', capture_profile, name='capture-profile'),
+    path('api/roll-call/', roll_call, name='roll-call'),
     path('api/face-login/', face_login_auth, name='face-login-auth'),
     path('api/passport-login/', passport_login_auth, name='passport-login-auth'),
     path('api/upload-login-photo/', upload_login_photo, name='upload-login-photo'),
 
+    # === ASYNC LOGIN API (ASGI: core.asgi:application) ===
+    path('api/async/face-detect/', detect_face_async, name='face-detect-async'),
+    path('api/async/face-login/', face_login_auth_async, name='face-login-auth-async'),
+
     # === USER API ===
     path('api/current-user/', get_current_user, name='current-user'),
     path('api/logout/', logout_view, name='logout'),
@@ -39,6 +53,7 @@ urlpatterns = [
 
     # === STATISTICS API ===
     path('api/statistics/', get_statistics, name='statistics'),
+    path('api/face-metrics/', face_metrics, name='face-metrics'),
     path('api/statistics/<int:person_id>/', get_person_statistics, name='person-statistics'),
 
     # === LOGIN LOGS API ===
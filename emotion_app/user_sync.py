@@ -0,0 +1,153 @@
+"""
+emotion_app/user_sync.py
+Person → Django User sinxronizatsiyasi (fon thread'ida, takrorlanmasdan)
+
+Har bir Person uchun Django User bor: username = passport, parol = tug'ilgan
+sana (DDMMYYYY). set_password to'liq PBKDF2 hash - shuning uchun u faqat
+parol o'zgarganda (yangi Person, passport yoki birth_date o'zgargan)
+chaqiriladi. Sinxronizatsiya Person.save() ichida emas, fon thread'ida
+bajariladi; bir Person uchun bir nechta so'rov navbatda bittaga birlashadi.
+
+FACE_USER_SYNC_ASYNC = False bo'lsa sinxronizatsiya darhol (shu thread'da)
+bajariladi.
+"""
+import atexit
+import threading
+from datetime import date
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from . import metrics
+
+
+# Parolni hisoblash uchun kerakli Person maydonlari
+PASSWORD_FIELDS = ('passport', 'birth_date')
+
+# User'ga ta'sir qiladigan barcha Person maydonlari
+IDENTITY_FIELDS = ('passport', 'first_name', 'last_name', 'birth_date')
+
+DEFAULT_PASSWORD = 'password123'
+
+_pending = {}  # person_id → rehash kerakmi
+_pending_lock = threading.Lock()
+_wakeup = threading.Condition(_pending_lock)
+_busy = False
+_worker = None
+
+
+def login_password(birth_date):
+    """Tug'ilgan sanadan parol (DDMMYYYY), sana bo'lmasa default parol"""
+    if isinstance(birth_date, date):
+        return birth_date.strftime('%d%m%Y')
+    return DEFAULT_PASSWORD
+
+
+def identity(person):
+    """Person'ning User'ga ta'sir qiladigan maydonlari (snapshot uchun)"""
+    return tuple(getattr(person, field) for field in IDENTITY_FIELDS)
+
+
+def schedule(person_id, rehash):
+    """
+    Person User'ini sinxronlash navbatiga qo'yish. Tranzaksiya commit
+    bo'lgandan keyin bajariladi - fon thread'i yangi qiymatlarni o'qiydi.
+    """
+    if not getattr(settings, 'FACE_USER_SYNC_ASYNC', True):
+        transaction.on_commit(lambda: sync_user(person_id, rehash))
+        return
+    transaction.on_commit(lambda: _enqueue(person_id, rehash))
+
+
+def _enqueue(person_id, rehash):
+    global _worker
+    with _pending_lock:
+        if person_id in _pending:
+            metrics.incr('user_sync.merged')
+        _pending[person_id] = _pending.get(person_id, False) or rehash
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_worker_loop, name='user-sync', daemon=True)
+            _worker.start()
+        _wakeup.notify()
+
+
+def _worker_loop():
+    global _busy
+    while True:
+        with _pending_lock:
+            while not _pending:
+                _wakeup.wait()
+            person_id, rehash = _pending.popitem()
+            _busy = True
+
+        try:
+            sync_user(person_id, rehash)
+        finally:
+            close_old_connections()
+            with _pending_lock:
+                _busy = False
+                _wakeup.notify_all()
+
+
+def flush(timeout=None):
+    """Navbatdagi barcha sinxronizatsiyalar tugashini kutish (True - navbat bo'sh)"""
+    with _pending_lock:
+        if _worker is None or not _worker.is_alive():
+            return not _pending
+        return _wakeup.wait_for(lambda: not _pending and not _busy, timeout)
+
+
+# Management command'lar tugaganda navbat yo'qolmasin
+atexit.register(flush, 30)
+
+
+def sync_user(person_id, rehash=False):
+    """
+    Person uchun Django User yaratish/yangilash.
+    Parol faqat yangi User yoki rehash=True bo'lganda hash qilinadi.
+    """
+    from django.contrib.auth.models import User
+
+    from .models import Person
+
+    try:
+        person = Person.objects.filter(id=person_id).only('id', *IDENTITY_FIELDS).first()
+        if person is None:
+            return
+
+        username = person.passport if person.passport else f"person_{person.id}"
+        user, created = User.objects.get_or_create(
+            username=username,
+            defaults={
+                'first_name': person.first_name,
+                'last_name': person.last_name,
+                'is_staff': True,
+                'is_superuser': True,
+                'is_active': True,
+            }
+        )
+
+        update_fields = []
+        if created or rehash or not user.has_usable_password():
+            user.set_password(login_password(person.birth_date))
+            update_fields.append('password')
+            metrics.incr('user_sync.rehash')
+
+        for field, value in (
+            ('first_name', person.first_name),
+            ('last_name', person.last_name),
+            ('is_staff', True),
+            ('is_superuser', True),
+            ('is_active', True),
+        ):
+            if getattr(user, field) != value:
+                setattr(user, field, value)
+                update_fields.append(field)
+
+        if update_fields:
+            user.save(update_fields=update_fields)
+        metrics.incr('user_sync.done')
+
+    except Exception as e:
+        # Xatolik bo'lsa ham Person saqlangan bo'ladi
+        print(f"Django User yaratishda xatolik (Inspector {person_id}): {e}")
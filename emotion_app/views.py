@@ -2,23 +2,60 @@
 emotion_app/views.py
 Login System - Yuz tanish orqali login
 """
+from django.conf import settings
+from django.core.exceptions import RequestDataTooBig, TooManyFilesSent
 from django.shortcuts import render
 from django.views.decorators.csrf import csrf_exempt
 from django.core.cache import cache
-from django.contrib.auth import logout
-from django.core.files.base import ContentFile
+from django.contrib.auth import login, logout
+from django.contrib.auth.models import User
 from .models import LoginLog, Person
+from .face_pipeline import (
+    CLIP_MAX_FRAMES,
+    ENROLL_PROFILE,
+    LOGIN_PROFILE,
+    MAX_BATCH_FRAMES,
+    MAX_FRAME_SIDE,
+    QUALITY_MESSAGES,
+    WORKING_MAX_SIDE,
+    best_face_candidates,
+    box_area,
+    client_face_hint,
+    confirm_client_face,
+    detect_faces_adaptive,
+    encode_faces_batched,
+    encode_primary_face,
+    encoding_options,
+    face_encodings_from_file,
+    frame_quality_issue,
+    is_mjpeg,
+    pipeline_profile,
+    primary_face_box,
+    sample_evenly,
+    sharpest_mjpeg_frames,
+    sharpest_video_frames,
+    split_mjpeg,
+    working_rgb,
+)
+from .admission import admission_controlled, host_load, host_usage
+from . import frame_dedupe, login_log_writer, login_profiles, metrics, scan_socket, user_sync
+from .enrollment import enroll_person, photo_path, remove_photo, save_with_photo
+from .request_image import RequestImage, decode_data_url
+from .face_tracking import tracker_for_client
+from .inference_client import InferenceUnavailable, inference_enabled, remote_encode, remote_recognize
 from django.http import JsonResponse
 
-import cv2
 import numpy as np
-import base64
-import face_recognition
 from datetime import timedelta, datetime
+from django.db import transaction
 from django.db.models import Count
 from django.utils import timezone
+import copy
+import functools
 import json
 import os
+import re
+import uuid
 
 
 # =====================================================
@@ -28,9 +65,10 @@ import os
 class PersonRecognitionResult:
     """Yuzni tanish natijasini saqlash uchun klass"""
 
-    def __init__(self, person=None, confidence=0.0):
+    def __init__(self, person=None, confidence=0.0, faces_count=None):
         self.person = person
         self.confidence = confidence
+        self.faces_count = faces_count  # kadrda ko'rilgan yuzlar soni (None - noma'lum)
 
     @property
     def is_registered(self) -> bool:
@@ -41,20 +79,86 @@ class PersonRecognitionResult:
 # Helper Functions
 # =====================================================
 
-def create_login_log(person, login_method, request, image_data=None, confidence=None):
+def staff_required(view):
+    """
+    Faqat tizimga kirgan staff foydalanuvchi uchun (401 / 403 JSON). Admission
+    slot'idan oldin tekshiriladi - begona so'rovlar slot egallamaydi.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({'success': False, 'error': 'Not authenticated'}, status=401)
+        if not request.user.is_staff:
+            return JsonResponse({'success': False, 'error': 'Permission denied'}, status=403)
+        return view(request, *args, **kwargs)
+
+    return wrapper
+
+
+def uploaded_file_bytes(upload):
+    """
+    Multipart fayl baytlari. Xotiradagi fayl uchun nusxasiz memoryview,
+    diskdagi (katta) fayl uchun oddiy read().
+    """
+    getbuffer = getattr(upload.file, 'getbuffer', None)
+    if getbuffer is not None:
+        return getbuffer()
+    return upload.read()
+
+
+def read_request_image(request, field='image'):
+    """
+    So'rovdan maydonlar va rasm baytlarini olish.
+
+    Qo'llab-quvvatlanadigan rejimlar:
+    - image/jpeg (image/*, application/octet-stream): body - rasmning o'zi,
+      qolgan maydonlar query string'da (?username=AD2423695)
+    - multipart/form-data: rasm - `field` nomli fayl, maydonlar - form field'lar
+    - application/json (eski rejim): {"image": "data:image/jpeg;base64,..."}
+
+    Returns:
+        (fields dict, RequestImage yoki None) - rasm bir marta decode qilinadi
+        va barcha bosqichlar (tanish, encoding, enrollment, log) shu obyektdan oladi
+    """
+    content_type = (request.content_type or '').lower()
+
+    if content_type.startswith('image/') or content_type == 'application/octet-stream':
+        return request.GET.dict(), (RequestImage(request.body) if request.body else None)
+
+    if content_type.startswith('multipart/form-data'):
+        upload = request.FILES.get(field)
+        return request.POST.dict(), (RequestImage(uploaded_file_bytes(upload)) if upload else None)
+
+    data = json.loads(request.body) if request.body else {}
+    image_data = data.get(field)
+    return data, (RequestImage.from_data_url(image_data) if image_data else None)
+
+
+def request_face_hint(fields, image):
+    """
+    Client aniqlagan yuz (ixtiyoriy): face_box=top,right,bottom,left (asl rasm
+    koordinatalarida) yoki face_crop=1 - rasmning o'zi kesilgan yuz.
+    Noto'g'ri face_box uchun ValueError.
+    """
+    cropped = str(fields.get('face_crop', '')).lower() in ('1', 'true', 'yes')
+    source_size = image.size if image is not None and fields.get('face_box') else None
+    return client_face_hint(fields.get('face_box'), cropped, source_size=source_size)
+
+
+def create_login_log(person, login_method, request, image_data=None, confidence=None, image_bytes=None):
     """
     Login log yaratish va rasm saqlash
+
+    Rasm tayyor baytlar (image_bytes) yoki base64 data URL (image_data) ko'rinishida beriladi.
+    Qator va rasm login_log_writer orqali fon thread'ida yoziladi - javob kutmaydi.
     """
     try:
         # IP addressni olish
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip_address = x_forwarded_for.split(',')[0]
-        else:
-            ip_address = request.META.get('REMOTE_ADDR')
+        ip_address = frame_dedupe.client_ip(request)
 
         # LoginLog yaratish (V1 login_logs jadvaliga)
         login_log = LoginLog(
+            id=str(uuid.uuid4()),
             inspector=person,  # V1 da inspector field
             login_method=login_method.upper(),  # V1 da FACE/PASSPORT (uppercase)
             ip_address=ip_address or '0.0.0.0',
@@ -62,29 +166,17 @@ def create_login_log(person, login_method, request, image_data=None, confidence=
             success=True
         )
 
-        # Agar rasm bo'lsa, saqlash
-        if image_data:
+        # Agar rasm bo'lsa, yozuv bilan birga saqlanadi
+        if image_bytes is None and image_data:
             try:
-                # Base64'dan rasmni decode qilish
-                if "base64," in image_data:
-                    image_data = image_data.split("base64,")[1]
-
-                image_bytes = base64.b64decode(image_data)
-
-                # Fayl nomi yaratish
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                filename = f"{person.id}_{timestamp}.jpg"
-
-                # Rasmni saqlash
-                login_log.login_photo.save(
-                    filename,
-                    ContentFile(image_bytes),
-                    save=False
-                )
+                # Base64'dan rasmni decode qilish (eski rejim)
+                image_bytes = decode_data_url(image_data)
             except Exception as e:
                 print(f"Rasm saqlashda xatolik: {e}")
+        if image_bytes:
+            login_log.login_photo = login_log_writer.photo_name(person.id, login_log.id)
 
-        login_log.save()
+        login_log_writer.record([login_log], image_bytes or None)
         return login_log
 
     except Exception as e:
@@ -119,8 +211,7 @@ def load_known_faces_cached():
                 continue
 
             if person.photo:
-                image = face_recognition.load_image_file(person.photo.path)
-                encodings = face_recognition.face_encodings(image)
+                encodings = face_encodings_from_file(photo_path(person), ENROLL_PROFILE)
 
                 if encodings:
                     encoding_vec = encodings[0]
@@ -141,12 +232,17 @@ def load_known_faces_cached():
     return known_encodings, known_persons
 
 
-def recognize_face_fast(frame):
+def recognize_face_fast(frame, tracker=None, hint=None):
     """
     Yuzni tanish (optimized)
+
+    Faqat asosiy yuz (katta va markazga yaqin) uchun bitta descriptor hisoblanadi;
+    orqadagi yuzlar faqat sanaladi (faces_count - crowding ogohlantirishi uchun;
+    butun kadr skanerlanmagan bo'lsa None).
+    tracker (FaceTracker) berilsa yuz avval oldingi kadrdagi joyi atrofida qidiriladi.
+    hint (client yuborgan box) tasdiqlansa butun kadr detection'i umuman bajarilmaydi.
     """
-    small_frame = None
-    rgb_frame = None
+    import face_recognition
 
     try:
         known_encodings, known_persons = load_known_faces_cached()
@@ -154,62 +250,265 @@ def recognize_face_fast(frame):
         if not known_encodings:
             return PersonRecognitionResult()
 
-        small_frame = cv2.resize(frame, (0, 0), fx=0.75, fy=0.75)
-        rgb_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
+        # Ishchi o'lchamdan katta bo'lsa kichraytirish (profil bo'yicha yuborilgan kadr o'zgarmaydi).
+        # Natija thread buferida - decode qilingan kadrdan tashqari yangi massiv ajratilmaydi
+        rgb_frame = working_rgb(frame, pipeline_profile(LOGIN_PROFILE)['max_side'])
 
-        face_locations = face_recognition.face_locations(
-            rgb_frame,
-            model="hog",
-            number_of_times_to_upsample=1
-        )
+        client_box = confirm_client_face(rgb_frame, hint) if hint else None
+        if client_box is not None:
+            face_locations, full_frame = [client_box], False
+        elif tracker is not None:
+            face_locations, full_frame = tracker.scan(rgb_frame, upsample=1)
+        else:
+            # Arzon pog'onadan boshlab (upsample 0), yuz topilmasagina kattalashtirish
+            face_locations, _ = detect_faces_adaptive(rgb_frame)
+            full_frame = True
 
+        # Client box'i yoki tracker ROI'si bilan kadrdagi boshqa yuzlar ko'rilmaydi (None - noma'lum,
+        # crowding ogohlantirishi berilmaydi) - faqat butun kadr skanerlanganda sanaladi
+        faces_count = len(face_locations) if full_frame else None
         if not face_locations:
-            return PersonRecognitionResult()
+            return PersonRecognitionResult(faces_count=0)
 
-        face_encodings = face_recognition.face_encodings(rgb_frame, face_locations)
+        primary_box = primary_face_box(face_locations, rgb_frame.shape)
+        face_encodings = face_recognition.face_encodings(rgb_frame, [primary_box], **encoding_options(LOGIN_PROFILE))
 
         if not face_encodings:
-            return PersonRecognitionResult()
-
-        face_encoding = face_encodings[0]
+            return PersonRecognitionResult(faces_count=faces_count)
 
-        matches = face_recognition.compare_faces(
-            known_encodings, face_encoding, tolerance=0.5
-        )
-        face_distances = face_recognition.face_distance(known_encodings, face_encoding)
+        result = match_known_faces(face_encodings)
+        result.faces_count = faces_count
+        return result
 
-        if not any(matches):
-            return PersonRecognitionResult()
+    except Exception as e:
+        print(f"Face recognition error: {str(e)}")
+        return PersonRecognitionResult()
 
-        best_match_idx = int(np.argmin(face_distances))
 
-        if matches[best_match_idx]:
-            distance = float(face_distances[best_match_idx])
-            confidence = (1.0 - distance) * 100.0
+def match_known_faces(face_encodings):
+    """
+    Bir yoki bir nechta probe encoding'ni galereya bilan bitta matritsa amalida solishtirish.
+    Bir nechta probe bo'lsa, har bir shaxs uchun o'rtacha masofa olinadi.
+    """
+    known_encodings, known_persons = load_known_faces_cached()
 
-            if confidence < 51.0:
-                return PersonRecognitionResult()
+    if not known_encodings or not face_encodings:
+        return PersonRecognitionResult()
 
-            person = known_persons[best_match_idx]
+    gallery = np.asarray(known_encodings, dtype=np.float64)   # (N, 128)
+    probes = np.asarray(face_encodings, dtype=np.float64)     # (K, 128)
 
-            result = PersonRecognitionResult(
-                person=person,
-                confidence=confidence,
-            )
+    # (K, N) masofalar matritsasi
+    distances = np.linalg.norm(probes[:, None, :] - gallery[None, :, :], axis=2)
+    mean_distances = distances.mean(axis=0)
 
-            del face_encodings, face_encoding, matches, face_distances
-            return result
+    best_match_idx = int(np.argmin(mean_distances))
+    distance = float(mean_distances[best_match_idx])
 
+    if distance > 0.5:
         return PersonRecognitionResult()
 
-    except Exception as e:
-        print(f"Face recognition error: {str(e)}")
+    confidence = (1.0 - distance) * 100.0
+    if confidence < 51.0:
         return PersonRecognitionResult()
-    finally:
-        if small_frame is not None:
-            del small_frame
-        if rgb_frame is not None:
-            del rgb_frame
+
+    return PersonRecognitionResult(
+        person=known_persons[best_match_idx],
+        confidence=confidence,
+    )
+
+
+def assign_known_faces(face_encodings):
+    """
+    Kadrdagi barcha yuzlarni galereya bilan bitta (F, N) matritsa amalida
+    solishtirish va birga-bir biriktirish: eng yaqin juftliklardan boshlab,
+    har bir yuz va har bir shaxs ko'pi bilan bir marta (greedy).
+
+    Returns:
+        [(yuz indeksi, PersonRecognitionResult), ...] - faqat tanilgan yuzlar
+    """
+    known_encodings, known_persons = load_known_faces_cached()
+
+    if not known_encodings or not len(face_encodings):
+        return []
+
+    gallery = np.asarray(known_encodings, dtype=np.float64)   # (N, 128)
+    probes = np.asarray(face_encodings, dtype=np.float64)     # (F, 128)
+
+    # (F, N) masofalar matritsasi
+    distances = np.linalg.norm(probes[:, None, :] - gallery[None, :, :], axis=2)
+
+    # Chegaradan o'tgan juftliklar masofa bo'yicha o'sish tartibida
+    face_idx, person_idx = np.nonzero(distances <= 0.5)
+    order = np.argsort(distances[face_idx, person_idx], kind='stable')
+
+    assigned_faces = set()
+    assigned_persons = set()
+    assignments = []
+    for k in order:
+        face, person = int(face_idx[k]), int(person_idx[k])
+        if face in assigned_faces or person in assigned_persons:
+            continue
+
+        confidence = (1.0 - float(distances[face, person])) * 100.0
+        if confidence < 51.0:
+            continue
+
+        assigned_faces.add(face)
+        assigned_persons.add(person)
+        assignments.append((face, PersonRecognitionResult(person=known_persons[person], confidence=confidence)))
+
+    assignments.sort(key=lambda item: item[0])
+    return assignments
+
+
+def frame_quality_gate(thumbnail):
+    """
+    HOG'dan oldingi sifat filtri (thumbnail bo'yicha, <1 ms).
+    Yaroqsiz kadr uchun sabab kodi; filtr o'chiq yoki kadr yaroqli bo'lsa None.
+    """
+    from django.conf import settings
+
+    if thumbnail is None or not getattr(settings, 'FACE_QUALITY_GATE', True):
+        return None
+
+    reason = frame_quality_issue(thumbnail, getattr(settings, 'FACE_QUALITY_THRESHOLDS', None))
+    if reason:
+        metrics.incr(f'quality.{reason}')
+    return reason
+
+
+def quality_feedback(reason):
+    """Client uchun sifat sababi va xabari"""
+    return {'quality': reason, 'quality_message': QUALITY_MESSAGES[reason]}
+
+
+def recognize_image(image, tracker=None, hint=None):
+    """
+    So'rov rasmini (RequestImage) tanish: FACE_INFERENCE_SOCKET sozlangan bo'lsa daemon'da,
+    aks holda (yoki daemon javob bermasa) shu jarayonda (tracker bilan).
+    hint - client yuborgan yuz box'i (request_face_hint).
+
+    Returns:
+        PersonRecognitionResult yoki None (rasmni decode qilib bo'lmadi)
+    """
+    if inference_enabled():
+        try:
+            result = remote_recognize(image.data, hint)
+        except InferenceUnavailable as e:
+            print(f"⚠️  Inference daemon javob bermadi, lokal tanish: {e}")
+        else:
+            if result.get('error') == 'decode_failed':
+                return None
+            if result.get('ok'):
+                person = None
+                if result.get('person_id') is not None:
+                    person = Person.objects.filter(id=result['person_id']).first()
+                if person is None:
+                    return PersonRecognitionResult(faces_count=result.get('faces'))
+                return PersonRecognitionResult(
+                    person=person,
+                    confidence=result['confidence'],
+                    faces_count=result.get('faces'),
+                )
+            print(f"⚠️  Inference daemon xatosi, lokal tanish: {result.get('error')}")
+
+    # JPEG to'g'ridan-to'g'ri ishchi o'lchamda decode qilinadi
+    frame = image.bgr(pipeline_profile(LOGIN_PROFILE)['max_side'])
+    if frame is None:
+        return None
+    return recognize_face_fast(frame, tracker, hint)
+
+
+def encode_image(image, hint=None):
+    """
+    So'rov rasmidagi asosiy (katta va markazga yaqin) yuz encoding'i - daemon yoki lokal.
+    hint - client yuborgan yuz box'i (request_face_hint).
+
+    Returns:
+        (encoding yoki None, decode bo'ldimi)
+    """
+    if inference_enabled():
+        try:
+            return remote_encode(image.data, hint)
+        except InferenceUnavailable as e:
+            print(f"⚠️  Inference daemon javob bermadi, lokal encoding: {e}")
+
+    frame = image.bgr(pipeline_profile(LOGIN_PROFILE)['max_side'])
+    if frame is None:
+        return None, False
+    return encode_primary_face(frame, LOGIN_PROFILE, hint), True
+
+
+
+def person_photo_url(person):
+    """Person rasmining URL'i (V1 - photo path string)"""
+    if not person.photo:
+        return None
+    from django.conf import settings
+    return f"{settings.MEDIA_URL}{person.photo}"
+
+
+def recognized_person_data(person, confidence):
+    """Tanilgan shaxs haqida javobdagi "person" bloki"""
+    return {
+        "id": person.id,
+        "full_name": person.full_name,
+        "first_name": person.first_name,
+        "last_name": person.last_name,
+        "photo_url": person_photo_url(person),
+        "confidence": round(confidence, 2),
+        "is_registered": True,
+        "status": "active",
+        "registered_at": person.registered_at.strftime("%d.%m.%Y") if person.registered_at else "",
+    }
+
+
+def crowding_feedback(recognition_result):
+    """Kadrdagi yuzlar soni; bir nechta bo'lsa kiosk uchun ogohlantirish"""
+    faces_count = getattr(recognition_result, 'faces_count', None)
+    if faces_count is None:
+        return {}
+
+    data = {'faces_count': faces_count}
+    if faces_count > 1:
+        data['crowded'] = True
+        data['crowd_message'] = "Kadrda bir nechta odam bor. Kameraga yakka holda qarang."
+    return data
+
+
+def recognition_response(recognition_result, extra=None):
+    """
+    Yuz tanish natijasidan JSON javob yaratish
+    (detect_face va batch endpoint uchun umumiy)
+    """
+    extra = {**crowding_feedback(recognition_result), **(extra or {})}
+
+    if not recognition_result.is_registered:
+        return JsonResponse(
+            {
+                "person": {
+                    "is_registered": False,
+                    "status": "not_registered",
+                    "message": "Shaxs tanilmadi",
+                },
+                "saved": False,
+                "message": "Iltimos ro'yxatdan o'tgan shaxsni ko'rsating",
+                **extra,
+            }
+        )
+
+    person = recognition_result.person
+    confidence = recognition_result.confidence
+
+    return JsonResponse(
+        {
+            "success": True,
+            "person": recognized_person_data(person, confidence),
+            "message": f"{person.full_name} tanildi",
+            **extra,
+        }
+    )
 
 
 # =====================================================
@@ -233,6 +532,7 @@ def dashboard(request):
 # =====================================================
 
 @csrf_exempt
+@admission_controlled
 def detect_face(request):
     """
     Yuzni tanish API
@@ -241,69 +541,451 @@ def detect_face(request):
         return JsonResponse({"error": "Only POST method allowed"}, status=405)
 
     try:
-        body = json.loads(request.body)
-        image_data = body.get("image", "")
-
-        if not image_data:
-            return JsonResponse({"error": "No image provided"}, status=400)
-
-        if "base64," in image_data:
-            image_data = image_data.split("base64,")[1]
-
         try:
-            image_bytes = base64.b64decode(image_data)
-            nparr = np.frombuffer(image_bytes, np.uint8)
-            frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        except Exception:
+            fields, image = read_request_image(request)
+            if image is None or not image.data:
+                return JsonResponse({"error": "No image provided"}, status=400)
+        except ValueError:
             return JsonResponse({"error": "Failed to decode image"}, status=400)
 
-        if frame is None or frame.size == 0:
+        # Client aniqlagan yuz box'i (bo'lsa butun kadr detection'i o'tkazib yuboriladi)
+        try:
+            hint = request_face_hint(fields, image)
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+
+        # Qorong'i / o'ta yorug' / xira kadrlar HOG'gacha rad etiladi
+        thumbnail = image.thumbnail()
+        quality_issue = frame_quality_gate(thumbnail)
+        if quality_issue:
+            return recognition_response(PersonRecognitionResult(), extra=quality_feedback(quality_issue))
+
+        # Kadr oldingisidan deyarli farq qilmasa - oldingi natija
+        client_key, frame_hash, recognition_result = frame_dedupe.lookup(request, thumbnail)
+        if recognition_result is not None:
+            return recognition_response(recognition_result, extra={'cached': True})
+
+        # Inference daemon (sozlangan bo'lsa) yoki lokal tanish (client sessiyasi tracker'i bilan)
+        recognition_result = recognize_image(image, tracker_for_client(client_key), hint)
+        del image, thumbnail
+
+        if recognition_result is None:
             return JsonResponse({"error": "Invalid image data"}, status=400)
 
-        recognition_result = recognize_face_fast(frame)
+        frame_dedupe.remember(client_key, frame_hash, recognition_result)
+        return recognition_response(recognition_result)
+
+    except Exception as e:
+        return JsonResponse(
+            {
+                "error": str(e),
+                "message": "Xatolik yuz berdi",
+            },
+            status=500,
+        )
+
+
+# Yuklama darajasi bo'yicha capture profillari:
+# (yuklama chegarasi, JPEG sifati, skanerlash oralig'i ms, burst kadrlar)
+CAPTURE_PROFILE_LEVELS = (
+    (0.5, 0.75, 2000, 3),
+    (1.0, 0.7, 3000, 2),
+    (None, 0.65, 5000, 1),
+)
+
+# Kiosk profilni qancha vaqtdan keyin qayta so'raydi (sekund)
+CAPTURE_PROFILE_TTL = 60
+
+
+def capture_profile(request):
+    """
+    Kiosk uchun capture profili - kadr o'lchami, JPEG sifati va skanerlash oralig'i.
+    Kadr o'lchami server ishlaydigan o'lchamga teng (ortiqcha piksel yuborilmaydi),
+    yuklama oshganda kadrlar kamroq va siyrakroq yuboriladi.
+    """
+    if request.method != "GET":
+        return JsonResponse({"error": "Only GET method allowed"}, status=405)
+
+    load = host_load()
+    for threshold, jpeg_quality, scan_interval_ms, burst_frames in CAPTURE_PROFILE_LEVELS:
+        if threshold is None or load < threshold:
+            break
+
+    response = JsonResponse({
+        'success': True,
+        'width': WORKING_MAX_SIDE,
+        'height': WORKING_MAX_SIDE * 3 // 4,
+        'jpeg_quality': jpeg_quality,
+        'scan_interval_ms': scan_interval_ms,
+        'burst_frames': burst_frames,
+        'load': round(load, 2),
+        'ttl': CAPTURE_PROFILE_TTL,
+        # WebSocket skanerlash uchun (/ws/face-scan/?ticket=...)
+        'scan_ticket': scan_socket.issue_ticket(),
+    })
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+@csrf_exempt
+@admission_controlled
+def detect_face_batch(request):
+    """
+    Ko'p kadrli yuz tanish API (bitta so'rovda 3-5 kadr)
+
+    Har bir kadrda yuz topiladi, eng sifatli yuzlar tanlanadi,
+    descriptor'lar bitta batch chaqiruvda hisoblanadi va galereya
+    bilan bir marta solishtiriladi.
+
+    Request Body (JSON):
+    {
+        "images": ["data:image/jpeg;base64,...", ...]
+    }
+    yoki multipart/form-data: bir nechta "images" fayl maydoni (JPEG blob'lar)
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "Only POST method allowed"}, status=405)
+
+    try:
+        content_type = (request.content_type or "").lower()
+
+        if content_type.startswith("multipart/form-data"):
+            images = [uploaded_file_bytes(upload) for upload in request.FILES.getlist("images")]
+        else:
+            body = json.loads(request.body)
+            images = body.get("images") or []
+
+        if not isinstance(images, list) or not images:
+            return JsonResponse({"error": "No images provided"}, status=400)
 
-        if not recognition_result.is_registered:
+        if len(images) > MAX_BATCH_FRAMES:
             return JsonResponse(
-                {
-                    "person": {
-                        "is_registered": False,
-                        "status": "not_registered",
-                        "message": "Shaxs tanilmadi",
-                    },
-                    "saved": False,
-                    "message": "Iltimos ro'yxatdan o'tgan shaxsni ko'rsating",
-                }
+                {"error": f"Ko'pi bilan {MAX_BATCH_FRAMES} ta kadr yuborish mumkin"},
+                status=400,
             )
 
-        person = recognition_result.person
-        confidence = recognition_result.confidence
+        request_images = []
+        thumbnail = None
+        quality_issue = None
+        for image in images:
+            if not image:
+                continue
+            request_image = RequestImage.from_data_url(image) if isinstance(image, str) else RequestImage(image)
+            try:
+                # Sifat filtridan o'tmagan kadrlar tashlab yuboriladi
+                frame_thumbnail = request_image.thumbnail()
+            except Exception:
+                continue
+            frame_issue = frame_quality_gate(frame_thumbnail)
+            if frame_issue:
+                quality_issue = frame_issue
+                continue
+
+            request_images.append(request_image)
+            thumbnail = frame_thumbnail
 
-        response_data = {
-            "success": True,
-            "person": {
-                "id": person.id,
-                "full_name": person.full_name,
-                "first_name": person.first_name,
-                "last_name": person.last_name,
-                "photo_url": person.photo.url if person.photo else None,
-                "confidence": round(confidence, 2),
-                "is_registered": True,
-                "status": "active",
-                "registered_at": person.registered_at.strftime("%d.%m.%Y") if person.registered_at else "",
+        if not request_images and quality_issue:
+            return recognition_response(PersonRecognitionResult(), {
+                "frames_received": len(images),
+                **quality_feedback(quality_issue),
+            })
+
+        # Burst oldingi burst'dan (oxirgi yaroqli kadr bo'yicha) farq qilmasa - oldingi natija
+        client_key, frame_hash, cached_result = frame_dedupe.lookup(request, thumbnail)
+        if cached_result is not None:
+            return recognition_response(cached_result, {"frames_received": len(images), "cached": True})
+
+        frames = []
+        for request_image in request_images:
+            frame = request_image.bgr(MAX_FRAME_SIDE)
+            if frame is not None:
+                frames.append(frame)
+        del request_images
+
+        if not frames:
+            return JsonResponse({"error": "Failed to decode image"}, status=400)
+
+        candidates, faces_found = best_face_candidates(frames)
+        del frames
+
+        extra = {
+            "frames_received": len(images),
+            "frames_with_face": faces_found,
+        }
+
+        if not candidates:
+            frame_dedupe.remember(client_key, frame_hash, PersonRecognitionResult())
+            return recognition_response(PersonRecognitionResult(), extra)
+
+        # Eng sifatli yuzlar uchun bitta batch descriptor hisoblash
+        encodings = encode_faces_batched([(c["rgb"], [c["box"]]) for c in candidates])
+        probes = [per_frame[0] for per_frame in encodings if per_frame]
+
+        extra["best_frame"] = candidates[0]["index"]
+        del candidates
+
+        recognition_result = match_known_faces(probes)
+        frame_dedupe.remember(client_key, frame_hash, recognition_result)
+        return recognition_response(recognition_result, extra)
+
+    except Exception as e:
+        return JsonResponse(
+            {
+                "error": str(e),
+                "message": "Xatolik yuz berdi",
             },
-            "message": f"{person.full_name} tanildi",
+            status=500,
+        )
+
+
+# Klip so'rovining maksimal hajmi (bayt) - video, MJPEG yoki barcha "images" birga
+CLIP_MAX_BYTES = getattr(settings, 'FACE_CLIP_MAX_BYTES', 20 * 1024 * 1024)
+
+# Burst'dagi maksimal "images" soni
+CLIP_MAX_IMAGES = getattr(settings, 'FACE_CLIP_MAX_IMAGES', CLIP_MAX_FRAMES)
+
+
+class ClipRejected(Exception):
+    """Klip so'rovi chegaradan oshdi (status - HTTP javob kodi)"""
+
+    def __init__(self, message, status=413):
+        super().__init__(message)
+        self.status = status
+
+
+# Klip konteyner turi → vaqtinchalik fayl kengaytmasi (FFmpeg demuxer uchun)
+CLIP_SUFFIXES = {
+    'video/webm': '.webm',
+    'video/mp4': '.mp4',
+    'video/quicktime': '.mov',
+    'video/x-msvideo': '.avi',
+}
+
+
+def clip_best_frames(request):
+    """
+    So'rovdagi klip yoki kadrlar burst'idan eng aniq kadrlar.
+
+    - multipart "images": JPEG kadrlar (burst)
+    - multipart "clip" yoki body: MJPEG oqimi yoki video konteyner (webm, mp4...)
+
+    Chegaralar (CLIP_MAX_BYTES, CLIP_MAX_IMAGES) oshsa ClipRejected - body
+    Content-Length bo'yicha o'qilmasdan rad etiladi.
+
+    Returns:
+        ([(kadr indeksi, BGR kadr), ...], baholangan kadrlar soni) yoki None (klip yo'q)
+    """
+    import tempfile
+
+    try:
+        content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        content_length = 0
+    if content_length > CLIP_MAX_BYTES:
+        raise ClipRejected(f"Klip juda katta (maksimal {CLIP_MAX_BYTES // (1024 * 1024)} MB)")
+
+    content_type = (request.content_type or '').lower()
+    temp_path = None
+    suffix = CLIP_SUFFIXES.get(content_type.split(';')[0], '.bin')
+
+    if content_type.startswith('multipart/form-data'):
+        # Content-Length bo'lmasa (chunked) - fayllar hajmi parse'dan keyin tekshiriladi
+        if sum(upload.size or 0 for upload in request.FILES.values()) > CLIP_MAX_BYTES:
+            raise ClipRejected(f"Klip juda katta (maksimal {CLIP_MAX_BYTES // (1024 * 1024)} MB)")
+
+        uploads = request.FILES.getlist('images')
+        if len(uploads) > CLIP_MAX_IMAGES:
+            raise ClipRejected(f"Kadrlar juda ko'p (maksimal {CLIP_MAX_IMAGES} ta)", status=400)
+        if uploads:
+            jpeg_frames = sample_evenly([bytes(uploaded_file_bytes(u)) for u in uploads], CLIP_MAX_FRAMES)
+            return sharpest_mjpeg_frames(jpeg_frames), len(jpeg_frames)
+
+        upload = request.FILES.get('clip')
+        if upload is None:
+            return None
+        suffix = CLIP_SUFFIXES.get((upload.content_type or '').lower(), os.path.splitext(upload.name or '')[1] or '.bin')
+        if hasattr(upload, 'temporary_file_path'):
+            # Katta fayl Django tomonidan diskka yozilgan - nusxa kerak emas
+            temp_path = upload.temporary_file_path()
+            data = None
+        else:
+            data = uploaded_file_bytes(upload)
+    else:
+        data = request.body
+
+    if data is not None:
+        if not data:
+            return None
+        if is_mjpeg(data):
+            jpeg_frames = sample_evenly(split_mjpeg(data), CLIP_MAX_FRAMES)
+            return sharpest_mjpeg_frames(jpeg_frames), len(jpeg_frames)
+
+        # Konteyner - OpenCV (FFmpeg) faqat fayldan o'qiydi
+        with tempfile.NamedTemporaryFile(suffix=suffix) as clip_file:
+            clip_file.write(data)
+            clip_file.flush()
+            return sharpest_video_frames(clip_file.name)
+
+    return sharpest_video_frames(temp_path)
+
+
+@csrf_exempt
+@admission_controlled
+def detect_face_clip(request):
+    """
+    Qisqa video klip yoki kadrlar burst'i bo'yicha yuz tanish (bitta so'rov - bitta qaror)
+
+    Barcha kadrlar arzon baholanadi (thumbnail aniqligi), eng aniq kadrlarda yuz
+    qidiriladi va descriptor faqat eng sifatli 1-2 yuz uchun hisoblanadi.
+
+    Request:
+    - body: MJPEG oqimi (video/x-motion-jpeg, multipart/x-mixed-replace) yoki
+      video/webm, video/mp4
+    - multipart/form-data: "clip" fayl yoki bir nechta "images" (JPEG)
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "Only POST method allowed"}, status=405)
+
+    try:
+        try:
+            clip = clip_best_frames(request)
+        except ClipRejected as e:
+            return JsonResponse({"error": str(e)}, status=e.status)
+        except RequestDataTooBig:
+            return JsonResponse({"error": "Klip juda katta"}, status=413)
+        except TooManyFilesSent:
+            return JsonResponse({"error": f"Kadrlar juda ko'p (maksimal {CLIP_MAX_IMAGES} ta)"}, status=400)
+
+        if clip is None:
+            return JsonResponse({"error": "No clip provided"}, status=400)
+
+        selected, frames_scored = clip
+        if not selected:
+            return JsonResponse({"error": "Failed to decode clip"}, status=400)
+
+        candidates, faces_found = best_face_candidates([frame for _, frame in selected])
+        extra = {
+            "frames_received": frames_scored,
+            "frames_checked": len(selected),
+            "frames_with_face": faces_found,
         }
 
+        if not candidates:
+            return recognition_response(PersonRecognitionResult(), extra)
+
+        # Eng sifatli yuzlar uchun bitta batch descriptor hisoblash
+        encodings = encode_faces_batched([(c["rgb"], [c["box"]]) for c in candidates])
+        probes = [per_frame[0] for per_frame in encodings if per_frame]
+
+        extra["best_frame"] = selected[candidates[0]["index"]][0]
+        del candidates, selected
+
+        return recognition_response(match_known_faces(probes), extra)
+
+    except Exception as e:
+        return JsonResponse(
+            {
+                "error": str(e),
+                "message": "Xatolik yuz berdi",
+            },
+            status=500,
+        )
+
+
+# Roll-call: guruh rasmidagi yuzlar kichik - butun kadr upsample bilan bir marta skanerlanadi
+ROLL_CALL_LADDER = ((MAX_FRAME_SIDE, 1),)
+
+# Bitta rasmda ko'pi bilan nechta yuz ishlanadi (eng kattalari)
+ROLL_CALL_MAX_FACES = 40
+
+
+@staff_required
+@admission_controlled
+def roll_call(request):
+    """
+    Guruh davomati API - bitta rasmdagi barcha yuzlarni tanish
+
+    Barcha yuzlar topiladi, descriptor'lar bitta batch chaqiruvda hisoblanadi,
+    (F, N) masofalar matritsasi bo'yicha birga-bir biriktiriladi va har bir
+    tanilgan shaxs uchun LoginLog bitta bulk INSERT bilan yoziladi.
+
+    Davomatni faqat tizimga kirgan staff (o'qituvchi) yozadi - sessiya va
+    CSRF token talab qilinadi.
+
+    Request: image/jpeg body, multipart ("image" fayl) yoki JSON {"image": "data:image/jpeg;base64,..."}
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "Only POST method allowed"}, status=405)
+
+    try:
         try:
-            del frame, nparr, image_bytes
-        except:
-            pass
+            _, image = read_request_image(request)
+            if image is None or not image.data:
+                return JsonResponse({"success": False, "error": "No image provided"}, status=400)
+        except ValueError:
+            return JsonResponse({"success": False, "error": "Failed to decode image"}, status=400)
+
+        rgb_frame = image.rgb(MAX_FRAME_SIDE)
+        if rgb_frame is None:
+            return JsonResponse({"success": False, "error": "Invalid image data"}, status=400)
+
+        face_locations, _ = detect_faces_adaptive(rgb_frame, ROLL_CALL_LADDER)
+        face_locations = sorted(face_locations, key=box_area, reverse=True)[:ROLL_CALL_MAX_FACES]
+
+        if not face_locations:
+            return JsonResponse({"success": True, "faces_count": 0, "identified": [], "unidentified": 0, "logged": 0})
+
+        # Barcha yuzlar uchun bitta batch descriptor chaqiruvi
+        encodings = encode_faces_batched([(rgb_frame, face_locations)])[0]
+        del rgb_frame
+        image.release()
+
+        assignments = assign_known_faces(encodings)
+
+        # Guruh rasmi bir marta saqlanadi - barcha loglar shu rasmga ishora qiladi
+        ip_address = frame_dedupe.client_ip(request) or '0.0.0.0'
+        logs = [
+            LoginLog(
+                id=str(uuid.uuid4()),
+                inspector=result.person,
+                login_method='FACE',
+                ip_address=ip_address,
+                confidence=result.confidence,
+                success=True,
+            )
+            for _, result in assignments
+        ]
+        if logs:
+            login_photo = f"login_photos/roll_call_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{logs[0].id[:8]}.jpg"
+            for log in logs:
+                log.login_photo = login_photo
+        login_log_writer.record(logs, image.data)
+        del image
+
+        metrics.incr('roll_call.faces', len(face_locations))
+        metrics.incr('roll_call.identified', len(assignments))
+
+        identified = []
+        for face, result in assignments:
+            top, right, bottom, left = face_locations[face]
+            identified.append({
+                **recognized_person_data(result.person, result.confidence),
+                "box": {"top": top, "right": right, "bottom": bottom, "left": left},
+            })
 
-        return JsonResponse(response_data)
+        return JsonResponse({
+            "success": True,
+            "faces_count": len(face_locations),
+            "identified": identified,
+            "unidentified": len(face_locations) - len(assignments),
+            "logged": len(assignments),
+            "message": f"{len(assignments)} ta shaxs tanildi ({len(face_locations)} ta yuzdan)",
+        })
 
     except Exception as e:
         return JsonResponse(
             {
+                "success": False,
                 "error": str(e),
                 "message": "Xatolik yuz berdi",
             },
@@ -315,7 +997,105 @@ def detect_face(request):
 # API - Authentication
 # =====================================================
 
+def verify_person_encoding(person, current_encoding, known_encoding=None):
+    """
+    1:1 tekshiruv - kameradagi yuzni Person'ning saqlangan encoding'i bilan solishtirish.
+    known_encoding - oldindan decode qilingan shablon (login profili); bo'lmasa person.face_encoding.
+
+    Returns:
+        (confidence, xato JsonResponse yoki None)
+    """
+    if current_encoding is None:
+        return None, JsonResponse({
+            'success': False,
+            'error': 'Rasmda yuz topilmadi. Qaytadan urinib ko\'ring.'
+        }, status=400)
+
+    if known_encoding is None and person.face_encoding:
+        known_encoding = np.array(person.face_encoding)
+
+    if known_encoding is None:
+        return None, JsonResponse({
+            'success': False,
+            'error': 'Bazada face encoding yo\'q. Yangi rasm oling.',
+            'requires_photo': True
+        }, status=400)
+
+    # Face comparison
+    face_distance = float(np.linalg.norm(known_encoding - current_encoding))
+    confidence = (1 - face_distance) * 100
+
+    print(f"Face recognition confidence: {confidence:.2f}%")
+
+    if confidence < 51.0:
+        return confidence, JsonResponse({
+            'success': False,
+            'error': f'Yuz mos kelmadi (aniqlik: {confidence:.1f}%). Qaytadan urinib ko\'ring.',
+            'confidence': round(confidence, 2)
+        }, status=400)
+
+    print(f"✅ Face recognized: {person.full_name} ({confidence:.2f}%)")
+    return confidence, None
+
+
+def get_or_create_login_user(person):
+    """Person uchun Django User (username = passport) - admin huquqlari bilan"""
+    username_for_django = person.passport  # V1 da birlashgan passport
+    user, created = User.objects.get_or_create(
+        username=username_for_django,
+        defaults={
+            'first_name': person.first_name,
+            'last_name': person.last_name,
+            'is_staff': True,
+            'is_superuser': True,
+            'is_active': True,
+        }
+    )
+
+    if not created:
+        updated = False
+        if not user.is_staff:
+            user.is_staff = True
+            updated = True
+        if not user.is_superuser:
+            user.is_superuser = True
+            updated = True
+        if not user.is_active:
+            user.is_active = True
+            updated = True
+        if updated:
+            user.save()
+
+    return user
+
+
+def face_login_response(person, user, login_method, confidence_value=None, photo_age_days=None):
+    """Muvaffaqiyatli login javobi"""
+    response_data = {
+        'success': True,
+        'message': f'{person.full_name} tizimga kirdi',
+        'redirect_url': '/dashboard/',
+        'login_method': login_method,
+        'user': {
+            'id': user.id,
+            'username': user.username,
+            'full_name': person.full_name,
+            'is_staff': user.is_staff,
+            'is_superuser': user.is_superuser,
+        }
+    }
+
+    if login_method == 'face' and confidence_value:
+        response_data['confidence'] = round(confidence_value, 2)
+
+    if photo_age_days is not None:
+        response_data['photo_age_days'] = photo_age_days
+
+    return JsonResponse(response_data)
+
+
 @csrf_exempt
+@admission_controlled
 def face_login_auth(request):
     """
     SMART LOGIN API - Passport + Face Recognition
@@ -334,14 +1114,13 @@ def face_login_auth(request):
         return JsonResponse({'error': 'Only POST method allowed'}, status=405)
 
     try:
-        from datetime import timedelta
-        data = json.loads(request.body)
+        # JSON (base64 data URL), image/jpeg (?username=...) yoki multipart
+        data, image = read_request_image(request)
 
         # =============================
         # PASSPORT KIRITISH (1-qadam)
         # =============================
         username_input = data.get('username')  # AD2423695
-        image_data = data.get('image')         # Camera'dan rasm
 
         if not username_input:
             return JsonResponse({
@@ -360,43 +1139,29 @@ def face_login_auth(request):
 
         passport_full = username_input  # AB1234567 (already uppercased)
 
-        # Person topish (V1 inspectors jadvalida)
-        try:
-            person = Person.objects.get(
-                passport=passport_full
-            )
-        except Person.DoesNotExist:
+        # Person topish (V1 inspectors jadvalida) - login profili cache'i orqali:
+        # 2-qadamda (yuz bilan) DB so'rovi va rasm fayli stat'i takrorlanmaydi
+        profile = login_profiles.get_profile(passport_full)
+        if profile is None:
             return JsonResponse({
                 'success': False,
                 'error': "Passport ma'lumotlari noto'g'ri"
             }, status=404)
+        # Profil thread'lar orasida umumiy - enrollment o'zgartiradigan nusxa
+        person = copy.copy(profile.person)
 
         # =============================
         # RASM TEKSHIRISH (2-qadam)
         # =============================
         login_method = None
-        photo_age_days = None
-
-        if person.photo:
-            # Rasmning yoshini hisoblash
-            if hasattr(person.photo, 'name') and person.photo.name:
-                try:
-                    # Fayl yaratilgan vaqtini olish
-                    photo_path = person.photo.path
-                    if os.path.exists(photo_path):
-                        photo_mtime = os.path.getmtime(photo_path)
-                        photo_date = datetime.fromtimestamp(photo_mtime)
-                        photo_age_days = (datetime.now() - photo_date).days
-                except Exception as e:
-                    print(f"Rasm yoshini hisoblab bo'lmadi: {e}")
-                    photo_age_days = None
+        photo_age_days = profile.photo_age_days()
 
         # =============================
         # LOGIKA ANIQLASH
         # =============================
-        if not person.photo or not person.photo.name:
+        if not person.photo:
             # VARIANT 1: Rasm yo'q
-            if not image_data:
+            if image is None:
                 return JsonResponse({
                     'success': False,
                     'requires_photo': True,
@@ -408,7 +1173,7 @@ def face_login_auth(request):
 
         elif photo_age_days is not None and photo_age_days > 30:
             # VARIANT 2: Rasm 1 oydan eski
-            if not image_data:
+            if image is None:
                 return JsonResponse({
                     'success': False,
                     'requires_photo': True,
@@ -421,7 +1186,7 @@ def face_login_auth(request):
 
         else:
             # VARIANT 3: Rasm bor va yangi (1 oy ichida)
-            if not image_data:
+            if image is None:
                 return JsonResponse({
                     'success': False,
                     'requires_face': True,
@@ -436,42 +1201,12 @@ def face_login_auth(request):
         # 3-QADAM: RASM BILAN LOGIN (yangi yoki eski rasm)
         # =============================
         if login_method in ['passport_new_photo', 'passport_update_photo']:
-            # Rasmni decode qilish
-            if "base64," in image_data:
-                image_data_clean = image_data.split("base64,")[1]
-            else:
-                image_data_clean = image_data
-
-            image_bytes = base64.b64decode(image_data_clean)
-
-            # Eski rasmni o'chirish (agar mavjud bo'lsa)
-            if person.photo:
-                try:
-                    if os.path.isfile(person.photo.path):
-                        os.remove(person.photo.path)
-                    print(f"✅ Eski rasm o'chirildi: {person.photo.path}")
-                except Exception as e:
-                    print(f"⚠️  Eski rasmni o'chirishda xatolik: {e}")
-                person.photo.delete(save=False)
-
-            # Eski face encoding'ni o'chirish
-            person.face_encoding = None
-
-            # Yangi rasmni saqlash
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = f"person_{person.id}_{timestamp}.jpg"
-            person.photo.save(filename, ContentFile(image_bytes), save=True)
-
-            # Face encoding yaratish
+            # Yangi rasm va face encoding (enrollment servisi, eski rasm o'chiriladi)
             try:
-                image = face_recognition.load_image_file(person.photo.path)
-                encodings = face_recognition.face_encodings(image)
-                if encodings:
-                    person.face_encoding = encodings[0].tolist()
-                    person.save()
+                if enroll_person(person, image) is not None:
                     print(f"✅ Face encoding yaratildi (Person {person.id})")
-            except Exception as e:
-                print(f"⚠️  Face encoding xatolik: {e}")
+            except ValueError as e:
+                return JsonResponse({'success': False, 'error': str(e)}, status=400)
 
             print(f"✅ Yangi rasm saqlandi (Person {person.id})")
             login_method = 'passport'
@@ -480,58 +1215,27 @@ def face_login_auth(request):
         # 4-QADAM: FACE RECOGNITION
         # =============================
         elif login_method == 'face_recognition':
-            # Rasmni decode qilish
-            if "base64," in image_data:
-                image_data_clean = image_data.split("base64,")[1]
-            else:
-                image_data_clean = image_data
-
-            image_bytes = base64.b64decode(image_data_clean)
-
             # Face recognition
             try:
-                import numpy as np
-                from PIL import Image as PILImage
-                import io
-
-                # Rasmni load qilish
-                img = PILImage.open(io.BytesIO(image_bytes))
-                img_array = np.array(img)
-
-                # Face encoding topish
-                face_encodings = face_recognition.face_encodings(img_array)
-
-                if not face_encodings:
-                    return JsonResponse({
-                        'success': False,
-                        'error': 'Rasmda yuz topilmadi. Qaytadan urinib ko\'ring.'
-                    }, status=400)
+                # Client box'i (ixtiyoriy) tasdiqlansa detection o'tkazib yuboriladi
+                try:
+                    hint = request_face_hint(data, image)
+                except ValueError as e:
+                    return JsonResponse({'success': False, 'error': str(e)}, status=400)
 
-                # Bazadagi face encoding bilan solishtirish
-                if not person.face_encoding:
+                # Faqat asosiy yuz encoding'i (inference daemon yoki lokal)
+                current_encoding, decoded = encode_image(image, hint)
+                if not decoded:
                     return JsonResponse({
                         'success': False,
-                        'error': 'Bazada face encoding yo\'q. Yangi rasm oling.',
-                        'requires_photo': True
+                        'error': 'Rasmni decode qilib bo\'lmadi'
                     }, status=400)
 
-                known_encoding = np.array(person.face_encoding)
-                current_encoding = face_encodings[0]
-
-                # Face comparison
-                face_distance = face_recognition.face_distance([known_encoding], current_encoding)[0]
-                confidence = (1 - face_distance) * 100
-
-                print(f"Face recognition confidence: {confidence:.2f}%")
-
-                if confidence < 51.0:
-                    return JsonResponse({
-                        'success': False,
-                        'error': f'Yuz mos kelmadi (aniqlik: {confidence:.1f}%). Qaytadan urinib ko\'ring.',
-                        'confidence': round(confidence, 2)
-                    }, status=400)
+                # Bazadagi face encoding bilan solishtirish (profildagi float32 shablon)
+                confidence, error_response = verify_person_encoding(person, current_encoding, profile.template)
+                if error_response is not None:
+                    return error_response
 
-                print(f"✅ Face recognized: {person.full_name} ({confidence:.2f}%)")
                 login_method = 'face'
 
             except Exception as e:
@@ -544,32 +1248,8 @@ def face_login_auth(request):
         # =============================
         # 5-QADAM: USER VA LOGIN
         # =============================
-        # Django User yaratish/olish
-        username_for_django = person.passport  # V1 da birlashgan passport
-        user, created = User.objects.get_or_create(
-            username=username_for_django,
-            defaults={
-                'first_name': person.first_name,
-                'last_name': person.last_name,
-                'is_staff': True,
-                'is_superuser': True,
-                'is_active': True,
-            }
-        )
-
-        if not created:
-            updated = False
-            if not user.is_staff:
-                user.is_staff = True
-                updated = True
-            if not user.is_superuser:
-                user.is_superuser = True
-                updated = True
-            if not user.is_active:
-                user.is_active = True
-                updated = True
-            if updated:
-                    user.save()
+        # Django User yaratish/olish (profilda saqlanadi)
+        user = login_profiles.profile_user(profile, get_or_create_login_user)
 
         # =============================
         # 6-QADAM: LOGIN QILISH
@@ -589,34 +1269,14 @@ def face_login_auth(request):
             person=person,
             login_method=login_method,
             request=request,
-            image_data=image_data,
+            image_bytes=image.data,
             confidence=confidence_value
         )
 
         # =============================
         # 7-QADAM: RESPONSE
         # =============================
-        response_data = {
-            'success': True,
-            'message': f'{person.full_name} tizimga kirdi',
-            'redirect_url': '/dashboard/',
-            'login_method': login_method,
-            'user': {
-                'id': user.id,
-                'username': user.username,
-                'full_name': person.full_name,
-                'is_staff': user.is_staff,
-                'is_superuser': user.is_superuser,
-            }
-        }
-
-        if login_method == 'face' and confidence_value:
-            response_data['confidence'] = round(confidence_value, 2)
-
-        if photo_age_days is not None:
-            response_data['photo_age_days'] = photo_age_days
-
-        return JsonResponse(response_data)
+        return face_login_response(person, user, login_method, confidence_value, photo_age_days)
 
     except Exception as e:
         return JsonResponse({
@@ -625,14 +1285,6 @@ def face_login_auth(request):
             'message': 'Login jarayonida xatolik'
         }, status=500)
 
-import json
-import re
-from datetime import datetime
-from django.http import JsonResponse
-from django.contrib.auth import login
-from django.contrib.auth.models import User
-
-from emotion_app.models import Person
 
 @csrf_exempt
 def passport_login_auth(request):
@@ -644,10 +1296,10 @@ def passport_login_auth(request):
         return JsonResponse({'error': 'Only POST method allowed'}, status=405)
 
     try:
-        data = json.loads(request.body)
+        # JSON (base64 data URL), image/jpeg (?username=...) yoki multipart
+        data, image = read_request_image(request)
 
         username_input = (data.get('username') or '').strip().upper()
-        image_data = data.get('image')  # optional
 
         if not username_input:
             return JsonResponse({
@@ -665,7 +1317,7 @@ def passport_login_auth(request):
                 'error': "Passport formati noto'g'ri. Masalan: AD2423695"
             }, status=400)
 
-        passport_full = passport_input  # AD2423695
+        passport_full = username_input  # AD2423695
 
         # =============================
         # PERSON TOPISH (faqat passport bo'yicha)
@@ -683,84 +1335,23 @@ def passport_login_auth(request):
         # =============================
         # DJANGO USER (USERNAME = AD2423695)
         # =============================
-        username = person.passport  # V1 birlashgan passport
-
-        user, created = User.objects.get_or_create(
-            username=username,
-            defaults={
-                'first_name': person.first_name,
-                'last_name': person.last_name,
-                'is_staff': True,
-                'is_superuser': True,
-                'is_active': True,
-            }
-        )
-
-        if not created:
-            updated = False
-            if not user.is_staff:
-                user.is_staff = True
-                updated = True
-            if not user.is_superuser:
-                user.is_superuser = True
-                updated = True
-            if not user.is_active:
-                user.is_active = True
-                updated = True
-            if updated:
-                user.save()
+        user = get_or_create_login_user(person)
 
         # =============================
         # RASM YUKLASH (agar yuborilgan bo'lsa)
         # =============================
-        if image_data:
+        if image is not None:
             try:
-                # Rasmni decode qilish
-                if "base64," in image_data:
-                    image_data_clean = image_data.split("base64,")[1]
-                else:
-                    image_data_clean = image_data
-
-                image_bytes = base64.b64decode(image_data_clean)
-
-                # MUHIM: Eski rasmni o'chirish (agar mavjud bo'lsa)
-                if person.photo:
-                    try:
-                        import os
-                        if os.path.isfile(person.photo.path):
-                            os.remove(person.photo.path)
-                        print(f"✅ Eski rasm o'chirildi: {person.photo.path}")
-                    except Exception as e:
-                        print(f"⚠️  Eski rasmni o'chirishda xatolik: {e}")
-
-                    person.photo.delete(save=False)
-
-                # Eski face encoding'ni o'chirish
-                person.face_encoding = None
-
-                # Yangi rasmni saqlash
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                filename = f"person_{person.id}_{timestamp}.jpg"
-                person.photo.save(filename, ContentFile(image_bytes), save=True)
-
-                # Face encoding yaratish
-                try:
-                    import face_recognition
-                    image = face_recognition.load_image_file(person.photo.path)
-                    encodings = face_recognition.face_encodings(image)
-                    if encodings:
-                        person.face_encoding = encodings[0].tolist()
-                        person.save()
-                        print(f"✅ Face encoding yaratildi (Person {person.id})")
-                except Exception as e:
-                    print(f"⚠️  Face encoding xatolik: {e}")
+                # Yangi rasm va face encoding (enrollment servisi, eski rasm o'chiriladi)
+                if enroll_person(person, image) is not None:
+                    print(f"✅ Face encoding yaratildi (Person {person.id})")
 
                 # LoginLog yaratish
                 create_login_log(
                     person=person,
                     login_method='passport',
                     request=request,
-                    image_data=image_data,
+                    image_bytes=image.data,
                     confidence=None
                 )
 
@@ -802,11 +1393,11 @@ def upload_login_photo(request):
         return JsonResponse({'error': 'Only POST method allowed'}, status=405)
 
     try:
-        data = json.loads(request.body)
+        # JSON (base64 data URL), image/jpeg (?person_id=...) yoki multipart
+        data, image = read_request_image(request)
         person_id = data.get('person_id')
-        image_data = data.get('image')
 
-        if not person_id or not image_data:
+        if not person_id or image is None:
             return JsonResponse({
                 'success': False,
                 'error': 'person_id va image kerak'
@@ -821,63 +1412,32 @@ def upload_login_photo(request):
                 'error': 'Shaxs topilmadi'
             }, status=404)
 
-        # Rasmni decode qilish
+        # Rasmni saqlash
         try:
-            if "base64," in image_data:
-                image_data = image_data.split("base64,")[1]
-
-            image_bytes = base64.b64decode(image_data)
-
-            # MUHIM: Eski rasmni o'chirish (agar mavjud bo'lsa)
-            if person.photo:
-                try:
-                    import os
-                    # Eski rasmni diskdan o'chirish
-                    if os.path.isfile(person.photo.path):
-                        os.remove(person.photo.path)
-                    print(f"✅ Eski rasm o'chirildi: {person.photo.path}")
-                except Exception as e:
-                    print(f"⚠️  Eski rasmni o'chirishda xatolik: {e}")
-
-                # Database'dan eski rasmni o'chirish
-                person.photo.delete(save=False)
-
-            # Eski face encoding'ni o'chirish
-            person.face_encoding = None
-
-            # Yangi rasmni Person'ga saqlash
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = f"person_{person.id}_{timestamp}.jpg"
-
-            person.photo.save(filename, ContentFile(image_bytes), save=True)
-
-            # Face encoding yaratish
-            try:
-                import face_recognition
-                image = face_recognition.load_image_file(person.photo.path)
-                encodings = face_recognition.face_encodings(image)
-
-                if encodings:
-                    person.face_encoding = encodings[0].tolist()
-                    person.save()
-            except Exception as e:
-                print(f"Face encoding xatolik: {e}")
+            # Yangi rasm va face encoding (enrollment servisi, eski rasm o'chiriladi)
+            enroll_person(person, image)
 
             # LoginLog yaratish
             create_login_log(
                 person=person,
                 login_method='passport',
                 request=request,
-                image_data=image_data,
+                image_bytes=image.data,
                 confidence=None
             )
 
             return JsonResponse({
                 'success': True,
                 'message': 'Rasm muvaffaqiyatli saqlandi',
-                'photo_url': person.photo.url if person.photo else None
+                'photo_url': person_photo_url(person)
             })
 
+        except ValueError as e:
+            # Rasmni ochib bo'lmadi yoki o'lchami ruxsat etilmagan
+            return JsonResponse({
+                'success': False,
+                'error': str(e)
+            }, status=400)
         except Exception as e:
             return JsonResponse({
                 'success': False,
@@ -924,7 +1484,7 @@ def get_current_user(request):
 
             # Rasm URL'ni olish
             if person and person.photo:
-                photo_url = person.photo.url
+                photo_url = person_photo_url(person)
 
         except Exception as e:
             print(f"Person topishda xatolik: {e}")
@@ -988,8 +1548,6 @@ def upload_excel(request):
         import pandas as pd
         from datetime import datetime
         import openpyxl
-        from PIL import Image
-        import io
         import requests
         from urllib.parse import urlparse
 
@@ -1266,201 +1824,52 @@ def upload_excel(request):
                     person = Person.objects.create(**person_data)
                     created = True
 
-                # IKKINCHI: Rasmni yuklash (Person ID kerak bo'lgani uchun keyin)
-                photo_saved = False
+                # IKKINCHI: Rasm va face encoding (Person ID kerak bo'lgani uchun keyin)
+                # Excel ichidagi rasm, bo'lmasa URL - enrollment servisi orqali
+                photo_bytes = None
+                photo_suffix = ''
 
                 # 1. Excel ichida embed qilingan rasm
                 if index in images_dict:
-                    try:
-                        print(f"  📸 Qator {index + 2}: Rasm topildi, yuklanmoqda...")
-                        img_bytes = images_dict[index]
-                        img = Image.open(io.BytesIO(img_bytes))
-
-                        # Rasm formatini aniqlash
-                        original_format = img.format if img.format else 'JPEG'
-
-                        # Ruxsat etilgan formatlar
-                        allowed_formats = ['JPEG', 'JPG', 'PNG', 'WEBP', 'GIF']
-
-                        if original_format.upper() not in allowed_formats:
-                            print(f"  ⚠️  Noma'lum format ({original_format}), JPEG'ga aylantirilmoqda...")
-                            original_format = 'JPEG'
-
-                        # Format bo'yicha sozlash
-                        output = io.BytesIO()
-                        save_format = original_format.upper()
-
-                        if save_format in ('JPEG', 'JPG'):
-                            # JPEG uchun RGB kerak
-                            if img.mode in ('RGBA', 'LA', 'P'):
-                                img = img.convert('RGB')
-                            img.save(output, format='JPEG', quality=85, optimize=True)
-                            file_ext = 'jpg'
-                        elif save_format == 'PNG':
-                            # PNG RGBA'ni qo'llab-quvvatlaydi
-                            if img.mode == 'P':
-                                img = img.convert('RGBA')
-                            img.save(output, format='PNG', optimize=True)
-                            file_ext = 'png'
-                        elif save_format == 'WEBP':
-                            # WEBP RGBA'ni qo'llab-quvvatlaydi
-                            img.save(output, format='WEBP', quality=85, method=6)
-                            file_ext = 'webp'
-                        elif save_format == 'GIF':
-                            # GIF P yoki RGB bo'lishi kerak
-                            if img.mode not in ('P', 'RGB', 'RGBA'):
-                                img = img.convert('RGB')
-                            img.save(output, format='GIF', optimize=True)
-                            file_ext = 'gif'
-                        else:
-                            # Default JPEG
-                            if img.mode in ('RGBA', 'LA', 'P'):
-                                img = img.convert('RGB')
-                            img.save(output, format='JPEG', quality=85)
-                            file_ext = 'jpg'
-
-                        output.seek(0)
-
-                        # Person ID bilan fayl nomi yaratish
-                        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                        filename = f"person_{person.id}_{timestamp}.{file_ext}"
-                        person.photo.save(filename, ContentFile(output.read()), save=True)
-                        photo_saved = True
-                        print(f"  ✅ Rasm saqlandi: {filename} (Format: {save_format}, Person ID: {person.id})")
-                    except Exception as e:
-                        error_msg = f"Qator {index + 2}: Rasmni saqlab bo'lmadi: {str(e)}"
-                        warnings.append(error_msg)
-                        print(f"  ❌ {error_msg}")
+                    print(f"  📸 Qator {index + 2}: Rasm topildi, yuklanmoqda...")
+                    photo_bytes = images_dict[index]
                 else:
                     print(f"  ℹ️  Qator {index + 2}: Rasm yo'q (Person ID: {person.id})")
 
                 # 2. URL orqali rasm yuklash (agar Excel'da rasm bo'lmasa)
-                if not photo_saved and photo_url:
+                if photo_bytes is None and photo_url:
                     try:
                         print(f"  🌐 Qator {index + 2}: URL dan rasm yuklanmoqda...")
                         parsed = urlparse(photo_url)
                         if parsed.scheme in ['http', 'https']:
                             response = requests.get(photo_url, timeout=10)
                             if response.status_code == 200:
-                                img = Image.open(io.BytesIO(response.content))
-
-                                # Rasm formatini aniqlash
-                                original_format = img.format if img.format else 'JPEG'
-
-                                # Ruxsat etilgan formatlar
-                                allowed_formats = ['JPEG', 'JPG', 'PNG', 'WEBP', 'GIF']
-
-                                if original_format.upper() not in allowed_formats:
-                                    print(f"  ⚠️  Noma'lum format ({original_format}), JPEG'ga aylantirilmoqda...")
-                                    original_format = 'JPEG'
-
-                                # Format bo'yicha sozlash
-                                output = io.BytesIO()
-                                save_format = original_format.upper()
-
-                                if save_format in ('JPEG', 'JPG'):
-                                    if img.mode in ('RGBA', 'LA', 'P'):
-                                        img = img.convert('RGB')
-                                    img.save(output, format='JPEG', quality=85, optimize=True)
-                                    file_ext = 'jpg'
-                                elif save_format == 'PNG':
-                                    if img.mode == 'P':
-                                        img = img.convert('RGBA')
-                                    img.save(output, format='PNG', optimize=True)
-                                    file_ext = 'png'
-                                elif save_format == 'WEBP':
-                                    img.save(output, format='WEBP', quality=85, method=6)
-                                    file_ext = 'webp'
-                                elif save_format == 'GIF':
-                                    if img.mode not in ('P', 'RGB', 'RGBA'):
-                                        img = img.convert('RGB')
-                                    img.save(output, format='GIF', optimize=True)
-                                    file_ext = 'gif'
-                                else:
-                                    if img.mode in ('RGBA', 'LA', 'P'):
-                                        img = img.convert('RGB')
-                                    img.save(output, format='JPEG', quality=85)
-                                    file_ext = 'jpg'
-
-                                output.seek(0)
-
-                                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                                filename = f"person_{person.id}_{timestamp}_url.{file_ext}"
-                                person.photo.save(filename, ContentFile(output.read()), save=True)
-                                photo_saved = True
-                                print(f"  ✅ URL rasm saqlandi: {filename} (Format: {save_format})")
+                                photo_bytes = response.content
+                                photo_suffix = '_url'
                     except Exception as e:
                         warnings.append(f"Qator {index + 2}: URL dan rasm yuklanmadi: {str(e)[:100]}")
                         print(f"  ❌ URL xato: {str(e)[:100]}")
 
-                # 3. Face encoding yaratish (agar rasm saqlangan bo'lsa)
-                if photo_saved and person.photo:
+                # 3. Rasmni saqlash va face encoding yaratish (xotirada, bitta decode)
+                if photo_bytes is not None:
                     try:
-                        print(f"  🔍 Qator {index + 2}: Face encoding yaratilmoqda...")
-                        import face_recognition
-                        image = face_recognition.load_image_file(person.photo.path)
-                        encodings = face_recognition.face_encodings(image)
-
-                        if encodings:
-                            person.face_encoding = encodings[0].tolist()
-                            person.save()
+                        encoding = enroll_person(person, photo_bytes, suffix=photo_suffix)
+                        print(f"  ✅ Rasm saqlandi: {person.photo} (Person ID: {person.id})")
+                        if encoding is not None:
                             print(f"  ✅ Face encoding yaratildi (Person ID: {person.id})")
                         else:
                             warnings.append(f"Qator {index + 2}: Rasmda yuz topilmadi")
                             print(f"  ⚠️  Rasmda yuz topilmadi")
                     except Exception as e:
-                        warnings.append(f"Qator {index + 2}: Face encoding yaratib bo'lmadi: {str(e)[:100]}")
-                        print(f"  ❌ Face encoding xato: {str(e)[:100]}")
-
-                # 4. Admin User yaratish
-                try:
-                    print(f"  👤 Qator {index + 2}: Admin User yaratilmoqda...")
-                    from django.contrib.auth.models import User
-
-                    # USERNAME: passport (V1 birlashgan format, masalan: AD3145734)
-                    if passport_full:
-                        username = passport_full
-                    else:
-                        # Fallback - agar passport bo'lmasa, person ID ishlatamiz
-                        username = f"person_{person.id}"
-
-                    # PASSWORD: Tug'ilgan kun (DDMMYYYY formatda, masalan: 29021988)
-                    if birth_date:
-                        # birth_date - date obyekti (masalan: 1988-02-29)
-                        password = str(birth_date.strftime('%d%m%Y'))  # String'ga aylantirish
-                    else:
-                        # Fallback - agar tug'ilgan kun bo'lmasa, default password
-                        password = 'password123'
-
-                    # XAVFSIZLIK: Password string ekanligini ta'minlash
-                    password = str(password) if password else 'password123'
-
-                    user, created = User.objects.get_or_create(
-                        username=username,
-                        defaults={
-                            'first_name': person.first_name,
-                            'last_name': person.last_name,
-                            'is_staff': True,
-                            'is_superuser': True,
-                            'is_active': True,
-                        }
-                    )
+                        error_msg = f"Qator {index + 2}: Rasmni saqlab bo'lmadi: {str(e)[:100]}"
+                        warnings.append(error_msg)
+                        print(f"  ❌ {error_msg}")
 
-                    if created:
-                        user.set_password(password)
-                        user.save()
-                        print(f"  ✅ Admin User yaratildi: {username} / password: {password}")
-                    else:
-                        # Agar user allaqachon mavjud bo'lsa, password'ni yangilash
-                        user.set_password(password)
-                        user.is_staff = True
-                        user.is_superuser = True
-                        user.is_active = True
-                        user.save()
-                        print(f"  🔄 Admin User yangilandi: {username} / password: {password}")
-                except Exception as e:
-                    warnings.append(f"Qator {index + 2}: Admin User yaratib bo'lmadi: {str(e)[:100]}")
-                    print(f"  ❌ Admin User xato: {str(e)[:100]}")
+                # 4. Admin User (username = passport, parol = tug'ilgan sana) - user_sync navbati orqali.
+                # Person.save identity o'zgarganda o'zi navbatga qo'yadi (parol faqat shunda hash qilinadi);
+                # bu yerdagi navbat User yo'q bo'lsa uni yaratadi - bir Person uchun navbatda birlashadi
+                user_sync.schedule(person.id, rehash=False)
+                print(f"  👤 Qator {index + 2}: Admin User sinxronizatsiya navbatida")
 
                 success_count += 1
                 print(f"   ✅ Muvaffaqiyatli saqlandi!\n")
@@ -1513,6 +1922,18 @@ def upload_excel(request):
 # Statistics API
 # =====================================================
 
+@csrf_exempt
+def face_metrics(request):
+    """
+    Yuz endpoint'lari yuklamasi - host bo'yicha band slot'lar va
+    shu worker'ning hisoblagichlari
+    """
+    data = metrics.snapshot()
+    data['host'] = host_usage()
+    data['dedupe_hit_rate'] = frame_dedupe.hit_rate()
+    return JsonResponse(data)
+
+
 @csrf_exempt
 def get_statistics(request):
     """
@@ -1888,7 +2309,7 @@ def person_crud_api(request):
                     'mahalla': person.mahalla,
                     'jeton_series': person.jeton_series,
                     'has_photo': bool(person.photo),
-                    'photo_url': request.build_absolute_uri(person.photo.url) if person.photo else None,
+                    'photo_url': request.build_absolute_uri(person_photo_url(person)) if person.photo else None,
                     'has_face_encoding': bool(person.face_encoding),
                     'registered_at': person.registered_at.strftime('%Y-%m-%d %H:%M:%S'),
                 })
@@ -1938,7 +2359,7 @@ def person_crud_api(request):
                     'mahalla': person.mahalla,
                     'jeton_series': person.jeton_series,
                     'has_photo': bool(person.photo),
-                    'photo_url': request.build_absolute_uri(person.photo.url) if person.photo else None,
+                    'photo_url': request.build_absolute_uri(person_photo_url(person)) if person.photo else None,
                     'has_face_encoding': bool(person.face_encoding),
                     'registered_at': person.registered_at.strftime('%Y-%m-%d %H:%M:%S'),
                 }
@@ -2061,11 +2482,7 @@ def person_crud_api(request):
                 except Exception as save_error:
                     print(f"❌ Saqlash xatosi: {save_error}")
                     # Rasmni o'chirish agar saqlanmagan bo'lsa
-                    if person.photo and hasattr(person.photo, 'path'):
-                        try:
-                            os.remove(person.photo.path)
-                        except:
-                            pass
+                    remove_photo(person.photo)
                     raise save_error
 
                 return JsonResponse({
@@ -2142,42 +2559,19 @@ def person_crud_api(request):
                         'error': 'birth_date formati noto\'g\'ri'
                     }, status=400)
 
-            # Photo update
+            # Photo update (enrollment servisi - rasm va encoding person bilan birga saqlanadi,
+            # eski rasm faqat saqlash muvaffaqiyatli bo'lsa o'chiriladi)
+            old_photo = person.photo
             if 'photo' in data and data['photo']:
                 try:
-                    # Delete old
-                    if person.photo:
-                        if os.path.exists(person.photo.path):
-                            os.remove(person.photo.path)
-                        person.photo.delete(save=False)
-
-                    # Upload new
-                    if ',' in data['photo']:
-                        header, encoded = data['photo'].split(',', 1)
-                    else:
-                        encoded = data['photo']
-
-                    image_bytes = base64.b64decode(encoded)
-                    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                    filename = f"person_{person.id}_{timestamp}.jpg"
-                    person.photo.save(filename, ContentFile(image_bytes))
-
-                    # Regenerate encoding
-                    import face_recognition
-                    image = face_recognition.load_image_file(person.photo.path)
-                    encodings = face_recognition.face_encodings(image)
-                    if encodings:
-                        person.face_encoding = encodings[0].tolist()
-                    else:
-                        person.face_encoding = None
-
+                    enroll_person(person, decode_data_url(data['photo']), save=False)
                 except Exception as e:
                     return JsonResponse({
                         'success': False,
                         'error': f'Rasmni yangilashda xatolik: {str(e)}'
                     }, status=400)
 
-            person.save()
+            save_with_photo(person, old_photo)
 
             return JsonResponse({
                 'success': True,
@@ -2207,12 +2601,10 @@ def person_crud_api(request):
 
             full_name = person.full_name
 
-            # Delete photo
-            if person.photo:
-                if os.path.exists(person.photo.path):
-                    os.remove(person.photo.path)
-
+            # Rasm faqat o'chirish commit bo'lgandan keyin o'chiriladi
+            photo = person.photo
             person.delete()
+            transaction.on_commit(lambda: remove_photo(photo))
 
             return JsonResponse({
                 'success': True,
@@ -10,14 +10,22 @@ backlog = 2048
 
 # Worker processes
 workers = multiprocessing.cpu_count() * 2 + 1  # CPU yadrolar * 2 + 1
-worker_class = 'sync'  # 'sync', 'gevent', 'eventlet'
+# 'sync' - core.wsgi:application (HTTP polling)
+# 'uvicorn.workers.UvicornWorker' - core.asgi:application (WebSocket /ws/face-scan/ bilan)
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'sync')  # 'sync', 'gevent', 'eventlet'
 worker_connections = 1000
 max_requests = 1000
 max_requests_jitter = 50
 
 # MUHIM: Timeout sozlamalari (Excel upload uchun)
 # Excel yuklash 5-10 daqiqa olishi mumkin!
-timeout = 600  # 10 daqiqa (600 sekund) - ASOSIY YECHIM!
+# ASGI (uvicorn) worker'da timeout faqat event loop heartbeat'ini o'lchaydi.
+# Sync view'lar (Excel upload ham) sync_to_async(thread_sensitive=True) orqali
+# worker'dagi BITTA umumiy thread'da navbat bilan ishlaydi: uzun upload loop'ni
+# bloklamaydi (60 s da o'ldirilmaydi), lekin shu worker'dagi boshqa sync view'lar
+# upload tugashini kutadi. Og'ir upload'lar uchun alohida sync worker ishlating.
+ASGI_WORKER = worker_class.startswith('uvicorn')
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60 if ASGI_WORKER else 600))  # sync: 10 daqiqa - ASOSIY YECHIM!
 graceful_timeout = 30
 keepalive = 5
 